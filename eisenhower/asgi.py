@@ -2,6 +2,8 @@
 ASGI config for eisenhower project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run the site through it (e.g. ``uvicorn eisenhower.asgi:application``) so the
+matrix's live update stream (tasks:matrix_events) doesn't tie up a worker.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
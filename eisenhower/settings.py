@@ -189,3 +189,72 @@ SOCIALACCOUNT_ADAPTER = "tasks.adapter.GoogleSocialAccountAdapter"
 ACCOUNT_SIGNUP_REDIRECT_URL = '/accounts/social/connections/'
 ACCOUNT_SIGNUP_CLOSED_REDIRECT_URL = '/signup-closed/'
 
+
+# --- Eisenhower Matrix ---
+# Maximum number of cards rendered per quadrant before a "Show more" link
+MATRIX_QUADRANT_CAP = int(os.environ.get('MATRIX_QUADRANT_CAP', 25))
+
+# Ticket numbers reserved per database round trip (see tasks/ticket_numbers.py)
+TICKET_NUMBER_BLOCK_SIZE = int(os.environ.get('TICKET_NUMBER_BLOCK_SIZE', 20))
+
+# Rows per page on the ticket list and my tickets pages
+TICKETS_PER_PAGE = int(os.environ.get('TICKETS_PER_PAGE', 50))
+
+# Largest file accepted by the chunked upload endpoint, in bytes
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 20 * 1024 ** 3))
+
+# Seconds an unfinished (or never attached) chunked upload is kept after its
+# last chunk before `manage.py expire_uploads` deletes it
+UPLOAD_SESSION_EXPIRY = int(os.environ.get('UPLOAD_SESSION_EXPIRY', 24 * 60 * 60))
+
+# How attachment bytes leave the server once the download view has checked
+# access: '' streams from Django, 'x-accel-redirect' hands off to nginx,
+# 'x-sendfile' to Apache (mod_xsendfile) or lighttpd
+ATTACHMENT_DOWNLOAD_OFFLOAD = os.environ.get('ATTACHMENT_DOWNLOAD_OFFLOAD', '')
+
+# nginx `internal` location aliased to MEDIA_ROOT, used with x-accel-redirect
+ATTACHMENT_ACCEL_PREFIX = os.environ.get('ATTACHMENT_ACCEL_PREFIX', '/protected-media/')
+
+# Longest side, in pixels, of the attachment thumbnails made by
+# `manage.py process_previews`
+ATTACHMENT_THUMBNAIL_SIZE = int(os.environ.get('ATTACHMENT_THUMBNAIL_SIZE', 320))
+
+# --- Background jobs (manage.py run_jobs, see tasks/jobs.py) ---
+# Attempts before a job is left as failed, and the first retry delay in
+# seconds (doubled on each further attempt)
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_BASE_DELAY = int(os.environ.get('JOB_RETRY_BASE_DELAY', 10))
+
+# Seconds after which a running job is assumed to have lost its worker
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))
+
+# Seconds a worker keeps its copy of the SLA policies when the cache below
+# is per process (with a shared cache, edits reach every worker at once).
+# An admin edit takes up to this long to reach the other workers.
+SLA_POLICY_CACHE_TTL = int(os.environ.get('SLA_POLICY_CACHE_TTL', 60))
+
+# Percentages of a ticket's SLA window at which `manage.py scan_sla`
+# records an escalation, e.g. "75,100"
+SLA_ESCALATION_THRESHOLDS = [
+    int(value) for value in os.environ.get('SLA_ESCALATION_THRESHOLDS', '75,100').split(',')
+]
+
+# --- Caching ---
+# Shared by role lookups, Google connection flags, SLA policy versions and
+# rendered task cards. The default in-memory cache is per process, so roles
+# and Google connection flags are then only cached for the length of a
+# request and each worker re-reads the SLA policies every
+# SLA_POLICY_CACHE_TTL seconds (see tasks/caching.py); point
+# CACHE_BACKEND/CACHE_LOCATION at e.g.
+# django.core.cache.backends.redis.RedisCache and redis://host:6379 (or the
+# database cache) so every worker shares one.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'eisenhower'),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
+    }
+}
+
+# Seconds a rendered task card stays cached (see tasks/cards.py)
+TASK_CARD_CACHE_TIMEOUT = int(os.environ.get('TASK_CARD_CACHE_TIMEOUT', 24 * 60 * 60))
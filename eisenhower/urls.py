@@ -37,4 +37,5 @@ urlpatterns = [
 
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # attachments are not served from MEDIA_URL; they go through
+    # tasks:attachment_download so ticket access is checked
\ No newline at end of file
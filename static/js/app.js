@@ -143,4 +143,329 @@ if (nextBtn) { // This ensures the code only runs on the login page
             nextBtn.click();
         }
     });
-}
\ No newline at end of file
+}
+
+// --- Matrix "Show more" Logic ---
+// Each quadrant renders a capped number of cards. The "Show more" link points
+// at the next page of that quadrant; fetch it and swap the link for the cards.
+document.addEventListener('click', (e) => {
+    const link = e.target.closest('.matrix-show-more');
+    if (!link) {
+        return;
+    }
+    e.preventDefault();
+
+    const wrapper = link.closest('.matrix-more');
+    fetch(link.href, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then((response) => response.text())
+        .then((html) => {
+            wrapper.insertAdjacentHTML('beforebegin', html);
+            wrapper.remove();
+        });
+});
+
+
+// --- Live Matrix Updates ---
+// The matrix listens to a server-sent event stream. Each "card" event says
+// where one task now belongs: its card is replaced in place, moved to its new
+// quadrant, or removed. "resync" means events were lost, so reload the page.
+// Without a stream (the server answers 204 when it isn't running over ASGI)
+// the page polls itself instead; its ETag makes an unchanged matrix a 304.
+const MATRIX_POLL_INTERVAL = 30 * 1000;
+
+const pollMatrix = () => {
+    let etag = null;
+    setInterval(() => {
+        fetch(window.location.href, {
+            cache: 'no-store',
+            headers: etag ? { 'If-None-Match': etag } : {},
+        }).then((response) => {
+            if (response.status !== 200) {
+                return;
+            }
+            const latest = response.headers.get('ETag');
+            if (etag && latest !== etag) {
+                window.location.reload();
+            }
+            etag = latest;
+        });
+    }, MATRIX_POLL_INTERVAL);
+};
+
+document.addEventListener('DOMContentLoaded', () => {
+    const matrix = document.querySelector('[data-live-url]');
+    if (!matrix) {
+        return;
+    }
+    if (!window.EventSource) {
+        pollMatrix();
+        return;
+    }
+
+    const source = new EventSource(matrix.dataset.liveUrl);
+    source.addEventListener('error', () => {
+        // EventSource retries by itself; CLOSED means it was told not to
+        if (source.readyState === EventSource.CLOSED) {
+            pollMatrix();
+        }
+    });
+
+    source.addEventListener('card', (e) => {
+        const card = JSON.parse(e.data);
+        const existing = matrix.querySelector(`.task-card[data-task-id="${card.id}"]`);
+        const container = card.bucket && matrix.querySelector(`[data-bucket="${card.bucket}"]`);
+
+        if (existing && container && existing.parentElement === container) {
+            existing.outerHTML = card.html;
+            return;
+        }
+        if (existing) {
+            existing.remove();
+        }
+        if (!container) {
+            return;
+        }
+
+        const more = container.querySelector('.matrix-more');
+        if (more) {
+            // the quadrant is capped; the card will come with "Show more"
+            return;
+        }
+        const empty = container.querySelector('.task-list-empty');
+        if (empty) {
+            empty.remove();
+        }
+        container.insertAdjacentHTML('beforeend', card.html);
+    });
+
+    source.addEventListener('resync', () => window.location.reload());
+});
+
+// --- Ticket List Bulk Actions ---
+// Only the inputs that belong to the chosen action are shown, and the header
+// checkbox selects every ticket on the current page.
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.getElementById('bulk-form');
+    if (!form) {
+        return;
+    }
+
+    const action = form.querySelector('select[name="action"]');
+    const showFields = () => {
+        form.querySelectorAll('.bulk-field').forEach((field) => {
+            field.hidden = field.dataset.action !== action.value;
+        });
+    };
+    action.addEventListener('change', showFields);
+    showFields();
+
+    const selectAll = document.querySelector('.bulk-select-all');
+    if (selectAll) {
+        selectAll.addEventListener('change', () => {
+            document.querySelectorAll('input[name="ids"][form="bulk-form"]').forEach((box) => {
+                box.checked = selectAll.checked;
+            });
+        });
+    }
+});
+
+// --- Lazy User Pickers ---
+// Selects marked .user-lookup only render the current choice. A search box is
+// added in front of each one, and matching users are fetched a page at a time
+// from the lookup endpoint instead of rendering every user into the page.
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('select.user-lookup').forEach((select) => {
+        const baseUrl = select.dataset.lookupUrl;
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.placeholder = 'Search users...';
+        search.className = 'user-lookup-search';
+        select.parentNode.insertBefore(search, select);
+
+        let nextAfter = null;
+        let timer = null;
+
+        const clearResults = () => {
+            // keep the blank option and whatever is currently selected
+            Array.from(select.options).forEach((option) => {
+                if (option.value !== '' && !option.selected) {
+                    option.remove();
+                }
+            });
+        };
+
+        const addOption = (value, text, disabled = false) => {
+            const option = new Option(text, value);
+            option.disabled = disabled;
+            option.dataset.lookup = 'result';
+            select.add(option);
+            return option;
+        };
+
+        const load = (append) => {
+            const url = new URL(baseUrl, window.location.origin);
+            url.searchParams.set('q', search.value.trim());
+            if (append && nextAfter) {
+                url.searchParams.set('after', nextAfter);
+            }
+
+            fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then((response) => response.json())
+                .then((data) => {
+                    if (!append) {
+                        clearResults();
+                    }
+                    select.querySelectorAll('option[value="__more__"]').forEach((o) => o.remove());
+
+                    const existing = new Set(Array.from(select.options).map((o) => o.value));
+                    data.results.forEach((user) => {
+                        if (!existing.has(String(user.id))) {
+                            addOption(user.id, user.username);
+                        }
+                    });
+
+                    nextAfter = data.next;
+                    if (nextAfter) {
+                        addOption('__more__', 'Load more...');
+                    }
+                });
+        };
+
+        search.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => load(false), 250);
+        });
+
+        // first results are only fetched once someone actually opens the picker
+        select.addEventListener('focus', () => {
+            if (select.options.length <= 2 && nextAfter === null) {
+                load(false);
+            }
+        }, { once: true });
+
+        select.addEventListener('change', () => {
+            if (select.value === '__more__') {
+                select.value = '';
+                load(true);
+            }
+        });
+    });
+});
+
+
+// --- Chunked, Resumable Uploads ---
+// Forms marked data-chunked-upload send their file in fixed-size chunks to the
+// upload endpoint instead of one big multipart POST. A dropped connection
+// resumes from the last offset the server confirmed, and an upload cut short
+// by a page reload picks up where it left off when the same file is chosen again.
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
+const uploadInChunks = async (form, file, onProgress) => {
+    const csrfToken = form.querySelector('[name=csrfmiddlewaretoken]').value;
+    const resumeKey = `upload:${form.dataset.task || ''}:${file.name}:${file.size}:${file.lastModified}`;
+    let state = null;
+
+    const savedUrl = localStorage.getItem(resumeKey);
+    if (savedUrl) {
+        const response = await fetch(savedUrl);
+        if (response.ok) {
+            state = await response.json();
+        }
+    }
+
+    if (!state) {
+        const body = new FormData();
+        body.append('filename', file.name);
+        body.append('size', file.size);
+        if (form.dataset.task) {
+            body.append('task', form.dataset.task);
+        }
+        const response = await fetch(form.dataset.chunkedUpload, {
+            method: 'POST',
+            body,
+            headers: { 'X-CSRFToken': csrfToken },
+        });
+        state = await response.json();
+        if (!response.ok) {
+            throw new Error(state.error);
+        }
+        localStorage.setItem(resumeKey, state.url);
+    }
+
+    let retries = 0;
+    while (!state.complete) {
+        try {
+            const response = await fetch(state.url, {
+                method: 'PATCH',
+                body: file.slice(state.offset, state.offset + UPLOAD_CHUNK_SIZE),
+                headers: {
+                    'X-CSRFToken': csrfToken,
+                    'Upload-Offset': state.offset,
+                    'Content-Type': 'application/offset+octet-stream',
+                },
+            });
+            const data = await response.json();
+            // 409 means we were out of step; the body carries the server's offset
+            if (!response.ok && response.status !== 409) {
+                throw new Error(data.error);
+            }
+            state = data;
+            retries = 0;
+            onProgress(state.offset / state.size);
+        } catch (err) {
+            retries += 1;
+            if (retries > UPLOAD_MAX_RETRIES) {
+                throw err;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** retries));
+            // ask the server how far it got before trying again
+            const response = await fetch(state.url);
+            if (response.ok) {
+                state = await response.json();
+            }
+        }
+    }
+
+    localStorage.removeItem(resumeKey);
+    return state;
+};
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('form[data-chunked-upload]').forEach((form) => {
+        const fileInput = form.querySelector('input[type=file]');
+        const submitBtn = form.querySelector('button[type=submit]');
+        if (!fileInput) {
+            return;
+        }
+
+        form.addEventListener('submit', async (e) => {
+            if (!fileInput.files.length) {
+                return;
+            }
+            e.preventDefault();
+            const buttonText = submitBtn.textContent;
+            submitBtn.disabled = true;
+
+            try {
+                const state = await uploadInChunks(form, fileInput.files[0], (progress) => {
+                    submitBtn.textContent = `Uploading ${Math.round(progress * 100)}%`;
+                });
+
+                if (form.dataset.task) {
+                    // the attachment already exists, just show it
+                    window.location.reload();
+                } else {
+                    // hand the finished upload to the ticket being submitted
+                    form.querySelector('[name=upload_id]').value = state.id;
+                    fileInput.value = '';
+                    form.submit();
+                }
+            } catch (err) {
+                submitBtn.disabled = false;
+                submitBtn.textContent = buttonText;
+                alert(`Upload failed: ${err.message}. Choose the same file again to resume.`);
+            }
+        });
+    });
+});
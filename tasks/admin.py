@@ -1,28 +1,95 @@
+import uuid
+
 from django.contrib import admin
 
 from django.contrib import admin
-from .models import Task, Tag, Comment, Attachment, SLAPolicy
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import ApiToken, Task, Tag, Comment, Attachment, Job, SLAEscalation, SLAPolicy
+from .pagination import EstimatedCountPaginator
+from .roles import OPERATORS_GROUP
 
 # To make the admin interface more useful, we can customize how models are displayed.
 
+# How many of the most recent comments/attachments the Task change page shows inline
+INLINE_LIMIT = 20
+
+
+class RecentOnlyInlineFormSet(BaseInlineFormSet):
+    """Only loads the newest INLINE_LIMIT related rows instead of all of them."""
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset()
+            self._queryset = queryset.order_by('-pk')[:INLINE_LIMIT]
+        return self._queryset
+
+
 class CommentInline(admin.TabularInline):
     """Allows comments to be viewed and added directly from the Task change page."""
     model = Comment
+    formset = RecentOnlyInlineFormSet
+    verbose_name_plural = f'Comments (latest {INLINE_LIMIT})'
     extra = 1  # Show one extra blank comment form by default
     readonly_fields = ('author', 'created_at')
 
+    def get_queryset(self, request):
+        # __str__ reads the task title, so fetch it along with the author
+        return super().get_queryset(request).select_related('author', 'task')
+
 class AttachmentInline(admin.TabularInline):
     """Allows attachments to be viewed and added directly from the Task change page."""
     model = Attachment
+    formset = RecentOnlyInlineFormSet
+    verbose_name_plural = f'Attachments (latest {INLINE_LIMIT})'
     extra = 1 # Show one extra blank attachment form by default
     readonly_fields = ('uploaded_by', 'uploaded_at')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('uploaded_by')
+
+
+class OperatorAssigneeFilter(admin.SimpleListFilter):
+    """
+    Assignee filter that only offers Operators, instead of the stock
+    related-field filter that lists every user in the system.
+    """
+    title = 'assignee'
+    parameter_name = 'assignee'
+
+    def lookups(self, request, model_admin):
+        operators = User.objects.filter(groups__name=OPERATORS_GROUP).order_by('username')
+        return [('none', 'Unassigned')] + list(operators.values_list('pk', 'username'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'none':
+            return queryset.filter(assignee=None)
+        if self.value():
+            return queryset.filter(assignee_id=self.value())
+        return queryset
+
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     """Customizes the admin interface for the Task model."""
-    list_display = ('title', 'status', 'category', 'assignee', 'due_date', 'urgent', 'important')
-    list_filter = ('status', 'category', 'urgent', 'important', 'assignee')
-    search_fields = ('title', 'description', 'ticket_id')
+    list_display = ('title', 'status', 'category', 'assignee', 'due_date', 'urgent', 'important', 'related_links')
+    list_filter = ('status', 'category', 'urgent', 'important', OperatorAssigneeFilter)
+    list_select_related = ('assignee',)
+    date_hierarchy = 'created_at'
+    autocomplete_fields = ('requester', 'assignee', 'tags')
+
+    # Keep the changelist cheap on large tables: planner estimates instead of
+    # exact COUNT(*)s, and no per-facet counts next to the filters
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    # search goes through the full-text index (see get_search_results), this
+    # just needs to be non-empty for the admin to show the search box
+    search_fields = ('title', 'description', 'ticket_number')
     inlines = [CommentInline, AttachmentInline]
     readonly_fields = ('created_at', 'ticket_id')
     fieldsets = (
@@ -40,6 +107,39 @@ class TaskAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.display(description='History')
+    def related_links(self, obj):
+        """Links to the full comment and attachment lists for the task."""
+        return format_html(
+            '<a href="{}?task__id__exact={}">Comments</a> / <a href="{}?task__id__exact={}">Attachments</a>',
+            reverse('admin:tasks_comment_changelist'), obj.pk,
+            reverse('admin:tasks_attachment_changelist'), obj.pk,
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        A pasted ticket UUID or ticket number is looked up exactly, through
+        its unique index; anything else goes through the full-text index
+        instead of LIKE '%...%' scans over every row.
+        """
+        term = search_term.strip()
+        try:
+            return queryset.filter(ticket_id=uuid.UUID(term)), False
+        except ValueError:
+            pass
+        if term and not any(char.isspace() for char in term):
+            exact = queryset.filter(ticket_number__in={term, term.upper()})
+            if exact.exists():
+                return exact, False
+        return queryset.search(term), False
+
+    def get_ordering(self, request):
+        # search results come ranked, best match first; the ranked
+        # queryset's own ordering is kept unless a column is clicked
+        if request.GET.get(SEARCH_VAR, '').strip():
+            return []
+        return super().get_ordering(request)
+
     def save_model(self, request, obj, form, change):
         """Automatically set the requester to the current user when a task is created."""
         if not obj.pk:  # If the object is being created
@@ -51,11 +151,23 @@ class TagAdmin(admin.ModelAdmin):
     """Customizes the admin interface for the Tag model."""
     search_fields = ('name',)
 
-# Note: Comment and Attachment are managed through the Task admin via inlines,
-# so they don't need their own detailed admin registration unless desired for standalone access.
-# If you wanted to see them as separate items in the admin, you would add:
-# admin.site.register(Comment)
-# admin.site.register(Attachment)
+# Comment and Attachment are edited through the Task admin via inlines, which
+# only show the latest few. These standalone pages hold the full history.
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('task', 'author', 'created_at')
+    list_select_related = ('task', 'author')
+    raw_id_fields = ('task', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(Attachment)
+class AttachmentAdmin(admin.ModelAdmin):
+    list_display = ('original_filename', 'task', 'uploaded_by', 'uploaded_at')
+    list_select_related = ('task', 'uploaded_by')
+    raw_id_fields = ('task', 'uploaded_by')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(SLAPolicy)
@@ -63,6 +175,42 @@ class SLAPolicyAdmin(admin.ModelAdmin):
     list_display = ('name', 'quadrant', 'resolution_time')
 
 
+@admin.register(SLAEscalation)
+class SLAEscalationAdmin(admin.ModelAdmin):
+    list_display = ('task', 'threshold', 'due_date', 'created_at')
+    list_filter = ('threshold',)
+    list_select_related = ('task',)
+    raw_id_fields = ('task',)
+    date_hierarchy = 'created_at'
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'state', 'attempts', 'run_at', 'dedup_key', 'created_at')
+    list_filter = ('state', 'name')
+    search_fields = ('name', 'dedup_key')
+    readonly_fields = ('attempts', 'locked_at', 'last_error', 'created_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected failed jobs now')
+    def retry_jobs(self, request, queryset):
+        for job in queryset.filter(state=Job.State.FAILED):
+            job.state, job.run_at, job.attempts = Job.State.QUEUED, timezone.now(), 0
+            try:
+                job.save(update_fields=['state', 'run_at', 'attempts'])
+            except IntegrityError:
+                # the same work is already queued
+                job.delete()
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    # tokens are made by `manage.py create_api_token`; delete one to revoke it
+    list_display = ('name', 'user', 'created_at')
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
 # You can also register your other models here if you want
 # admin.site.register(Task)
 # admin.site.register(Tag)
@@ -0,0 +1,470 @@
+import hashlib
+import json
+import secrets
+from functools import lru_cache, wraps
+from operator import attrgetter
+
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.forms.models import modelform_factory
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+
+from .forms import CommentForm, TaskForm
+from .models import ApiToken, Attachment, Blob, Comment, Tag, Task
+from .pagination import keyset_paginate
+from .roles import is_operator
+from .ticket_numbers import assign_ticket_numbers
+
+# Items per page of a listing (?limit=), and the most a client may ask for
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Most tasks one batch call may create or update
+API_MAX_BATCH = 500
+
+# Plain Task columns, exposed under their own name
+TASK_COLUMNS = [
+    'ticket_number', 'external_id', 'title', 'description', 'status', 'category',
+    'urgent', 'important', 'is_archived', 'created_at', 'updated_at', 'due_date',
+    'completed_at', 'version',
+]
+
+# API field: (Task fields loaded for it, how its value is read)
+TASK_FIELDS = {
+    'id': ([], attrgetter('pk')),
+    **{name: ([name], attrgetter(name)) for name in TASK_COLUMNS},
+    'requester': (['requester'], attrgetter('requester_id')),
+    'assignee': (['assignee'], attrgetter('assignee_id')),
+    'tags': ([], lambda task: [tag.pk for tag in task.tags.all()]),
+    'quadrant': (['urgent', 'important'], attrgetter('quadrant')),
+    'sla_progress_percent': (
+        ['created_at', 'due_date', 'paused_at', 'total_paused_duration', 'completed_at'],
+        lambda task: round(task.sla_progress_percent, 1),
+    ),
+}
+
+# Related objects a client can ask to have inlined (?embed=)
+EMBEDS = ('requester', 'assignee', 'tags', 'comments', 'attachments')
+
+
+class ApiError(Exception):
+    '''An error answered with a JSON body: {"error": message, **extra}.'''
+
+    def __init__(self, status, message, headers=None, **extra):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+        self.extra = extra
+
+
+# --- tokens ---
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_token(user, name):
+    '''Makes a new API token for `user` and returns it; only its hash is kept.'''
+    token = secrets.token_urlsafe(32)
+    ApiToken.objects.create(user=user, name=name, key_hash=hash_token(token))
+    return token
+
+
+def _authenticate(request):
+    '''
+    Callers send "Authorization: Bearer <token>", or use their browser
+    session. A session write must pass the CSRF check like any form post;
+    a token can't be sent by another site, so it doesn't need to.
+    '''
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        # a unique index lookup; unlike a password there's nothing to stretch
+        api_token = (
+            ApiToken.objects.select_related('user')
+            .filter(key_hash=hash_token(header[len('Bearer '):].strip()), user__is_active=True)
+            .first()
+        )
+        if api_token is None:
+            raise ApiError(401, 'Invalid API token.', headers={'WWW-Authenticate': 'Bearer'})
+        request.user = api_token.user
+    elif not request.user.is_authenticated:
+        raise ApiError(401, 'Authentication required.', headers={'WWW-Authenticate': 'Bearer'})
+    elif request.method not in ('GET', 'HEAD'):
+        if CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {}) is not None:
+            raise ApiError(403, 'CSRF check failed.')
+
+
+def api_view(*methods):
+    '''
+    Wraps a JSON API view: checks the method, authenticates the caller and
+    answers errors (ApiError, 404, 403) as JSON instead of HTML pages.
+    '''
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise ApiError(405, f'{request.method} is not allowed here.',
+                                   headers={'Allow': ', '.join(methods)})
+                _authenticate(request)
+                return view(request, *args, **kwargs)
+            except ApiError as e:
+                return JsonResponse({'error': e.message, **e.extra}, status=e.status, headers=e.headers)
+            except Http404:
+                return JsonResponse({'error': 'Not found.'}, status=404)
+            except PermissionDenied:
+                return JsonResponse({'error': 'Permission denied.'}, status=403)
+        return wrapper
+    return decorator
+
+
+# --- request parsing ---
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError(400, 'The request body must be JSON.')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'The request body must be a JSON object.')
+    return data
+
+
+def _names(request, param, allowed):
+    names = [name.strip() for name in request.GET.get(param, '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ApiError(400, f'Unknown {param}: {", ".join(unknown)}.', allowed=list(allowed))
+    return names
+
+
+def _options(request):
+    '''The requested ?fields= (all of them by default) and ?embed=.'''
+    fields = _names(request, 'fields', TASK_FIELDS) or list(TASK_FIELDS)
+    return fields, _names(request, 'embed', EMBEDS)
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'limit must be a number.')
+    return min(max(limit, 1), API_MAX_PAGE_SIZE)
+
+
+# --- serialisation ---
+
+def _user(user):
+    return {'id': user.pk, 'username': user.username} if user else None
+
+
+def _comment(comment):
+    return {
+        'id': comment.pk,
+        'author': _user(comment.author),
+        'text': comment.text,
+        'created_at': comment.created_at,
+        'updated_at': comment.updated_at,
+    }
+
+
+def _attachment(attachment):
+    blob = attachment.blob
+    ready = blob is not None and blob.preview_state == Blob.PreviewState.READY
+    return {
+        'id': attachment.pk,
+        'filename': attachment.original_filename,
+        'size': blob.size if blob else None,
+        'uploaded_by': _user(attachment.uploaded_by),
+        'uploaded_at': attachment.uploaded_at,
+        'url': reverse('tasks:attachment_download', args=[attachment.pk]),
+        'preview_url': reverse('tasks:attachment_preview', args=[attachment.pk]) if ready else None,
+    }
+
+
+def task_queryset(queryset, fields, embed):
+    '''
+    Narrows a Task queryset to the columns `fields` need and prefetches
+    what `embed` asks for, so a page costs the same few queries however
+    many tasks are on it.
+    '''
+    columns = {'id', 'created_at'}  # created_at: the pagination cursor
+    columns.update(column for field in fields for column in TASK_FIELDS[field][0])
+    columns.update(name for name in ('requester', 'assignee') if name in embed)
+    queryset = queryset.only(*columns)
+
+    if 'tags' in fields or 'tags' in embed:
+        queryset = queryset.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.only('id', 'name').order_by('name'))
+        )
+    if 'comments' in embed:
+        queryset = queryset.prefetch_related(Prefetch(
+            'comments',
+            queryset=Comment.objects.select_related('author')
+            .only('id', 'task_id', 'text', 'created_at', 'updated_at', 'author__id', 'author__username')
+            .order_by('created_at', 'id'),
+        ))
+    if 'attachments' in embed:
+        queryset = queryset.prefetch_related(Prefetch(
+            'attachments',
+            queryset=Attachment.objects.select_related('blob', 'uploaded_by')
+            .only('id', 'task_id', 'original_filename', 'uploaded_at', 'blob__size',
+                  'blob__preview_state', 'uploaded_by__id', 'uploaded_by__username')
+            .order_by('uploaded_at', 'id'),
+        ))
+    return queryset
+
+
+def serialize_tasks(tasks, fields, embed):
+    '''Tasks loaded through task_queryset() as JSON-ready dicts.'''
+    users = {}
+    user_ids = {getattr(task, f'{name}_id') for task in tasks for name in ('requester', 'assignee') if name in embed}
+    user_ids.discard(None)
+    if user_ids:
+        # requesters and assignees of the whole page in one query
+        users = User.objects.only('id', 'username').in_bulk(user_ids)
+
+    results = []
+    for task in tasks:
+        data = {field: TASK_FIELDS[field][1](task) for field in fields}
+        for name in ('requester', 'assignee'):
+            if name in embed:
+                data[name] = _user(users.get(getattr(task, f'{name}_id')))
+        if 'tags' in embed:
+            data['tags'] = [{'id': tag.pk, 'name': tag.name} for tag in task.tags.all()]
+        if 'comments' in embed:
+            data['comments'] = [_comment(comment) for comment in task.comments.all()]
+        if 'attachments' in embed:
+            data['attachments'] = [_attachment(attachment) for attachment in task.attachments.all()]
+        results.append(data)
+    return results
+
+
+def _visible_tasks(user):
+    # the same rule as the HTML views: operators see every ticket,
+    # everybody else only the ones they requested
+    return Task.objects.all() if is_operator(user) else Task.objects.filter(requester=user)
+
+
+# --- writes ---
+
+def _field_error(field, message, code):
+    # shaped like Form.errors.get_json_data()
+    return {field: [{'message': message, 'code': code}]}
+
+
+@lru_cache
+def _task_form_class(fields):
+    return modelform_factory(Task, form=TaskForm, fields=fields)
+
+
+def _task_form(user, data, instance=None):
+    '''
+    TaskForm for one API item: every field for a new task (defaulting to
+    an open, general ticket requested by the caller), only the fields sent
+    for an update.
+    '''
+    if instance is None:
+        fields = TaskForm._meta.fields
+        data = {'status': Task.Status.OPEN, 'category': Task.Category.GENERAL, 'requester': user.pk, **data}
+    else:
+        fields = [field for field in TaskForm._meta.fields if field in data]
+    return _task_form_class(tuple(fields))(data, instance=instance)
+
+
+def save_tasks(user, items):
+    '''
+    Creates or updates tasks from API items, all in one transaction. An
+    item with "id" updates that task; one with "external_id" updates the
+    task created under that id, or creates it; any other item creates a
+    task. Every task goes through TaskForm and Task.save, so validation
+    and the status/SLA bookkeeping are the same as in the web views.
+    Raises ApiError (nothing saved) if any item is invalid. Returns
+    [(task, created)] in item order.
+    '''
+    try:
+        return _save_tasks(user, items)
+    except IntegrityError:
+        if not any(isinstance(item, dict) and item.get('external_id') not in (None, '') for item in items):
+            raise
+        # a concurrent call created a task under one of our external_ids
+        # between the lookup and the INSERT; it exists now, so going again
+        # turns that item into an update
+        return _save_tasks(user, items)
+
+
+def _save_tasks(user, items):
+    if not is_operator(user):
+        raise PermissionDenied
+    if not items or len(items) > API_MAX_BATCH:
+        raise ApiError(400, f'Send between 1 and {API_MAX_BATCH} tasks.')
+    if not all(isinstance(item, dict) for item in items):
+        raise ApiError(400, 'Every task must be a JSON object.')
+
+    # what each item refers to: ('id', pk), ('external_id', value) or None
+    errors, keys, seen = {}, [], {}
+    for index, item in enumerate(items):
+        key = None
+        if 'id' in item:
+            if isinstance(item['id'], int) and not isinstance(item['id'], bool):
+                key = ('id', item['id'])
+            else:
+                errors[index] = _field_error('id', 'Must be a task id.', 'invalid')
+        elif item.get('external_id') not in (None, ''):
+            key = ('external_id', str(item['external_id'])[:100])
+
+        if key in seen:
+            errors[index] = _field_error(key[0], f'Item {seen[key]} has the same {key[0]}.', 'duplicate')
+        elif key:
+            seen[key] = index
+        keys.append(key)
+
+    # every task the batch touches, in two queries
+    existing = Task.objects.in_bulk([value for name, value in seen if name == 'id'])
+    imported = Task.objects.in_bulk(
+        [value for name, value in seen if name == 'external_id'], field_name='external_id',
+    )
+
+    forms = []
+    for index, (item, key) in enumerate(zip(items, keys)):
+        forms.append(None)
+        if index in errors:
+            continue
+        instance = None
+        if key and key[0] == 'id':
+            instance = existing.get(key[1])
+            if instance is None:
+                errors[index] = _field_error('id', f'No task with id {key[1]}.', 'not_found')
+                continue
+        elif key:
+            instance = imported.get(key[1])
+        forms[index] = _task_form(user, item, instance)
+        if not forms[index].is_valid():
+            errors[index] = forms[index].errors.get_json_data()
+
+    if errors:
+        raise ApiError(400, 'Some tasks are invalid; none were saved.', errors=dict(sorted(errors.items())))
+
+    # one ticket number reservation for the batch instead of one per save
+    assign_ticket_numbers([form.instance for form in forms if form.instance.pk is None])
+
+    saved = []
+    with transaction.atomic():
+        for key, form in zip(keys, forms):
+            created = form.instance.pk is None
+            task = form.save(commit=False)
+            if created and key:
+                task.external_id = key[1]
+            task.save()
+            form.save_m2m()
+            saved.append((task, created))
+    return saved
+
+
+def _saved_results(request, saved):
+    # re-read through the same pipeline as GET, honouring ?fields=/?embed=
+    fields, embed = _options(request)
+    tasks = task_queryset(Task.objects.filter(pk__in=[task.pk for task, created in saved]), fields, embed).in_bulk()
+    return serialize_tasks([tasks[task.pk] for task, created in saved], fields, embed)
+
+
+# --- endpoints ---
+
+@api_view('GET', 'POST')
+def task_collection(request):
+    """
+    GET: the caller's visible, live tasks, newest first, filtered like the
+    ticket list (?status=, ?requester=, ?assignee=). One page per call
+    (?limit=); pass the returned "next" cursor back as ?after=.
+    POST: creates one task (operators).
+    """
+    if request.method == 'POST':
+        saved = save_tasks(request.user, [_json_body(request)])
+        return JsonResponse(_saved_results(request, saved)[0], status=201)
+
+    fields, embed = _options(request)
+    try:
+        tasks = _visible_tasks(request.user).live().filter_ticket_list(
+            status=request.GET.get('status'),
+            requester=request.GET.get('requester'),
+            assignee=request.GET.get('assignee'),
+        )
+    except ValueError:
+        raise ApiError(400, 'requester and assignee must be user ids.')
+
+    page = keyset_paginate(task_queryset(tasks, fields, embed), _limit(request), after=request.GET.get('after'))
+    return JsonResponse({'results': serialize_tasks(page.items, fields, embed), 'next': page.next_cursor})
+
+
+@api_view('GET', 'PATCH')
+def task_detail(request, pk):
+    """
+    GET: one task, with the same ?fields= and ?embed= as the listing.
+    PATCH: updates the fields sent (operators).
+    """
+    if request.method == 'PATCH':
+        get_object_or_404(_visible_tasks(request.user).only('id'), pk=pk)
+        saved = save_tasks(request.user, [{**_json_body(request), 'id': pk}])
+        return JsonResponse(_saved_results(request, saved)[0])
+
+    fields, embed = _options(request)
+    task = get_object_or_404(task_queryset(_visible_tasks(request.user), fields, embed), pk=pk)
+    return JsonResponse(serialize_tasks([task], fields, embed)[0])
+
+
+@api_view('POST')
+def task_batch(request):
+    """
+    Creates or updates up to API_MAX_BATCH tasks in one call:
+    {"tasks": [{...}, ...]} (see save_tasks). Either all are saved or,
+    when any is invalid, none are and the errors come back by item index.
+    """
+    items = _json_body(request).get('tasks')
+    if not isinstance(items, list):
+        raise ApiError(400, '"tasks" must be a list.')
+    saved = save_tasks(request.user, items)
+    return JsonResponse({
+        'results': _saved_results(request, saved),
+        'created': sum(created for task, created in saved),
+        'updated': sum(not created for task, created in saved),
+    })
+
+
+@api_view('GET', 'POST')
+def task_comments(request, pk):
+    """
+    GET: a task's comments, newest first, paged like the task listing.
+    POST: adds a comment ({"text": ...}) as the caller.
+    """
+    task = get_object_or_404(_visible_tasks(request.user).only('id'), pk=pk)
+
+    if request.method == 'POST':
+        form = CommentForm(_json_body(request))
+        if not form.is_valid():
+            raise ApiError(400, 'Invalid comment.', errors=form.errors.get_json_data())
+        comment = form.save(commit=False)
+        comment.task = task
+        comment.author = request.user
+        comment.save()
+        return JsonResponse(_comment(comment), status=201)
+
+    comments = task.comments.select_related('author').only(
+        'id', 'text', 'created_at', 'updated_at', 'author__id', 'author__username',
+    )
+    page = keyset_paginate(comments, _limit(request), after=request.GET.get('after'))
+    return JsonResponse({'results': [_comment(comment) for comment in page], 'next': page.next_cursor})
+
+
+@api_view('GET')
+def tag_list(request):
+    """Every tag, by name; tasks refer to tags by id."""
+    tags = Tag.objects.order_by('name').values('id', 'name')
+    return JsonResponse({'results': list(tags)})
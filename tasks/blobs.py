@@ -0,0 +1,111 @@
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+# Bytes hashed per read when fingerprinting a file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def blob_path(sha256):
+    '''
+    Storage name for a blob, fanned out so no directory gets huge.
+    Path will be: media/blobs/<aa>/<bb>/<sha256>
+    '''
+    return os.path.join('blobs', sha256[:2], sha256[2:4], sha256)
+
+
+def hash_file(fileobj):
+    '''Returns (sha256 hexdigest, size) of a django File, read in blocks.'''
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in fileobj.chunks(HASH_BLOCK_SIZE):
+        hasher.update(chunk)
+        size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+def _claim(sha256, size, place):
+    '''
+    Returns the Blob for `sha256` with one more reference. `place(name)`
+    is only called when the content isn't stored yet; it must put the bytes
+    in storage and return the name actually used. The returned blob's file
+    is somewhere else if another caller stored the same content first.
+    '''
+    from .models import Blob
+
+    if Blob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1):
+        return Blob.objects.get(sha256=sha256)
+
+    name = place(blob_path(sha256))
+    try:
+        with transaction.atomic():
+            return Blob.objects.create(sha256=sha256, file=name, size=size, ref_count=1)
+    except IntegrityError:
+        # someone stored the same content first; share theirs
+        Blob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+        return Blob.objects.get(sha256=sha256)
+
+
+def store_blob(fileobj):
+    '''
+    Stores an uploaded file by content. If the same bytes are already
+    stored, nothing is written and the existing blob gains a reference.
+    '''
+    sha256, size = hash_file(fileobj)
+    placed = []
+
+    def place(name):
+        placed.append(default_storage.save(name, fileobj))
+        return placed[0]
+
+    blob = _claim(sha256, size, place)
+    if placed and blob.file.name != placed[0]:
+        # lost a race to store the same content; our copy isn't referenced
+        default_storage.delete(placed[0])
+    return blob
+
+
+def adopt_stored_file(name, sha256=None, size=None):
+    '''
+    Turns a file that is already in storage (a finished chunked upload, or
+    a legacy attachment) into a blob reference without copying any bytes.
+    New content becomes a blob where the file already lies; a duplicate of
+    an existing blob is deleted, but only once the caller's transaction
+    commits, so a rollback never leaves rows pointing at a missing file.
+    '''
+    if sha256 is None or size is None:
+        with default_storage.open(name, 'rb') as fh:
+            sha256, size = hash_file(fh)
+
+    blob = _claim(sha256, size, lambda target: name)
+    if blob.file.name != name:
+        transaction.on_commit(lambda: default_storage.delete(name))
+    return blob
+
+
+def release_blob(blob_id):
+    '''
+    Drops one reference to a blob, deleting the row and (once the
+    transaction commits) its file and preview when nothing points at it any more.
+    '''
+    from .models import Blob
+
+    with transaction.atomic():
+        # the UPDATE locks the row (SQLite: the database) until commit, so a
+        # concurrent _claim can't take a new reference between the decrement
+        # and the delete below; it waits, then finds the row gone
+        Blob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        blob = Blob.objects.select_for_update().filter(pk=blob_id, ref_count=0).first()
+        if blob is None:
+            return
+        names = [name for name in (blob.file.name, blob.preview.name) if name]
+        blob.delete()
+        transaction.on_commit(lambda: _delete_files(names))
+
+
+def _delete_files(names):
+    for name in names:
+        default_storage.delete(name)
@@ -0,0 +1,58 @@
+from django.db import transaction
+
+from .live import publish_task_changes
+from .models import Task
+
+# Most tickets one bulk action may touch
+MAX_BULK_TICKETS = 1000
+
+
+def apply_bulk_action(ids, action, data):
+    '''
+    Applies one ticket-list bulk action to the live tickets in `ids`, as a
+    single set-based UPDATE (plus one INSERT for tagging) in one
+    transaction. `data` is a cleaned BulkActionForm. Returns the number of
+    tickets changed.
+    '''
+    tasks = Task.objects.live().filter(pk__in=ids)
+
+    with transaction.atomic():
+        # old assignees, so matrix pages the tickets leave are told too
+        before = dict(tasks.select_for_update().values_list('pk', 'assignee_id'))
+        if not before:
+            return 0
+        tasks = Task.objects.filter(pk__in=before)
+        after = before
+
+        if action == 'assign':
+            assignee = data['assignee']
+            tasks.update_tracked(assignee=assignee)
+            after = dict.fromkeys(before, assignee.pk if assignee else None)
+
+        elif action == 'status':
+            # same pause/resume/complete rules as Task.save
+            tasks.update_status(data['status'])
+
+        elif action == 'priority':
+            changes = {field: data[field] for field in ('urgent', 'important') if data[field] is not None}
+            tasks.update_tracked(**changes)
+
+        elif action == 'tag':
+            Through = Task.tags.through
+            Through.objects.bulk_create(
+                [Through(task_id=pk, tag_id=data['tag'].pk) for pk in before],
+                ignore_conflicts=True,
+            )
+            tasks.update_tracked()
+
+        elif action == 'archive':
+            tasks.update_tracked(is_archived=True)
+
+        else:
+            raise ValueError(f'Unknown bulk action {action!r}')
+
+        # tags aren't shown on the matrix cards
+        if action != 'tag':
+            publish_task_changes([(pk, [before[pk], after[pk]]) for pk in before])
+
+    return len(before)
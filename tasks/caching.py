@@ -0,0 +1,18 @@
+from django.conf import settings
+
+# Backends that live inside one process: a version bump or invalidation made
+# by one worker never reaches the others
+PER_PROCESS_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def cache_is_shared():
+    '''
+    Whether the default cache is seen by every worker (Redis, Memcached,
+    the database cache...). State that must be invalidated across workers,
+    like role sets, Google connection flags and the SLA policy version, is
+    only cached when it is.
+    '''
+    return settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+HITS_KEY = 'tasks:task_card:hits'
+MISSES_KEY = 'tasks:task_card:misses'
+
+
+def card_cache_key(task):
+    # Task.version moves on every save and tag change, so an entry is never
+    # invalidated, it just stops being asked for and expires
+    return f'tasks:task_card:{task.pk}:{task.version}'
+
+
+def _count(key, amount):
+    if amount:
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            # evicted between add() and incr()
+            cache.set(key, amount, timeout=None)
+
+
+def render_cards(tasks):
+    '''
+    Sets task.card_html on every task, reading all cards with one cache
+    round trip and rendering (and storing) only the ones that changed.
+    '''
+    keys = {card_cache_key(task): task for task in tasks}
+    cached = cache.get_many(keys)
+
+    rendered = {}
+    for key, task in keys.items():
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string('tasks/task_card.html', {'task': task})
+        task.card_html = mark_safe(html)
+
+    if rendered:
+        cache.set_many(rendered, timeout=settings.TASK_CARD_CACHE_TIMEOUT)
+    _count(HITS_KEY, len(cached))
+    _count(MISSES_KEY, len(rendered))
+    return tasks
+
+
+def card_cache_stats():
+    '''{'hits', 'misses', 'hit_rate'} since the counters were last reset.'''
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
@@ -1,14 +1,57 @@
 from allauth.socialaccount.models import SocialAccount
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .caching import cache_is_shared
+
+GOOGLE_CONNECTION_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def google_connection_cache_key(user_pk):
+    return f'tasks:google_connected:{user_pk}'
+
+
+def is_google_connected(user):
+    '''
+    Checks if the user has a google account connected.
+
+    Like the roles in tasks/roles.py, the answer is memoised on the user
+    object for the rest of the request, so the matrix page's ETag and its
+    template share one lookup, and kept in the cache across requests only
+    when CACHES points at a backend every worker shares. The receivers in
+    tasks/signals.py drop it when a SocialAccount is saved or deleted.
+    '''
+    connected = getattr(user, '_google_connected', None)
+    if connected is not None:
+        return connected
+
+    if not cache_is_shared():
+        connected = SocialAccount.objects.filter(user=user, provider='google').exists()
+    else:
+        key = google_connection_cache_key(user.pk)
+        connected = cache.get(key)
+        if connected is None:
+            connected = SocialAccount.objects.filter(user=user, provider='google').exists()
+            cache.set(key, connected, GOOGLE_CONNECTION_CACHE_TIMEOUT)
+
+    user._google_connected = connected
+    return connected
+
+
+def invalidate_google_connection(user_pk):
+    '''Drops the cached flag for a user whose social accounts changed.'''
+    if not cache_is_shared():
+        return
+    cache.delete(google_connection_cache_key(user_pk))
+
 
 def google_connection_processor(request):
     '''
-    Checks if the logged-in user has a google account connected.
+    Exposes whether the logged-in user has a google account connected.
+    The flag is lazy: the lookup only runs if a template actually reads it.
     '''
-    is_google_connected = False
-    if request.user.is_authenticated:
-        is_google_connected = SocialAccount.objects.filter(
-            user=request.user,
-            provider='google'
-        ).exists()
+    user = request.user
+    if not user.is_authenticated:
+        return {'is_google_connected': False}
 
-    return {'is_google_connected': is_google_connected}
\ No newline at end of file
+    return {'is_google_connected': SimpleLazyObject(lambda: is_google_connected(user))}
@@ -0,0 +1,178 @@
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, quote_etag
+
+# Bytes read per iteration when Django streams the file itself
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Types the browser may display inline; everything else is downloaded, so
+# an uploaded HTML or SVG file can never run script on our origin
+INLINE_CONTENT_TYPES = {
+    'image/png', 'image/jpeg', 'image/gif', 'image/webp',
+    'application/pdf', 'text/plain',
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _stored_size(name):
+    # a row whose file has gone from storage (e.g. a legacy attachment
+    # lost in a migration) is a 404, not a 500
+    try:
+        return default_storage.size(name)
+    except OSError:
+        raise Http404('The file is missing from storage.')
+
+
+def _open_stored(name):
+    try:
+        return default_storage.open(name, 'rb')
+    except OSError:
+        raise Http404('The file is missing from storage.')
+
+
+def attachment_etag(attachment):
+    # blob-backed files are named by their content, so the digest is a
+    # strong validator; legacy files fall back to id + size
+    if attachment.blob_id:
+        return quote_etag(attachment.blob.sha256)
+    return quote_etag(f'{attachment.pk}-{_stored_size(attachment.file.name):x}')
+
+
+def parse_range(header, size):
+    '''
+    Parses a single-range "bytes=" header into an inclusive (start, end).
+    Returns None when the header should be ignored (missing, malformed or
+    multiple ranges, which are answered with the whole file) and raises
+    ValueError when the range can't be satisfied.
+    '''
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('empty suffix range')
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('range starts past the end of the file')
+    return start, end
+
+
+def _read_range(fh, start, end):
+    try:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            block = fh.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        fh.close()
+
+
+def _offloaded(name):
+    '''
+    An empty response telling the front-end server which file to send.
+    nginx and Apache both handle Range and HEAD on the internal redirect.
+    '''
+    response = HttpResponse()
+    mode = settings.ATTACHMENT_DOWNLOAD_OFFLOAD
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(settings.ATTACHMENT_ACCEL_PREFIX + name)
+    else:
+        response['X-Sendfile'] = default_storage.path(name)
+    return response
+
+
+def _streamed(request, name, etag):
+    size = _stored_size(name)
+
+    byte_range = None
+    if request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    fh = _open_stored(name)
+    if byte_range is None:
+        # FileResponse can use the server's wsgi.file_wrapper (sendfile)
+        return FileResponse(fh)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_range(fh, start, end), status=206)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    return response
+
+
+def serve_preview(request, attachment):
+    '''
+    Sends an attachment's ready-made preview. Preview URLs never change
+    content (a blob is immutable), so browsers may keep them for a year.
+    '''
+    blob = attachment.blob
+    etag = quote_etag(f'{blob.sha256}-preview')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if settings.ATTACHMENT_DOWNLOAD_OFFLOAD:
+            response = _offloaded(blob.preview.name)
+        else:
+            response = FileResponse(_open_stored(blob.preview.name))
+    if response.status_code == 200:
+        response['Content-Type'] = (
+            'image/webp' if blob.preview_kind == blob.PreviewKind.IMAGE else 'text/plain; charset=utf-8'
+        )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
+def serve_attachment(request, attachment):
+    '''
+    Sends an attachment the caller has already been authorised for. A
+    matching If-None-Match gets a 304 without touching the file; otherwise
+    the transfer is handed to nginx/Apache when ATTACHMENT_DOWNLOAD_OFFLOAD
+    is set, or streamed from Django with single-range support.
+    '''
+    name = attachment.file.name
+    etag = attachment_etag(attachment)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if settings.ATTACHMENT_DOWNLOAD_OFFLOAD:
+            response = _offloaded(name)
+        else:
+            response = _streamed(request, name, etag)
+
+    # blobs have no extension, so the type comes from the uploaded name
+    content_type = mimetypes.guess_type(attachment.original_filename)[0] or 'application/octet-stream'
+    if response.status_code in (200, 206):
+        response['Content-Type'] = content_type
+
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(
+        content_type not in INLINE_CONTENT_TYPES, attachment.original_filename,
+    )
+    # the browser may keep a copy but must revalidate, so access is
+    # re-checked on every download (a cheap 304 when nothing changed)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,76 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, F, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+def tasks_state():
+    '''
+    A stamp that moves whenever any ticket changes: the latest
+    Task.updated_at, which every save, update_tracked() and update_status()
+    moves on (one probe of task_updated_idx), and the number of tasks ever
+    deleted, since a deleted row leaves no updated_at behind. Listing pages
+    are validated against it instead of aggregating over everything they
+    could show, so answering a refresh costs the same at any table size.
+    '''
+    from .models import Task, TaskDeletionCounter
+
+    latest = Task.objects.aggregate(latest=Max('updated_at'))['latest']
+    deletions = TaskDeletionCounter.objects.values_list('count', flat=True).first()
+    return latest, deletions or 0
+
+
+def record_task_deletion():
+    '''Moves tasks_state() on for a deleted task (see tasks/signals.py).'''
+    from .models import TaskDeletionCounter
+
+    counter = TaskDeletionCounter.objects.filter(pk=1)
+    if not counter.update(count=F('count') + 1):
+        TaskDeletionCounter.objects.get_or_create(pk=1)
+        counter.update(count=F('count') + 1)
+
+
+def set_state(queryset):
+    '''
+    (row count, latest updated_at) of a queryset, in one aggregate query.
+    Any edit moves updated_at; a row leaving the set changes the count.
+    Only meant for small sets, like the comments of one ticket.
+    '''
+    state = queryset.order_by().aggregate(count=Count('pk'), latest=Max('updated_at'))
+    return state['count'], state['latest']
+
+
+def page_etag(request, *parts):
+    '''
+    Weak ETag for a page whose content is decided by `parts`. The viewer,
+    the full URL (filters, cursors), the CSRF cookie (rendered into the
+    page's forms) and whether flash messages are shown are always part of it.
+    '''
+    key = '|'.join(str(part) for part in (
+        request.user.pk,
+        request.get_full_path(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        len(get_messages(request)),
+        *parts,
+    ))
+    return 'W/"%s"' % hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def not_modified(request, etag):
+    '''The 304 response when the client already has `etag`, else None.'''
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if len(get_messages(request)):
+        # messages waiting to be shown need a real render
+        return None
+    response = get_conditional_response(request, etag=etag)
+    return finish(response, etag) if response is not None else None
+
+
+def finish(response, etag):
+    # private: the pages are per user; no-cache: always revalidate, which
+    # is a cheap 304 while nothing has changed
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from .models import Task
+
+# Columns of a ticket export, named like the ones manage.py import_tickets
+# reads, so an export can be imported elsewhere. id is the ticket's id from
+# an earlier import (external_id), or else its ticket number.
+EXPORT_FIELDS = [
+    'id', 'ticket_number', 'title', 'description', 'status', 'category', 'urgent', 'important',
+    'requester', 'assignee', 'tags', 'created_at', 'due_date', 'completed_at', 'updated_at',
+]
+
+# Tickets fetched from the cursor (and written out) at a time
+EXPORT_CHUNK_SIZE = 2000
+
+# format: (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+def export_queryset(params):
+    '''
+    The tickets the ticket list shows for the same ?q=, ?status=,
+    ?requester= and ?assignee= filters: best match first when searching,
+    otherwise newest first. Raises ValueError for a user filter that isn't
+    an id.
+    '''
+    tasks = Task.objects.live().filter_ticket_list(
+        status=params.get('status'),
+        requester=params.get('requester'),
+        assignee=params.get('assignee'),
+    )
+    search_query = (params.get('q') or '').strip()
+    if search_query:
+        return tasks.search(search_query)
+    return tasks.order_by('-created_at', '-id')
+
+
+def export_rows(tasks, chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    Yields the tickets in `tasks` as lists of row dicts, chunk_size at a
+    time. Rows come off a server-side cursor (on Postgres) with the
+    requester and assignee joined in; the tags of each chunk are read with
+    one more query. Memory use doesn't grow with the size of the export.
+    '''
+    rows = tasks.values(
+        'pk', 'ticket_number', 'title', 'description', 'status', 'category', 'urgent', 'important',
+        'created_at', 'due_date', 'completed_at', 'updated_at',
+        export_id=Coalesce('external_id', 'ticket_number'),
+        requester_name=F('requester__username'),
+        assignee_name=F('assignee__username'),
+    ).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        tags = {}
+        for task_id, name in (
+            Task.tags.through.objects.filter(task_id__in=[row['pk'] for row in chunk])
+            .order_by('tag__name').values_list('task_id', 'tag__name')
+        ):
+            tags.setdefault(task_id, []).append(name)
+
+        for row in chunk:
+            row['id'] = row.pop('export_id')
+            row['requester'] = row.pop('requester_name')
+            row['assignee'] = row.pop('assignee_name')
+            row['tags'] = tags.get(row.pop('pk'), [])
+        yield chunk
+
+
+def _value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        return ', '.join(value)
+    return _value(value)
+
+
+def _csv_chunks(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(row[field]) for field in EXPORT_FIELDS] for row in chunk)
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(chunks):
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps({field: _value(row[field]) for field in EXPORT_FIELDS}) + '\n'
+            for row in chunk
+        )
+
+
+def export_tickets(tasks, format, chunk_size=EXPORT_CHUNK_SIZE):
+    '''Yields `tasks` as CSV or JSON Lines text, one piece per chunk.'''
+    chunks = export_rows(tasks, chunk_size)
+    return _csv_chunks(chunks) if format == 'csv' else _jsonl_chunks(chunks)
+
+
+async def stream_in_thread(iterable):
+    '''
+    Async iterator over a sync one that reads from the database. Each step
+    runs in the request's sync thread, where its cursor lives, so an ASGI
+    response streams it chunk by chunk instead of buffering it whole.
+    '''
+    iterator = iter(iterable)
+    done = object()
+    try:
+        while (chunk := await sync_to_async(next)(iterator, done)) is not done:
+            yield chunk
+    finally:
+        # closes the cursor in its own thread if the client went away
+        await sync_to_async(iterator.close)()
@@ -1,6 +1,43 @@
 from django import forms
-from .models import Task, Comment, Attachment
-from django.contrib.auth.models import User, Group
+from django.urls import reverse_lazy
+from .models import Task, Comment, Attachment, Tag
+from .roles import OPERATORS_GROUP
+from django.contrib.auth.models import User
+
+
+class UserLookupSelect(forms.Select):
+    """
+    A <select> for picking a user that only renders the current selection.
+    The rest of the options are fetched page by page from the user lookup
+    endpoint as the operator types (see app.js), so the page size doesn't
+    grow with the number of users.
+    """
+
+    def __init__(self, attrs=None, role=None):
+        attrs = {'class': 'form-select user-lookup', **(attrs or {})}
+        super().__init__(attrs)
+        self.role = role
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        lookup_url = reverse_lazy('tasks:user_lookup')
+        if self.role:
+            lookup_url = f'{lookup_url}?role={self.role}'
+        context['widget']['attrs']['data-lookup-url'] = lookup_url
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v]
+        choices = [('', '---------')]
+        if selected:
+            choices += list(User.objects.filter(pk__in=selected).values_list('pk', 'username'))
+
+        # render from the trimmed choices instead of the full queryset
+        full_choices, self.choices = self.choices, choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = full_choices
 
 
 class TaskForm(forms.ModelForm):
@@ -19,20 +56,18 @@ class TaskForm(forms.ModelForm):
             'urgent': forms.CheckboxInput(attrs={'class': 'form-checkbox'}),
             'important': forms.CheckboxInput(attrs={'class': 'form-checkbox'}),
             'status': forms.Select(attrs={'class': 'form-select'}),
-            'requester': forms.Select(attrs={'class': 'form-select'}),
-            'assignee': forms.Select(attrs={'class': 'form-select'}),
+            'requester': UserLookupSelect(),
+            'assignee': UserLookupSelect(role='operators'),
         }
 
      # This new method adds the filtering logic
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Filter the 'assignee' dropdown to only show users in the 'Operators' group
-        try:
-            operators_group = Group.objects.get(name='Operators')
-            self.fields['assignee'].queryset = operators_group.user_set.all()
-        except Group.DoesNotExist:
-            # If the group doesn't exist, the dropdown will be empty
-            self.fields['assignee'].queryset = User.objects.none()
+        # Only users in the 'Operators' group can be assigned. This stays a
+        # lazy queryset: it is only hit to validate the submitted choice.
+        # (The JSON API builds this form over just the fields it was sent.)
+        if 'assignee' in self.fields:
+            self.fields['assignee'].queryset = User.objects.filter(groups__name=OPERATORS_GROUP)
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -75,6 +110,8 @@ class UserTicketForm(forms.ModelForm):
         label = "Attach a file (optional)",
         widget=forms.ClearableFileInput(attrs={'class': 'form-input'})
     )
+    # set by app.js when the file was sent through the chunked upload endpoint
+    upload_id = forms.UUIDField(required=False, widget=forms.HiddenInput)
 
     class Meta:
         model = Task
@@ -83,4 +120,71 @@ class UserTicketForm(forms.ModelForm):
             'title': forms.TextInput(attrs={'class': 'form-input'}),
             'description': forms.Textarea(attrs={'class': 'form-textarea', 'rows': 5}),
             'category': forms.Select(attrs={'class': 'form-select'})
-        }
\ No newline at end of file
+        }
+
+class TicketIdsField(forms.Field):
+    """The ticket checkboxes of the ticket list, as a list of ids."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(pk) for pk in value or []]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Invalid ticket selection.')
+
+
+class BulkActionForm(forms.Form):
+    """One bulk action from the ticket list, applied by tasks.bulk."""
+    ACTIONS = [
+        ('assign', 'Assign to'),
+        ('status', 'Set status'),
+        ('priority', 'Set priority'),
+        ('tag', 'Add tag'),
+        ('archive', 'Archive'),
+    ]
+    YES_NO_UNCHANGED = [('', 'Unchanged'), ('1', 'Yes'), ('0', 'No')]
+
+    ids = TicketIdsField(error_messages={'required': 'Select at least one ticket.'})
+    action = forms.ChoiceField(choices=ACTIONS, widget=forms.Select(attrs={'class': 'form-select'}))
+    assignee = forms.ModelChoiceField(
+        queryset=User.objects.filter(groups__name=OPERATORS_GROUP),
+        required=False, empty_label='Unassigned',
+        widget=UserLookupSelect(role='operators'),
+    )
+    status = forms.ChoiceField(
+        choices=[('', 'Status...')] + Task.Status.choices, required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    urgent = forms.TypedChoiceField(
+        choices=YES_NO_UNCHANGED, required=False, coerce=lambda v: v == '1', empty_value=None,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    important = forms.TypedChoiceField(
+        choices=YES_NO_UNCHANGED, required=False, coerce=lambda v: v == '1', empty_value=None,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    tag = forms.ModelChoiceField(
+        queryset=Tag.objects.order_by('name'), required=False, empty_label='Tag...',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+
+    def __init__(self, *args, max_tickets=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_tickets = max_tickets
+
+    def clean_ids(self):
+        ids = self.cleaned_data['ids']
+        if self.max_tickets and len(ids) > self.max_tickets:
+            raise forms.ValidationError(f'Select at most {self.max_tickets} tickets at a time.')
+        return ids
+
+    def clean(self):
+        cleaned = super().clean()
+        action = cleaned.get('action')
+        if action == 'status' and not cleaned.get('status'):
+            self.add_error('status', 'Choose a status.')
+        elif action == 'priority' and cleaned.get('urgent') is None and cleaned.get('important') is None:
+            self.add_error('urgent', 'Choose urgent and/or important.')
+        elif action == 'tag' and not cleaned.get('tag'):
+            self.add_error('tag', 'Choose a tag.')
+        return cleaned
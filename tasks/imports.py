@@ -0,0 +1,312 @@
+import csv
+import json
+import os
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .blobs import store_blob
+from .models import Attachment, Comment, Tag, Task, sla_clock_running, status_transition
+from .search import index_tasks
+from .sla import assign_due_dates
+from .ticket_numbers import assign_ticket_numbers
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+
+
+def read_records(stream, format, on_error):
+    '''
+    Yields (line number, record dict) from CSV (header row first) or JSON
+    Lines text. Lines that aren't a JSON object go to on_error(line, message).
+    '''
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            on_error(line_number, f'invalid JSON: {e}')
+            continue
+        if not isinstance(record, dict):
+            on_error(line_number, 'not a JSON object')
+            continue
+        yield line_number, record
+
+
+def _text(record, key, required=False):
+    value = record.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f'{key} is missing')
+    return value
+
+
+def _flag(record, key):
+    value = record.get(key)
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def _datetime(record, key):
+    value = _text(record, key)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'{key} {value!r} is not a date')
+        parsed = datetime.combine(day, time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _choice(record, key, choices, default):
+    # the stored value or its label, in any case
+    value = _text(record, key).lower()
+    if not value:
+        return default
+    for choice, label in choices.choices:
+        if value in (choice.lower(), label.lower()):
+            return choice
+    raise ValueError(f'unknown {key} {record[key]!r}')
+
+
+def _names(value):
+    # a JSON list, or comma separated names in CSV
+    if isinstance(value, list):
+        names = [str(name).strip() for name in value]
+    else:
+        names = str(value or '').split(',')
+    return list(dict.fromkeys(name.strip() for name in names if name.strip()))
+
+
+def bulk_create_historic(model, objs, field):
+    '''
+    bulk_create for rows that carry their own value for `field`, an
+    auto_now_add timestamp. The INSERT stamps the current time over it, so
+    the rows whose value differed are put back with one bulk_update in the
+    caller's transaction. The field definitions, which every thread of the
+    process shares, are left alone.
+    '''
+    stamps = [getattr(obj, field) for obj in objs]
+    model.objects.bulk_create(objs)
+    changed = []
+    for obj, stamp in zip(objs, stamps):
+        if stamp is not None and stamp != getattr(obj, field):
+            setattr(obj, field, stamp)
+            changed.append(obj)
+    if changed:
+        model.objects.bulk_update(changed, [field])
+
+
+class TicketImporter:
+    '''
+    Loads tickets, with their tags, comments and attachments, in batches:
+    every batch is a handful of bulk INSERTs in one transaction instead of
+    a Task.save() per ticket. Users and tags are looked up in maps read
+    once. Each ticket keeps its old id in Task.external_id, and tickets
+    already imported are skipped, so a failed run can simply be restarted.
+
+    `warn(line, message)` is told about every record (or part of one)
+    that couldn't be imported; counts holds the totals.
+    '''
+
+    def __init__(self, *, attachments_dir='.', default_user=None, warn=None):
+        self.attachments_dir = os.path.realpath(attachments_dir)
+        self.default_user = default_user
+        self.warn = warn or (lambda line, message: None)
+        self.counts = Counter()
+        self.unknown_users = set()
+
+        # users by lower-cased email and username; a username wins over
+        # someone else's email address
+        users = list(User.objects.values_list('pk', 'username', 'email'))
+        self.users = {email.lower(): pk for pk, username, email in users if email}
+        self.users.update((username.lower(), pk) for pk, username, email in users)
+        self.tags = dict(Tag.objects.values_list('name', 'pk'))
+
+    def error(self, line, message):
+        self.counts['errors'] += 1
+        self.warn(line, message)
+
+    def _user(self, name):
+        if not name:
+            return None
+        pk = self.users.get(name.lower())
+        if pk is None:
+            self.unknown_users.add(name)
+        return pk
+
+    def _author(self, record, key):
+        # comments and attachments must belong to someone
+        name = _text(record, key)
+        pk = self._user(name)
+        if pk is None:
+            if self.default_user is None:
+                raise ValueError(f'unknown {key} {name!r} (see --default-user)')
+            pk = self.default_user.pk
+        return pk
+
+    def _attachment_path(self, record):
+        relative = _text(record, 'path', required=True)
+        path = os.path.realpath(os.path.join(self.attachments_dir, relative))
+        if os.path.commonpath([path, self.attachments_dir]) != self.attachments_dir:
+            raise ValueError(f'attachment {relative!r} is outside the attachments directory')
+        if not os.path.isfile(path):
+            raise ValueError(f'attachment {relative!r} not found')
+        return path
+
+    def build(self, record, now):
+        '''
+        The unsaved Task for one record, plus (tag names, comments,
+        attachments) to write with it. Raises ValueError for bad records.
+        '''
+        created_at = _datetime(record, 'created_at') or now
+        task = Task(
+            external_id=_text(record, 'id', required=True)[:100],
+            # longer titles are cut down, the description keeps the full text
+            title=_text(record, 'title', required=True)[:200],
+            description=_text(record, 'description') or None,
+            status=_choice(record, 'status', Task.Status, Task.Status.OPEN),
+            category=_choice(record, 'category', Task.Category, Task.Category.GENERAL),
+            urgent=_flag(record, 'urgent'),
+            important=_flag(record, 'important'),
+            requester_id=self._user(_text(record, 'requester')),
+            assignee_id=self._user(_text(record, 'assignee')),
+            is_archived=_flag(record, 'is_archived'),
+            created_at=created_at,
+            updated_at=now,
+            due_date=_datetime(record, 'due_date'),
+        )
+
+        # the same bookkeeping as a new ticket moved to its status, with
+        # the old helpdesk's completion time where it has one
+        changes = status_transition(Task.Status.OPEN, task.status, None, timedelta(0), now=now)
+        for field, value in changes.items():
+            setattr(task, field, value)
+        if task.completed_at:
+            task.completed_at = _datetime(record, 'completed_at') or task.completed_at
+
+        tags = _names(record.get('tags'))
+        for name in tags:
+            if len(name) > Tag._meta.get_field('name').max_length:
+                raise ValueError(f'tag {name!r} is too long')
+
+        comments = []
+        for comment in record.get('comments') or []:
+            if not _text(comment, 'text'):
+                continue
+            comments.append(Comment(
+                task=task,
+                author_id=self._author(comment, 'author'),
+                text=_text(comment, 'text'),
+                created_at=_datetime(comment, 'created_at') or created_at,
+                updated_at=now,
+            ))
+
+        attachments = []
+        for attachment in record.get('attachments') or []:
+            path = self._attachment_path(attachment)
+            attachments.append((path, Attachment(
+                task=task,
+                uploaded_by_id=self._author(attachment, 'uploaded_by'),
+                original_filename=(_text(attachment, 'filename') or os.path.basename(path))[:255],
+                uploaded_at=_datetime(attachment, 'uploaded_at') or created_at,
+                updated_at=now,
+            )))
+
+        return task, tags, comments, attachments
+
+    def _resolve_tags(self, names):
+        missing = [name for name in names if name not in self.tags]
+        if missing:
+            Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+            self.tags.update(Tag.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+    def import_batch(self, records):
+        '''Imports one batch of (line number, record). Returns the tickets written.'''
+        now = timezone.now()
+        ids = {_text(record, 'id')[:100] for line, record in records}
+        done = set(Task.objects.filter(external_id__in=ids).values_list('external_id', flat=True))
+
+        built = []
+        for line, record in records:
+            external_id = _text(record, 'id')[:100]
+            if external_id and external_id in done:
+                self.counts['skipped'] += 1
+                continue
+            try:
+                built.append(self.build(record, now))
+            except (ValueError, TypeError, AttributeError) as e:
+                self.error(line, str(e))
+                continue
+            done.add(external_id)
+
+        if not built:
+            return 0
+
+        tasks = [task for task, tags, comments, attachments in built]
+        assign_due_dates(tasks)
+        for task in tasks:
+            # the SLA scanner works out the real check time on its first pass
+            if task.due_date and sla_clock_running(task.status):
+                task.sla_next_check_at = now
+        assign_ticket_numbers(tasks)
+        self._resolve_tags({name for task, tags, comments, attachments in built for name in tags})
+
+        Through = Task.tags.through
+        with transaction.atomic():
+            bulk_create_historic(Task, tasks, 'created_at')
+
+            links, comments, attachments = [], [], []
+            for task, task_tags, task_comments, task_attachments in built:
+                links += [Through(task_id=task.pk, tag_id=self.tags[name]) for name in task_tags]
+                comments += task_comments
+                for path, attachment in task_attachments:
+                    with open(path, 'rb') as fh:
+                        attachment.blob = store_blob(File(fh, name=attachment.original_filename))
+                    attachment.file.name = attachment.blob.file.name
+                    attachments.append(attachment)
+
+            Through.objects.bulk_create(links)
+            bulk_create_historic(Comment, comments, 'created_at')
+            bulk_create_historic(Attachment, attachments, 'uploaded_at')
+            index_tasks([task.pk for task in tasks])
+
+        self.counts['tickets'] += len(tasks)
+        self.counts['comments'] += len(comments)
+        self.counts['attachments'] += len(attachments)
+        return len(tasks)
+
+    def run(self, records, batch_size=1000, on_batch=None):
+        '''
+        Imports every record, batch_size tickets per transaction, calling
+        on_batch(last line number) after each batch is committed.
+        '''
+        batch = []
+        for item in records:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self.import_batch(batch)
+                if on_batch:
+                    on_batch(batch[-1][0])
+                batch = []
+        if batch:
+            self.import_batch(batch)
+            if on_batch:
+                on_batch(batch[-1][0])
+        return self.counts
@@ -0,0 +1,146 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# name -> function, filled in by @background_job
+registry = {}
+
+# SQLite has no SKIP LOCKED; claims in one process are serialised here and
+# the conditional UPDATE keeps separate processes from running a job twice
+_claim_lock = threading.Lock()
+
+
+def background_job(name):
+    '''
+    Registers a function as a job handler. Handlers take keyword arguments
+    only (they are stored as JSON) and should be safe to run more than once,
+    since a job is retried if its worker dies mid-run.
+    '''
+    def register(func):
+        registry[name] = func
+        func.job_name = name
+        return func
+    return register
+
+
+def enqueue(job, *, dedup_key=None, delay=None, max_attempts=None, **kwargs):
+    '''
+    Queues `job` (a registered function or its name) inside the caller's
+    transaction, so it only runs if the surrounding work commits. Returns
+    the Job, or None if a queued job with the same dedup_key already exists.
+    '''
+    from .models import Job
+
+    name = getattr(job, 'job_name', job)
+    if name not in registry:
+        raise ValueError(f'Unknown background job {name!r}')
+
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                kwargs=kwargs,
+                dedup_key=dedup_key,
+                run_at=timezone.now() + (delay or timedelta()),
+                max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            )
+    except IntegrityError:
+        if dedup_key is None:
+            raise
+        return None
+
+
+def claim_job():
+    '''Marks the oldest due job as running and returns it, or None.'''
+    from .models import Job
+
+    now = timezone.now()
+    due = Job.objects.filter(state=Job.State.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            job = due.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(state=Job.State.RUNNING, locked_at=now, attempts=job.attempts + 1)
+    else:
+        with _claim_lock:
+            for job in due[:10]:
+                if Job.objects.filter(pk=job.pk, state=Job.State.QUEUED).update(
+                    state=Job.State.RUNNING, locked_at=now, attempts=job.attempts + 1,
+                ):
+                    break
+            else:
+                return None
+
+    job.state, job.locked_at, job.attempts = Job.State.RUNNING, now, job.attempts + 1
+    return job
+
+
+def retry_delay(attempts):
+    # exponential backoff: 10s, 20s, 40s, ... capped at an hour
+    return timedelta(seconds=min(settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1), 3600))
+
+
+def _requeue(job, **fields):
+    '''
+    Puts a job back in the queue. If a job with the same dedup_key was
+    queued meanwhile it will do the same work, so this one is dropped.
+    '''
+    from .models import Job
+
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk).update(state=Job.State.QUEUED, locked_at=None, **fields)
+    except IntegrityError:
+        Job.objects.filter(pk=job.pk).delete()
+
+
+def run_job(job):
+    '''
+    Runs a claimed job. It is deleted on success, retried with backoff on
+    an exception, and kept as FAILED once it runs out of attempts.
+    '''
+    from .models import Job
+
+    func = registry.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'No handler registered for {job.name!r}')
+        func(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s (%s) failed on attempt %s', job.pk, job.name, job.attempts, exc_info=True)
+        if func is not None and job.attempts < job.max_attempts:
+            _requeue(job, run_at=timezone.now() + retry_delay(job.attempts), last_error=error)
+        else:
+            Job.objects.filter(pk=job.pk).update(state=Job.State.FAILED, locked_at=None, last_error=error)
+        return False
+
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def requeue_stale_jobs():
+    '''
+    Returns jobs whose worker died mid-run (running for longer than
+    JOB_LOCK_TIMEOUT) to the queue. Their attempt still counts.
+    '''
+    from .models import Job
+
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    stale = Job.objects.filter(state=Job.State.RUNNING, locked_at__lt=cutoff)
+    for job in stale:
+        if job.attempts < job.max_attempts:
+            _requeue(job)
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                state=Job.State.FAILED, locked_at=None, last_error='Worker stopped while running the job.',
+            )
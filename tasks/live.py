@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from .cards import render_cards
+from .matrix import CARD_FIELDS, bucket_expression
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY channel carrying task changes between processes
+CHANNEL = 'tasks_matrix'
+
+# Events buffered per connected page before it is told to resync instead
+MAX_QUEUED_EVENTS = 100
+
+# Seconds between SSE comments that keep proxies from closing the stream
+KEEPALIVE_INTERVAL = 25
+
+RESYNC = {'type': 'resync'}
+
+
+class Broker:
+    '''
+    Fans task events out to the SSE streams connected to this process. Each
+    stream has its own asyncio queue; deliver() may be called from any
+    thread (request threads on SQLite, the LISTEN thread on Postgres).
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        queue = asyncio.Queue(MAX_QUEUED_EVENTS)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        if connection.vendor == 'postgresql':
+            start_listener()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = {s for s in self._subscribers if s[1] is not queue}
+
+    def deliver(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_put, queue, event)
+
+
+def _put(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # a page that fell this far behind reloads instead
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+
+broker = Broker()
+
+
+def publish_task_change(task_id, assignee_ids):
+    '''
+    Announces that a task changed, once the surrounding transaction commits.
+    assignee_ids holds the old and new assignee (None for the unassigned
+    pool), so both the page it left and the page it joined hear about it.
+    '''
+    publish_task_changes([(task_id, assignee_ids)])
+
+
+def publish_task_changes(changes):
+    '''publish_task_change for many tasks at once, e.g. a bulk action.'''
+    events = [
+        {'type': 'task', 'task': task_id, 'assignees': list(set(assignee_ids))}
+        for task_id, assignee_ids in changes
+    ]
+    if not events:
+        return
+
+    def send():
+        if connection.vendor == 'postgresql':
+            # every process, including this one, gets them via its listener;
+            # one round trip however many tasks changed
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                    [CHANNEL, [json.dumps(event) for event in events]],
+                )
+        else:
+            for event in events:
+                broker.deliver(event)
+
+    transaction.on_commit(send)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def start_listener():
+    '''Starts this process's Postgres LISTEN thread, if it isn't running.'''
+    global _listener
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, name='tasks-matrix-listener', daemon=True)
+            _listener.start()
+
+
+def _listen():
+    import psycopg2
+    import psycopg2.extensions
+
+    params = connections['default'].get_connection_params()
+    reconnecting = False
+    while True:
+        try:
+            conn = psycopg2.connect(**params)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            if reconnecting:
+                # anything sent while we were disconnected is lost
+                broker.deliver(RESYNC)
+            reconnecting = True
+            while True:
+                if select.select([conn], [], [], KEEPALIVE_INTERVAL) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    broker.deliver(json.loads(conn.notifies.pop(0).payload))
+        except Exception:
+            logger.exception('Matrix listener lost its connection, reconnecting')
+            time.sleep(5)
+
+
+def load_card(user, task_id):
+    '''
+    Where `task_id` now belongs on `user`'s matrix: {'id', 'bucket', 'html'},
+    with bucket None when the card should be removed.
+    '''
+    task = (
+        Task.objects.open()
+        .filter(Q(assignee=user) | Q(assignee=None), pk=task_id)
+        .only(*CARD_FIELDS)
+        .annotate(bucket=bucket_expression())
+        .first()
+    )
+    if task is None:
+        return {'id': task_id, 'bucket': None, 'html': ''}
+    render_cards([task])
+    return {'id': task_id, 'bucket': task.bucket, 'html': task.card_html}
+
+
+async def matrix_event_stream(user):
+    '''
+    Server-sent events for one matrix page: a "card" event whenever a task
+    on (or leaving) the user's matrix changes, "resync" when events were lost.
+    '''
+    queue = broker.subscribe()
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+
+            if event['type'] == 'resync':
+                yield 'event: resync\ndata: {}\n\n'
+            elif user.pk in event['assignees'] or None in event['assignees']:
+                card = await sync_to_async(load_card)(user, event['task'])
+                yield f'event: card\ndata: {json.dumps(card)}\n\n'
+    finally:
+        broker.unsubscribe(queue)
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.api import create_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates a token for the JSON API acting as the given user, and prints "
+        "it. Only a hash is stored, so the token can't be shown again; delete "
+        "it in the admin to revoke it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the token acts as (an operator, to write).')
+        parser.add_argument('--name', required=True, help='What the token is for, e.g. "Monitoring".')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist")
+
+        token = create_token(user, options['name'])
+        self.stdout.write(token)
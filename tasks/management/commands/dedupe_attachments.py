@@ -0,0 +1,54 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tasks.blobs import adopt_stored_file
+from tasks.models import Attachment
+
+
+class Command(BaseCommand):
+    help = (
+        "Registers existing attachment files in the content-addressed blob store, "
+        "deleting duplicate copies once their batch has committed. Files are never "
+        "moved, so an interrupted run loses nothing. Safe to re-run; finished "
+        "attachments are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Attachments handled per transaction (default: 500).')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        migrated = missing = 0
+        last_pk = 0
+
+        while True:
+            # keyset over the primary key so each batch is an index range scan
+            batch = list(
+                Attachment.objects.filter(blob=None, pk__gt=last_pk)
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            with transaction.atomic():
+                for attachment in batch:
+                    name = attachment.file.name
+                    if not name or not default_storage.exists(name):
+                        missing += 1
+                        self.stderr.write(f'Attachment {attachment.pk}: file {name!r} is missing, skipped')
+                        continue
+
+                    blob = adopt_stored_file(name)
+                    attachment.blob = blob
+                    attachment.file.name = blob.file.name
+                    attachment.save(update_fields=['blob', 'file'])
+                    migrated += 1
+
+            self.stdout.write(f'... {migrated} attachments added to the blob store')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {migrated} attachments deduplicated, {missing} with missing files.'
+        ))
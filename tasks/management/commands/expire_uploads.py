@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tasks.uploads import expire_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes chunked uploads that were abandoned or never attached to a "
+        "ticket, once they are older than UPLOAD_SESSION_EXPIRY. Meant to be "
+        "run regularly, e.g. hourly from cron."
+    )
+
+    def handle(self, *args, **options):
+        expired = expire_uploads()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {expired} expired uploads.'))
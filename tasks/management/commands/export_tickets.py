@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_queryset, export_tickets
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the live tickets as CSV or JSON Lines, with the same filters as "
+        "the ticket list. Rows are streamed from the database in chunks, so "
+        "memory use stays flat however many tickets there are."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv',
+                            help='Output format (default: csv).')
+        parser.add_argument('-o', '--output',
+                            help='File to write to (default: standard output).')
+        parser.add_argument('-q', '--search', help='Only tickets matching this search.')
+        parser.add_argument('--status', help='Only tickets with this status, e.g. OPEN.')
+        parser.add_argument('--requester', type=int, help='Only tickets from this user id.')
+        parser.add_argument('--assignee', type=int, help='Only tickets assigned to this user id.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help=f'Tickets read from the database at a time (default: {EXPORT_CHUNK_SIZE}).')
+
+    def handle(self, *args, **options):
+        tasks = export_queryset({
+            'q': options['search'],
+            'status': options['status'],
+            'requester': options['requester'],
+            'assignee': options['assignee'],
+        })
+        chunks = export_tickets(tasks, options['format'], chunk_size=options['chunk_size'])
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        try:
+            output = open(options['output'], 'w', encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(e)
+        with output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Tickets written to {options['output']}."))
@@ -0,0 +1,76 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.imports import TicketImporter, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports tickets from a CSV or JSON Lines export of another helpdesk. "
+        "Columns/keys: id (required, kept as the ticket's external_id), title "
+        "(required), description, status, category, urgent, important, "
+        "requester, assignee (username or email), tags (list, or comma "
+        "separated in CSV), created_at, due_date, completed_at, is_archived. "
+        "JSON Lines records may also hold comments [{author, text, created_at}] "
+        "and attachments [{path, filename, uploaded_by, uploaded_at}]. Tickets "
+        "already imported are skipped, so an interrupted import can be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON Lines file to import.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Tickets written per transaction (default: 1000).')
+        parser.add_argument('--attachments-dir', default=None,
+                            help="Directory attachment paths are relative to (default: the input file's).")
+        parser.add_argument('--default-user',
+                            help='Username credited with comments and attachments whose author is unknown.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+
+        default_user = None
+        if options['default_user']:
+            try:
+                default_user = User.objects.get(username=options['default_user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['default_user']!r} does not exist")
+
+        def warn(line, message):
+            self.stderr.write(f'Line {line}: {message}, skipped')
+
+        importer = TicketImporter(
+            attachments_dir=options['attachments_dir'] or os.path.dirname(os.path.abspath(path)),
+            default_user=default_user,
+            warn=warn,
+        )
+
+        def progress(line):
+            self.stdout.write(f"... {importer.counts['tickets']} tickets imported (line {line})")
+
+        try:
+            stream = open(path, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(e)
+        with stream:
+            counts = importer.run(
+                read_records(stream, format, importer.error),
+                batch_size=options['batch_size'],
+                on_batch=progress,
+            )
+
+        if importer.unknown_users:
+            self.stderr.write(
+                f'{len(importer.unknown_users)} unknown users (left unassigned, or '
+                f'credited to --default-user): '
+                + ', '.join(sorted(importer.unknown_users)[:20])
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {counts['tickets']} tickets, {counts['comments']} comments and "
+            f"{counts['attachments']} attachments imported; {counts['skipped']} already "
+            f"imported, {counts['errors']} records with errors."
+        ))
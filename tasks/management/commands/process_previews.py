@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.models import Blob
+from tasks.previews import claim_pending_blobs, generate_preview
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders thumbnails and text previews for attachment blobs still pending, "
+        "once per blob. New blobs are handled by run_jobs; this backfills existing "
+        "ones. Runs until stopped unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Process everything pending, then exit.')
+        parser.add_argument('--batch-size', type=int, default=20,
+                            help='Blobs claimed per round (default: 20).')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the queue is empty (default: 5).')
+        parser.add_argument('--requeue', action='store_true',
+                            help='Reset blobs left in processing or failed back to pending first.')
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            count = Blob.objects.filter(
+                preview_state__in=[Blob.PreviewState.PROCESSING, Blob.PreviewState.FAILED]
+            ).update(preview_state=Blob.PreviewState.PENDING)
+            self.stdout.write(f'Requeued {count} blobs.')
+
+        while True:
+            blobs = claim_pending_blobs(options['batch_size'])
+            for blob in blobs:
+                try:
+                    generate_preview(blob)
+                except Exception as e:
+                    self.stderr.write(f'Blob {blob.pk}: preview failed: {e}')
+
+            if not blobs:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
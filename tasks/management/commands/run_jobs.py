@@ -0,0 +1,61 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from tasks.jobs import claim_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued background jobs. Each of the --concurrency threads claims "
+        "one job at a time; runs until stopped unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Jobs run in parallel, one thread each (default: 1).')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds a thread sleeps when the queue is empty (default: 2).')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=self.work, args=(stop, options), name=f'job-worker-{i}')
+            for i in range(max(options['concurrency'], 1))
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            # let running jobs finish, don't claim new ones
+            self.stdout.write('Stopping after the current jobs...')
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, stop, options):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = claim_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    requeue_stale_jobs()
+                    stop.wait(options['interval'])
+                    continue
+
+                if run_job(job):
+                    self.stdout.write(f'{job.name} #{job.pk} done')
+                else:
+                    self.stderr.write(f'{job.name} #{job.pk} failed (attempt {job.attempts})')
+        finally:
+            # every thread has its own database connection
+            connection.close()
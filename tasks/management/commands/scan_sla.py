@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.sla import scan_sla_breaches
+
+
+class Command(BaseCommand):
+    help = (
+        "Records SLA escalation events for open tickets crossing the thresholds "
+        "in SLA_ESCALATION_THRESHOLDS. Runs every --interval seconds until "
+        "stopped unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Scan once and exit (e.g. from cron).')
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help='Seconds between scans (default: 60).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Tickets handled per transaction (default: 500).')
+
+    def handle(self, *args, **options):
+        while True:
+            recorded = scan_sla_breaches(batch_size=options['batch_size'])
+            if recorded:
+                self.stdout.write(f'Recorded {recorded} SLA escalations.')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
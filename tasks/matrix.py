@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+
+from .cards import render_cards
+from .models import Task
+from .pagination import after_cursor, encode_cursor
+
+
+# Buckets in the order the matrix page renders them. 'unassigned' is the
+# triage queue, the other four are the caller's own quadrants.
+MATRIX_BUCKETS = ('unassigned', 'do_first', 'schedule', 'delegate', 'delete')
+
+# Only the columns task_card.html actually renders, plus the version its
+# cache key is built from
+CARD_FIELDS = (
+    'id', 'title', 'ticket_number', 'status', 'category',
+    'due_date', 'created_at', 'urgent', 'important', 'assignee', 'version',
+)
+
+BUCKET_ORDER = ('created_at', 'id')
+
+
+def quadrant_cap():
+    return getattr(settings, 'MATRIX_QUADRANT_CAP', 25)
+
+
+def bucket_expression():
+    '''
+    SQL CASE that puts each open task into its matrix bucket.
+    '''
+    return Case(
+        When(assignee__isnull=True, then=Value('unassigned')),
+        When(urgent=True, important=True, then=Value('do_first')),
+        When(urgent=False, important=True, then=Value('schedule')),
+        When(urgent=True, important=False, then=Value('delegate')),
+        default=Value('delete'),
+    )
+
+
+def bucket_filter(bucket, user):
+    '''
+    The WHERE clause equivalent of one branch of bucket_expression().
+    '''
+    if bucket == 'unassigned':
+        return Q(assignee=None)
+    urgent, important = {
+        'do_first': (True, True),
+        'schedule': (False, True),
+        'delegate': (True, False),
+        'delete': (False, False),
+    }[bucket]
+    return Q(assignee=user, urgent=urgent, important=important)
+
+
+def _page(tasks, cap):
+    '''
+    Trims a cap+1 slice down to cap rows and returns the cursor for the
+    next page, or None if nothing was cut off.
+    '''
+    if len(tasks) <= cap:
+        return tasks, None
+    tasks = tasks[:cap]
+    last = tasks[-1]
+    return tasks, encode_cursor(last.created_at, last.pk)
+
+
+def load_matrix(user, cap=None):
+    '''
+    Fetches the whole matrix in one query: every open task assigned to
+    `user` plus the unassigned pool, numbered within each bucket by a
+    window function so that at most cap+1 rows per bucket come back.
+
+    Returns {bucket: (tasks, next_cursor)} for every bucket in MATRIX_BUCKETS.
+    '''
+    cap = cap or quadrant_cap()
+    rows = (
+        Task.objects.open()
+        .filter(Q(assignee=user) | Q(assignee=None))
+        .only(*CARD_FIELDS)
+        .annotate(bucket=bucket_expression())
+        .annotate(
+            bucket_row=Window(
+                RowNumber(),
+                partition_by=F('bucket'),
+                order_by=[F(field).asc() for field in BUCKET_ORDER],
+            ),
+        )
+        .filter(bucket_row__lte=cap + 1)
+        .order_by('bucket', *BUCKET_ORDER)
+    )
+
+    grouped = {bucket: [] for bucket in MATRIX_BUCKETS}
+    for task in render_cards(list(rows)):
+        grouped[task.bucket].append(task)
+    return {bucket: _page(tasks, cap) for bucket, tasks in grouped.items()}
+
+
+def load_bucket_page(user, bucket, cursor, cap=None):
+    '''
+    The "show more" query for a single bucket, continuing after `cursor`.
+    Returns (tasks, next_cursor).
+    '''
+    cap = cap or quadrant_cap()
+    tasks = Task.objects.open().filter(bucket_filter(bucket, user)).only(*CARD_FIELDS)
+    if cursor:
+        tasks = tasks.filter(after_cursor(cursor))
+    tasks, next_cursor = _page(list(tasks.order_by(*BUCKET_ORDER)[:cap + 1]), cap)
+    return render_cards(tasks), next_cursor
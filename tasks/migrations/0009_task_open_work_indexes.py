@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_alter_slapolicy_quadrant'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['assignee', 'urgent', 'important', 'status'], name='task_open_assignee_quad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['requester', '-created_at'], name='task_requester_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['-created_at'], name='task_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['status', '-created_at'], name='task_live_status_created_idx'),
+        ),
+    ]
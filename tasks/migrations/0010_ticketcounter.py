@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:06
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def highest_ticket_number(Task):
+    # Numbers issued so far are OHM + the zero-padded pk, so both the highest
+    # pk and the highest OHM number have to be cleared
+    highest = Task.objects.aggregate(highest=Max('id'))['highest'] or 0
+    last_number = (
+        Task.objects.filter(ticket_number__regex=r'^OHM[0-9]{13}$')
+        .aggregate(last=Max('ticket_number'))['last']
+    )
+    if last_number:
+        highest = max(highest, int(last_number[3:]))
+    return highest
+
+
+def seed_ticket_counter(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    TicketCounter = apps.get_model('tasks', 'TicketCounter')
+    highest = highest_ticket_number(Task)
+
+    TicketCounter.objects.update_or_create(name='ticket_number', defaults={'last_value': highest})
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE SEQUENCE IF NOT EXISTS tasks_ticket_number_seq START WITH %s' % (highest + 1)
+        )
+
+
+def drop_ticket_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP SEQUENCE IF EXISTS tasks_ticket_number_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_task_open_work_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_ticket_counter, drop_ticket_sequence),
+    ]
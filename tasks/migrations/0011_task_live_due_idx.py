@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_ticketcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('due_date__isnull', False), ('is_archived', False)), fields=['due_date'], name='task_live_due_idx'),
+        ),
+    ]
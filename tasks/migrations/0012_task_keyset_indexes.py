@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_task_live_due_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_requester_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_live_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_live_status_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['requester', '-created_at', '-id'], name='task_requester_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['-created_at', '-id'], name='task_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['status', '-created_at', '-id'], name='task_live_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:11
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX tasks_task_search_vector_gin ON tasks_task USING gin (search_vector)'
+        )
+        schema_editor.execute("""
+            UPDATE tasks_task SET search_vector =
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(ticket_number, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(
+                    (SELECT string_agg(text, ' ') FROM tasks_comment WHERE task_id = tasks_task.id), ''
+                )), 'C')
+        """)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE tasks_task_fts USING fts5('
+            "title, ticket_number, description, comments, tokenize='porter unicode61')"
+        )
+        schema_editor.execute("""
+            INSERT INTO tasks_task_fts (rowid, title, ticket_number, description, comments)
+            SELECT id, coalesce(title, ''), coalesce(ticket_number, ''), coalesce(description, ''),
+                coalesce((SELECT group_concat(text, ' ') FROM tasks_comment WHERE task_id = tasks_task.id), '')
+            FROM tasks_task
+        """)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS tasks_task_search_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS tasks_task_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0012_task_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
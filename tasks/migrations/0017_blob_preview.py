@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0016_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='preview',
+            field=models.FileField(blank=True, max_length=255, upload_to='previews'),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='preview_kind',
+            field=models.CharField(blank=True, choices=[('IMAGE', 'Image'), ('TEXT', 'Text')], max_length=5),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='preview_state',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('READY', 'Ready'), ('NONE', 'No preview'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(condition=models.Q(('preview_state', 'PENDING')), fields=['id'], name='blob_preview_pending_idx'),
+        ),
+    ]
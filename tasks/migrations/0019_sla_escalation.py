@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def arm_sla_scanner(apps, schema_editor):
+    # every open ticket with a running clock gets checked on the first scan,
+    # which then schedules it properly
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.filter(
+        is_archived=False, due_date__isnull=False, paused_at__isnull=True,
+    ).exclude(status__in=['PENDING', 'RESOLVED', 'CLOSED']).update(sla_next_check_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0018_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SLAEscalation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.PositiveSmallIntegerField()),
+                ('due_date', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='sla_escalation_level',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='sla_next_check_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_archived', False), ('sla_next_check_at__isnull', False)), fields=['sla_next_check_at', 'id'], name='task_sla_next_check_idx'),
+        ),
+        migrations.AddField(
+            model_name='slaescalation',
+            name='task',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sla_escalations', to='tasks.task'),
+        ),
+        migrations.AddConstraint(
+            model_name='slaescalation',
+            constraint=models.UniqueConstraint(fields=('task', 'threshold', 'due_date'), name='sla_escalation_once'),
+        ),
+        migrations.RunPython(arm_sla_scanner, migrations.RunPython.noop),
+    ]
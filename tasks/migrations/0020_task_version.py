@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0019_sla_escalation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:12
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    # without better information, a row was last modified when it was created
+    apps.get_model('tasks', 'Task').objects.update(updated_at=F('created_at'))
+    apps.get_model('tasks', 'Comment').objects.update(updated_at=F('created_at'))
+    apps.get_model('tasks', 'Attachment').objects.update(updated_at=F('uploaded_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0020_task_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
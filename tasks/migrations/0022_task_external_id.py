@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0021_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='external_id',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:52
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_username_prefix_index(apps, schema_editor):
+    # user_lookup_view filters on username__istartswith; these match the SQL
+    # Django generates for it on each backend
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # text_pattern_ops serves LIKE 'abc%' whatever the database collation
+        schema_editor.execute(
+            'CREATE INDEX auth_user_username_upper_like ON auth_user '
+            '(UPPER(username::text) text_pattern_ops)'
+        )
+    elif vendor == 'sqlite':
+        # SQLite's LIKE is case-insensitive and only uses a NOCASE index
+        schema_editor.execute(
+            'CREATE INDEX auth_user_username_nocase ON auth_user (username COLLATE NOCASE)'
+        )
+
+
+def drop_username_prefix_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS auth_user_username_upper_like')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP INDEX IF EXISTS auth_user_username_nocase')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0023_apitoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_username_prefix_index, drop_username_prefix_index),
+    ]
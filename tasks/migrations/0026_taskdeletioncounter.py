@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:11
+
+from django.db import migrations, models
+
+
+def move_deletion_count(apps, schema_editor):
+    # the count used to be kept in a TicketCounter row
+    TicketCounter = apps.get_model('tasks', 'TicketCounter')
+    TaskDeletionCounter = apps.get_model('tasks', 'TaskDeletionCounter')
+    old = TicketCounter.objects.filter(name='task_deletions').first()
+    if old is not None:
+        TaskDeletionCounter.objects.create(pk=1, count=old.last_value)
+        old.delete()
+
+
+def restore_deletion_count(apps, schema_editor):
+    TicketCounter = apps.get_model('tasks', 'TicketCounter')
+    TaskDeletionCounter = apps.get_model('tasks', 'TaskDeletionCounter')
+    counter = TaskDeletionCounter.objects.filter(pk=1).first()
+    if counter is not None:
+        TicketCounter.objects.create(name='task_deletions', last_value=counter.count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0025_task_updated_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskDeletionCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(move_deletion_count, restore_deletion_count),
+    ]
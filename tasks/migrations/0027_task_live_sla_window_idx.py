@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:14
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0026_taskdeletioncounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(models.F('due_date'), '-', models.F('created_at')), output_field=models.DurationField()), condition=models.Q(('due_date__isnull', False), ('is_archived', False)), name='task_live_sla_window_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:19
+
+import tasks.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0027_task_live_sla_window_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attachment',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=tasks.models.user_directory_path),
+        ),
+    ]
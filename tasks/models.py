@@ -2,8 +2,28 @@ import uuid
 import os
 from django.utils import timezone
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from datetime import timedelta
+from .blobs import store_blob
+from .search import new_task_search_vector, search_tasks
+from .sla import due_date_for, sla_at_risk_ranges, sla_progress_expressions, sla_window_expression
+from .ticket_numbers import next_ticket_number
+
+# Longest file extension kept in generated upload paths, so that even a
+# 150 character username leaves the path within the 255 characters of
+# Attachment.file and UploadSession.file_name
+MAX_EXTENSION_LENGTH = 16
+
+
+def pending_upload_path(username, filename):
+    '''
+    Path for a chunked upload that isn't attached to a ticket yet.
+    Path will be: media/users/<username>/uploads/<uuid>.<ext>
+    '''
+    ext = filename.split('.')[-1][:MAX_EXTENSION_LENGTH]
+    return os.path.join('users', username, 'uploads', f"{uuid.uuid4()}.{ext}")
+
 
 def user_directory_path(instance, filename):
     '''
@@ -12,7 +32,7 @@ def user_directory_path(instance, filename):
     '''
 
     #get the original filename's extension
-    ext = filename.split('.')[-1]
+    ext = filename.split('.')[-1][:MAX_EXTENSION_LENGTH]
     #create a new, unique filename using UUID
     new_filename=f"{uuid.uuid4()}.{ext}"
 
@@ -28,7 +48,204 @@ class Tag(models.Model):
 
     def __str__(self):
         return self.name
-    
+
+
+# statuses that take a ticket out of the "open work" pool
+CLOSED_STATUSES = ('RESOLVED', 'CLOSED')
+
+
+def status_transition(old_status, new_status, paused_at, total_paused_duration, now=None):
+    """
+    Works out the SLA bookkeeping for a status change:
+
+    * entering PENDING pauses the SLA clock (paused_at)
+    * leaving PENDING adds the pause to total_paused_duration
+    * entering RESOLVED/CLOSED stamps completed_at, leaving it clears it
+    * whenever the SLA clock stops or starts again, the SLA scanner's next
+      check is cleared or brought forward to now (see tasks/sla.py)
+
+    Returns a dict of the fields to update, empty if nothing changes. This is
+    shared by Task.save and TaskQuerySet.update_status so bulk paths keep the
+    same semantics.
+    """
+    now = now or timezone.now()
+    changes = {}
+
+    # Check if the task is being paused
+    if old_status != Task.Status.PENDING and new_status == Task.Status.PENDING:
+        changes['paused_at'] = now
+
+    # Check is the task is being resumed
+    elif old_status == Task.Status.PENDING and new_status != Task.Status.PENDING:
+        if paused_at:
+            changes['total_paused_duration'] = total_paused_duration + (now - paused_at)
+            changes['paused_at'] = None
+
+    # Check if the task is being completed
+    if old_status not in CLOSED_STATUSES and new_status in CLOSED_STATUSES:
+        changes['completed_at'] = now
+
+    # Check if it's being Re-opened
+    elif old_status in CLOSED_STATUSES and new_status not in CLOSED_STATUSES:
+        changes['completed_at'] = None
+
+    if changes:
+        changes['sla_next_check_at'] = now if sla_clock_running(new_status) else None
+
+    return changes
+
+
+def sla_clock_running(status):
+    """The SLA clock stops while a ticket is pending and once it's closed."""
+    return status != Task.Status.PENDING and status not in CLOSED_STATUSES
+
+
+def user_id_filter(value):
+    """
+    A ?requester= or ?assignee= value as a user id, or None when it's empty.
+    Raises ValueError for anything that isn't a number, for the caller to
+    answer with a 400.
+    """
+    if not value:
+        return None
+    if not str(value).isdigit():
+        raise ValueError(f'{value!r} is not a user id')
+    return int(value)
+
+
+class TaskQuerySet(models.QuerySet):
+    """
+    Shared filters for the list views. Keeping them in one place means every
+    view builds the same WHERE clause, which is what lets the partial indexes
+    on Task be matched by the planner.
+    """
+
+    def live(self):
+        """Tasks that have not been archived."""
+        return self.filter(is_archived=False)
+
+    def open(self):
+        """Live tasks that are still being worked on (not resolved or closed)."""
+        return self.live().exclude(status__in=CLOSED_STATUSES)
+
+    def filter_ticket_list(self, status=None, requester=None, assignee=None):
+        """
+        The ticket list's ?status=, ?requester= and ?assignee= filters, so
+        the list page and the ticket exports select the same rows. Raises
+        ValueError when a user filter isn't an id (see user_id_filter).
+        """
+        tasks = self
+        requester, assignee = user_id_filter(requester), user_id_filter(assignee)
+        if status:
+            tasks = tasks.filter(status=status)
+        if requester:
+            tasks = tasks.filter(requester__id=requester)
+        if assignee:
+            tasks = tasks.filter(assignee__id=assignee)
+        return tasks
+
+    def update_status(self, new_status, **extra):
+        """
+        Set-based equivalent of saving each task with a new status: one UPDATE
+        that applies the same pause/resume/complete/reopen rules as
+        status_transition(), computed per row in SQL. Returns the row count.
+        """
+        now = timezone.now()
+        pending = Task.Status.PENDING
+        changes = {'status': new_status}
+
+        if new_status == pending:
+            changes['paused_at'] = models.Case(
+                models.When(~models.Q(status=pending), then=models.Value(now)),
+                default=models.F('paused_at'),
+                output_field=models.DateTimeField(),
+            )
+        else:
+            resuming = models.Q(status=pending, paused_at__isnull=False)
+            changes['total_paused_duration'] = models.Case(
+                models.When(resuming, then=models.ExpressionWrapper(
+                    models.F('total_paused_duration') + (models.Value(now) - models.F('paused_at')),
+                    output_field=models.DurationField(),
+                )),
+                default=models.F('total_paused_duration'),
+                output_field=models.DurationField(),
+            )
+            changes['paused_at'] = models.Case(
+                models.When(resuming, then=models.Value(None)),
+                default=models.F('paused_at'),
+                output_field=models.DateTimeField(),
+            )
+
+        if new_status in CLOSED_STATUSES:
+            changes['completed_at'] = models.Case(
+                models.When(~models.Q(status__in=CLOSED_STATUSES), then=models.Value(now)),
+                default=models.F('completed_at'),
+                output_field=models.DateTimeField(),
+            )
+        else:
+            changes['completed_at'] = models.Case(
+                models.When(status__in=CLOSED_STATUSES, then=models.Value(None)),
+                default=models.F('completed_at'),
+                output_field=models.DateTimeField(),
+            )
+
+        # same rule as status_transition: stop the scanner's clock, or have
+        # it re-check right away when the SLA clock starts again
+        if sla_clock_running(new_status):
+            changes['sla_next_check_at'] = models.Case(
+                models.When(models.Q(status=pending) | models.Q(status__in=CLOSED_STATUSES), then=models.Value(now)),
+                default=models.F('sla_next_check_at'),
+                output_field=models.DateTimeField(),
+            )
+        else:
+            changes['sla_next_check_at'] = None
+
+        changes.update(extra)
+        return self.update_tracked(**changes)
+
+    def update_tracked(self, **changes):
+        """
+        update() that also moves version and updated_at on, the way
+        Task.save does, so cached cards and page ETags notice the change.
+        """
+        return self.update(version=models.F('version') + 1, updated_at=timezone.now(), **changes)
+
+    def with_sla_progress(self, now=None):
+        """
+        Annotates sla_elapsed (effective seconds used) and sla_percent
+        (share of the SLA window consumed, 0-100) so tickets can be
+        filtered and ordered by SLA consumption in the database.
+        """
+        return self.annotate(**sla_progress_expressions(now))
+
+    def at_risk(self, threshold, now=None):
+        """
+        Tickets that have used at least `threshold` percent of their SLA
+        window, with the SLA progress annotated. sla_percent is only
+        computed for the rows of a few index ranges (see sla_at_risk_ranges),
+        combined with UNION since neither backend can OR partial indexes
+        together reliably.
+        """
+        now = now or timezone.now()
+        candidates = self.live().filter(due_date__isnull=False).alias(sla_window=sla_window_expression())
+        ranges = [candidates.filter(condition).values('pk') for condition in sla_at_risk_ranges(threshold, now)]
+        return (
+            self.filter(pk__in=ranges[0].union(*ranges[1:]))
+            .with_sla_progress(now)
+            .filter(sla_percent__gte=threshold)
+        )
+
+    def search(self, terms):
+        """Full-text search, best match first (see tasks/search.py)."""
+        return search_tasks(self, terms)
+
+
+class TaskManager(models.Manager.from_queryset(TaskQuerySet)):
+    def get_queryset(self):
+        # the search vector is only ever read by the database itself
+        return super().get_queryset().defer('search_vector')
+
+
 class Task(models.Model):
     """
     Represents a single ticket/task in the Eisenhower Matrix.
@@ -62,6 +279,7 @@ class Task(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True, help_text="")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     due_date = models.DateTimeField(blank=True, null=True, help_text="When the task is scheduled to be done")
 
     # --- Eisenhower Matrix Fields ---
@@ -72,6 +290,8 @@ class Task(models.Model):
     #creates unique identifier for every ticket.. 
     ticket_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     ticket_number = models.CharField(max_length=20, unique=True, null=True, blank=True)
+    # the ticket's id in the helpdesk it was imported from (manage.py import_tickets)
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True, editable=False)
     status = models.CharField(max_length=22, choices=Status.choices, default=Status.OPEN)
     category = models.CharField(max_length=22, choices=Category.choices, default=Category.GENERAL)
     requester = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='requested_tasks')
@@ -87,57 +307,199 @@ class Task(models.Model):
     paused_at = models.DateTimeField(null=True, blank=True)
     total_paused_duration = models.DurationField(default=timedelta(0))
 
+    # --- Cache versioning ---
+    # bumped by every save and tag change; part of the cached task card's key
+    # (see tasks/cards.py)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    # --- SLA escalation scanner (see tasks/sla.py scan_sla_breaches) ---
+    # when the next escalation threshold will be crossed, None while the SLA
+    # clock is stopped; sla_escalation_level is the highest threshold recorded
+    sla_next_check_at = models.DateTimeField(null=True, blank=True, editable=False)
+    sla_escalation_level = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    # --- Full-text search (Postgres; SQLite uses an FTS5 table, see tasks/search.py) ---
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = TaskManager()
+
+    class Meta:
+        # Partial indexes over the live (non-archived) rows only. The status is
+        # kept as a trailing column instead of in the condition so the
+        # "NOT IN (RESOLVED, CLOSED)" filter can be bound as query parameters
+        # and still match the index on both SQLite and Postgres.
+        indexes = [
+            # matrix_view: open work per assignee (or the unassigned pool) and quadrant
+            models.Index(
+                fields=['assignee', 'urgent', 'important', 'status'],
+                name='task_open_assignee_quad_idx',
+                condition=models.Q(is_archived=False),
+            ),
+            # my_tickets_view: a requester's tickets, newest first
+            models.Index(
+                fields=['requester', '-created_at', '-id'],
+                name='task_requester_created_idx',
+                condition=models.Q(is_archived=False),
+            ),
+            # ticket_list_view: unfiltered and status-filtered listings, newest first
+            # (the assignee filter is served by task_open_assignee_quad_idx)
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='task_live_created_idx',
+                condition=models.Q(is_archived=False),
+            ),
+            models.Index(
+                fields=['status', '-created_at', '-id'],
+                name='task_live_status_created_idx',
+                condition=models.Q(is_archived=False),
+            ),
+            # admin changelist date_hierarchy (covers archived tickets too)
+            models.Index(fields=['created_at'], name='task_created_idx'),
+            # page ETags: the latest change to any ticket (tasks/etags.py)
+            models.Index(fields=['updated_at'], name='task_updated_idx'),
+            # at_risk_view and SLA scans: live tickets that have a due date
+            models.Index(
+                fields=['due_date'],
+                name='task_live_due_idx',
+                condition=models.Q(is_archived=False, due_date__isnull=False),
+            ),
+            # at_risk(): the few tickets with a window longer than any SLA policy
+            models.Index(
+                sla_window_expression(),
+                name='task_live_sla_window_idx',
+                condition=models.Q(is_archived=False, due_date__isnull=False),
+            ),
+            # scan_sla_breaches: only tickets with an escalation coming up
+            models.Index(
+                fields=['sla_next_check_at', 'id'],
+                name='task_sla_next_check_idx',
+                condition=models.Q(is_archived=False, sla_next_check_at__isnull=False),
+            ),
+        ]
+
+    # --- dirty-field tracking ---
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # the reloaded columns match the database again; others keep their
+        # snapshot so unsaved edits to them still count as changes. Deferred
+        # fields are loaded through here too.
+        if fields is not None:
+            fields = set(fields)
+        loaded = getattr(self, '_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue
+            if fields is None or field.name in fields or field.attname in fields:
+                loaded[field.attname] = getattr(self, field.attname)
+        self._loaded_values = loaded
+
+    def _snapshot(self):
+        """Remembers the column values as they are in the database."""
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def get_dirty_fields(self):
+        """Names of the loaded fields whose value changed since the row was read."""
+        loaded = getattr(self, '_loaded_values', {})
+        return [
+            field.attname
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            and (field.attname not in loaded or loaded[field.attname] != getattr(self, field.attname))
+        ]
+
+    def _original_status(self):
+        loaded = getattr(self, '_loaded_values', {})
+        if 'status' in loaded:
+            return loaded['status']
+        # Instance wasn't loaded from the database (or status was deferred)
+        return Task.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+
     # --- save method ---
     def save(self, *args, **kwargs):
         # Check if this is a new task being created
         is_new = self.pk is None
 
-        # If the task is being update, get its old state from the database
+        # If the task is being updated, diff against the state it was loaded with
         if not is_new:
-            old_task = Task.objects.get(pk=self.pk)
-
-            # Check if the task is being paused
-            if old_task.status != self.Status.PENDING and self.status == self.Status.PENDING:
-                self.paused_at = timezone.now()
-            
-            # Check is the task is being resumed
-            elif old_task.status == self.Status.PENDING and self.status != self.Status.PENDING:
-                if self.paused_at:
-                    pause_duration = timezone.now() - self.paused_at
-                    self.total_paused_duration += pause_duration
-                    self.paused_at = None
-
-            # Check if the task is being completed
-            if not old_task.is_completed and self.is_completed: 
-                self.completed_at = timezone.now()
-            
-            # Check if it's being Re-opened
-            elif old_task.is_completed and not self.is_completed:
-                self.completed_at = None
+            changes = status_transition(
+                old_status=self._original_status(),
+                new_status=self.status,
+                paused_at=self.paused_at,
+                total_paused_duration=self.total_paused_duration,
+            )
+            # a new deadline starts a fresh round of escalations
+            loaded = getattr(self, '_loaded_values', {})
+            if 'due_date' in loaded and loaded['due_date'] != self.due_date:
+                changes['sla_escalation_level'] = 0
+                changes['sla_next_check_at'] = (
+                    timezone.now() if self.due_date and sla_clock_running(self.status) else None
+                )
+
+            for field, value in changes.items():
+                setattr(self, field, value)
+
+            # Only write the columns that actually changed
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(changes)
+            elif not kwargs.get('force_insert') and hasattr(self, '_loaded_values'):
+                kwargs['update_fields'] = self.get_dirty_fields()
+
+            # a real change moves the version on, in SQL so that concurrent
+            # saves can't hand out the same number
+            if kwargs.get('update_fields') is None or kwargs['update_fields']:
+                self.version = models.F('version') + 1
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = set(kwargs['update_fields']) | {'version', 'updated_at'}
 
         # Don't set due_date if it's already been provided
         if is_new and not self.due_date:
-            try:
-                #find the SLA policy that matches this task's quadrant
-                policy = SLAPolicy.objects.get(quadrant=self.quadrant)
-                self.due_date = timezone.now() + policy.resolution_time
-            
-            except SLAPolicy.DoesNotExist: 
-                pass
-
-        super().save(*args, **kwargs) # Save the object to get a primary key (self.pk)
-        
-        # If it was a new task, generate the ticket number
+            #find the SLA policy that matches this task's quadrant
+            self.due_date = due_date_for(self.quadrant)
+
+        # the SLA scanner works out the real check time on its first pass
+        if is_new and self.due_date and sla_clock_running(self.status):
+            self.sla_next_check_at = timezone.now()
+
+        # If it's a new task, take the next ticket number so the row is
+        # written complete in a single INSERT
         if is_new and not self.ticket_number:
-            self.ticket_number = f"OHM{self.pk:013d}"
-            # Save again just to update this one field
-            super().save(update_fields=['ticket_number'])
+            self.ticket_number = next_ticket_number()
+
+        # ...search document included (see tasks/signals.py reindex_task)
+        if is_new:
+            self.search_vector = new_task_search_vector(self)
+
+        super().save(*args, **kwargs)
+
+        if not isinstance(self.version, int):
+            # leave the new version deferred; it's loaded if anyone reads it
+            del self.__dict__['version']
+        if is_new:
+            # only ever read by the database, like on rows loaded through the manager
+            del self.__dict__['search_vector']
+        self._snapshot()
 
     def __str__(self):
         return f"{self.title} ({self.ticket_id})"
     
     @property
     def sla_progress_percent(self):
+        """
+        Share of the SLA window used so far, capped at 100. Kept in step with
+        the SQL version in tasks.sla.sla_progress_expressions().
+        """
         if not self.due_date: 
             return 0
         
@@ -150,7 +512,7 @@ class Task(models.Model):
         # if it's paused, subtract the time it has been paused so far
         if self.paused_at:
             current_pause_duration = timezone.now() - self.paused_at
-            effective_elapsed = time_elapsed - self.total_paused_duration
+            effective_elapsed = time_elapsed - self.total_paused_duration - current_pause_duration
 
         else:
             effective_elapsed = time_elapsed - self.total_paused_duration
@@ -193,23 +555,107 @@ class Comment(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'Comment by {self.author} on {self.task.title}'
 
+class Blob(models.Model):
+    """
+    File content stored once under its SHA-256, shared by every Attachment
+    with the same bytes. ref_count tracks how many attachments point at it;
+    the file is removed when it drops to zero (see tasks/blobs.py).
+    """
+    class PreviewState(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        PROCESSING = 'PROCESSING', 'Processing'
+        READY = 'READY', 'Ready'
+        NONE = 'NONE', 'No preview'
+        FAILED = 'FAILED', 'Failed'
+
+    class PreviewKind(models.TextChoices):
+        IMAGE = 'IMAGE', 'Image'
+        TEXT = 'TEXT', 'Text'
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='blobs', max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # filled in by the preview worker (manage.py process_previews), never
+    # during a request
+    preview_state = models.CharField(max_length=10, choices=PreviewState.choices, default=PreviewState.PENDING)
+    preview_kind = models.CharField(max_length=5, choices=PreviewKind.choices, blank=True)
+    preview = models.FileField(upload_to='previews', max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker's queue: only blobs still waiting for a preview
+            models.Index(
+                fields=['id'], name='blob_preview_pending_idx',
+                condition=models.Q(preview_state='PENDING'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256} ({self.ref_count} refs)"
+
+
 class Attachment(models.Model):
     """Represents a file attached to a task/ticket."""
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to=user_directory_path)
+    # chunked uploads keep their users/<username>/... path (see tasks/uploads.py)
+    file = models.FileField(upload_to=user_directory_path, max_length=255)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
 
     original_filename = models.CharField(max_length=255)
 
+    # shared, content-addressed copy of the file; `file` points at the same name
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='attachments')
+
+    def save(self, *args, **kwargs):
+        # A freshly uploaded file goes into the blob store instead of being
+        # written to its own path, so identical uploads share one copy
+        if self.file and not self.file._committed and self.blob_id is None:
+            self.blob = store_blob(self.file)
+            self.file.name = self.blob.file.name
+            self.file._committed = True
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.original_filename or self.file.name
     
 
+class UploadSession(models.Model):
+    """
+    A chunked, resumable upload in progress. The bytes are written straight
+    to `file_name` in storage as chunks arrive; once `offset` reaches `size`
+    the upload is turned into an Attachment (see tasks/uploads.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # null until the upload is claimed by a ticket (e.g. one being submitted)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions')
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    original_filename = models.CharField(max_length=255)
+    file_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    attachment = models.OneToOneField(Attachment, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
+
+    def __str__(self):
+        return f"{self.original_filename} ({self.offset}/{self.size})"
+
+
 class SLAPolicy(models.Model):
     """Stores the SLA rules, configurable in the admin panel"""
     QUADRANT_CHOICES = [
@@ -231,3 +677,103 @@ class SLAPolicy(models.Model):
 
 
 
+
+
+class SLAEscalation(models.Model):
+    """
+    Recorded once when a ticket crosses an SLA threshold (a percentage of
+    its window, see SLA_ESCALATION_THRESHOLDS) for a given due date.
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='sla_escalations')
+    threshold = models.PositiveSmallIntegerField()
+    due_date = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # makes recording idempotent: re-running a scan can't duplicate events
+            models.UniqueConstraint(fields=['task', 'threshold', 'due_date'], name='sla_escalation_once'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} crossed {self.threshold}% of its SLA"
+
+
+class TicketCounter(models.Model):
+    """
+    Named counters handed out in blocks by tasks.ticket_numbers. Used for
+    ticket numbers on databases without native sequences.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.last_value})"
+
+
+class TaskDeletionCounter(models.Model):
+    """
+    Single row counting every task ever deleted. A deleted task leaves no
+    updated_at behind, so this is the other half of the listing pages'
+    change stamp (see tasks/etags.py tasks_state).
+    """
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.count} tasks deleted"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by `manage.py run_jobs` (see tasks/jobs.py).
+    Finished jobs are deleted; failed ones stay for inspection.
+    """
+    class State(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        FAILED = 'FAILED', 'Failed'
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    # at most one queued job per key; enqueueing a duplicate is a no-op
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+    state = models.CharField(max_length=10, choices=State.choices, default=State.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'], name='job_queued_dedup_key_uniq',
+                condition=models.Q(state='QUEUED'),
+            ),
+        ]
+        indexes = [
+            # the workers' claim query: due jobs, oldest first
+            models.Index(
+                fields=['run_at', 'id'], name='job_queued_run_at_idx',
+                condition=models.Q(state='QUEUED'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.state})"
+
+
+class ApiToken(models.Model):
+    """
+    Bearer token for the JSON API (tasks/api.py), acting as `user`. Only a
+    SHA-256 of the token is stored; the token itself is shown once, by
+    `manage.py create_api_token`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, help_text="What the token is for, e.g. the monitoring system")
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.user})"
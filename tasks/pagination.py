@@ -0,0 +1,201 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def encode_cursor(created_at, pk):
+    '''
+    Packs a (created_at, id) position into an opaque, URL-safe string.
+    '''
+    raw = f'{created_at.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    '''
+    Reverses encode_cursor. Returns None for a missing or malformed cursor
+    so views can fall back to the first page instead of erroring.
+    '''
+    if not value:
+        return None
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def after_cursor(cursor, descending=False):
+    '''
+    Builds the keyset condition for rows that come after `cursor` in
+    (created_at, id) order. Unlike OFFSET, this stays an index seek no
+    matter how deep the page is: the redundant bound on created_at alone
+    is what lets the planner start the range scan at the cursor, as it
+    can't seek on the OR by itself.
+    '''
+    created_at, pk = cursor
+    if descending:
+        return Q(created_at__lte=created_at) & (
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+    return Q(created_at__gte=created_at) & (
+        Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+    )
+
+
+class KeysetPage:
+    '''
+    One page of a newest-first listing, plus the cursors for its neighbours.
+    '''
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def _cursor_for(obj):
+    return encode_cursor(obj.created_at, obj.pk)
+
+
+def keyset_paginate(queryset, per_page, after=None, before=None):
+    '''
+    Pages through `queryset` newest first on (created_at, id).
+
+    `after` continues towards older rows, `before` goes back towards newer
+    ones; both are cursors from a previous page. Each page is a single
+    index range scan of per_page + 1 rows however deep it is, so the cost
+    doesn't grow with the page number like OFFSET does.
+    '''
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before:
+        # walk backwards (oldest first) from the cursor, then flip the page
+        rows = list(
+            queryset.filter(after_cursor(before))
+            .order_by('created_at', 'pk')[:per_page + 1]
+        )
+        has_more = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        if not items:
+            return KeysetPage(items)
+        return KeysetPage(
+            items,
+            next_cursor=_cursor_for(items[-1]),
+            prev_cursor=_cursor_for(items[0]) if has_more else None,
+        )
+
+    if after:
+        queryset = queryset.filter(after_cursor(after, descending=True))
+    rows = list(queryset.order_by('-created_at', '-pk')[:per_page + 1])
+    items = rows[:per_page]
+    if not items:
+        return KeysetPage(items)
+    return KeysetPage(
+        items,
+        next_cursor=_cursor_for(items[-1]) if len(rows) > per_page else None,
+        prev_cursor=_cursor_for(items[0]) if after else None,
+    )
+
+
+class RankedPage(KeysetPage):
+    '''
+    A numbered page, for listings ordered by something other than
+    (created_at, id) such as search relevance.
+    '''
+
+    def __init__(self, items, number, has_next):
+        super().__init__(items)
+        self.number = number
+        self._has_next = has_next
+
+    @property
+    def has_next(self):
+        return self._has_next
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def ranked_paginate(queryset, per_page, page_number):
+    '''
+    Plain LIMIT/OFFSET paging for ranked results. Fetches one extra row to
+    know whether there is a next page, so no COUNT(*) is needed.
+    '''
+    try:
+        number = max(int(page_number or 1), 1)
+    except ValueError:
+        number = 1
+    offset = (number - 1) * per_page
+    rows = list(queryset[offset:offset + per_page + 1])
+    return RankedPage(rows[:per_page], number, has_next=len(rows) > per_page)
+
+
+# Below this many (estimated) rows an exact COUNT(*) is cheap enough to run
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    '''
+    Row count for a queryset without a full COUNT(*) on big tables.
+
+    On Postgres the planner's estimate is used: pg_class.reltuples for an
+    unfiltered table, or the row estimate from EXPLAIN otherwise. Small
+    results, and other backends, get an exact count.
+    '''
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                estimate = cursor.fetchone()[0]
+            else:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                estimate = plan[0]['Plan']['Plan Rows']
+        # reltuples is -1 for a table that has never been analysed
+        if estimate >= EXACT_COUNT_THRESHOLD:
+            return int(estimate)
+    return queryset.count()
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Paginator that reports estimated_count() instead of an exact count.'''
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
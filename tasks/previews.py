@@ -0,0 +1,159 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .jobs import background_job
+
+# Bytes sniffed to decide whether a blob is text, and the most text kept
+TEXT_PREVIEW_BYTES = 4096
+
+PDF_RENDER_TIMEOUT = 30
+
+
+def preview_path(sha256, extension):
+    '''Path will be: media/previews/<aa>/<bb>/<sha256>.<ext>'''
+    return os.path.join('previews', sha256[:2], sha256[2:4], f'{sha256}.{extension}')
+
+
+def _thumbnail(image):
+    from PIL import Image
+
+    size = getattr(settings, 'ATTACHMENT_THUMBNAIL_SIZE', 320)
+    image.seek(0)  # first frame of an animated GIF
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, 'WEBP', quality=80)
+    return out.getvalue()
+
+
+def _image_preview(path):
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            return _thumbnail(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        return None
+
+
+def _pdf_preview(path):
+    # rendered with poppler's pdftoppm; without it PDFs get no preview
+    pdftoppm = shutil.which('pdftoppm')
+    if not pdftoppm:
+        return None
+
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, 'page')
+        subprocess.run(
+            [pdftoppm, '-f', '1', '-l', '1', '-png', '-r', '72', '-singlefile', path, prefix],
+            check=True, capture_output=True, timeout=PDF_RENDER_TIMEOUT,
+        )
+        with Image.open(prefix + '.png') as image:
+            return _thumbnail(image)
+
+
+def _text_preview(head):
+    if b'\0' in head:
+        return None
+    try:
+        text = head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # a multi-byte character cut off by the sniff limit is fine
+        if e.start < len(head) - 3:
+            return None
+        text = head[:e.start].decode('utf-8')
+    return text.encode('utf-8')
+
+
+def render_preview(blob):
+    '''
+    Builds the preview for one blob and returns (kind, extension, bytes),
+    or None when the content has no preview. Type is sniffed from the
+    bytes, since a blob may be shared by attachments with different names.
+    '''
+    from .models import Blob
+
+    path = default_storage.path(blob.file.name)
+    with open(path, 'rb') as fh:
+        head = fh.read(TEXT_PREVIEW_BYTES)
+
+    if head.startswith(b'%PDF-'):
+        data = _pdf_preview(path)
+        return (Blob.PreviewKind.IMAGE, 'webp', data) if data else None
+
+    data = _image_preview(path)
+    if data:
+        return Blob.PreviewKind.IMAGE, 'webp', data
+
+    data = _text_preview(head)
+    if data:
+        return Blob.PreviewKind.TEXT, 'txt', data
+    return None
+
+
+def claim_blob(pk, states):
+    '''
+    Moves one blob from any of `states` to PROCESSING. The update is
+    conditional, so two workers never render the same blob.
+    '''
+    from .models import Blob
+
+    return bool(Blob.objects.filter(pk=pk, preview_state__in=states).update(
+        preview_state=Blob.PreviewState.PROCESSING
+    ))
+
+
+def claim_pending_blobs(limit):
+    '''Claims up to `limit` pending blobs and returns them.'''
+    from .models import Blob
+
+    candidates = (
+        Blob.objects.filter(preview_state=Blob.PreviewState.PENDING)
+        .order_by('pk').values_list('pk', flat=True)[:limit]
+    )
+    claimed = [pk for pk in candidates if claim_blob(pk, [Blob.PreviewState.PENDING])]
+    return list(Blob.objects.filter(pk__in=claimed).order_by('pk'))
+
+
+def generate_preview(blob):
+    '''Renders and stores one blob's preview, recording the outcome.'''
+    from .models import Blob
+
+    try:
+        result = render_preview(blob)
+    except Exception:
+        Blob.objects.filter(pk=blob.pk).update(preview_state=Blob.PreviewState.FAILED)
+        raise
+
+    if result is None:
+        Blob.objects.filter(pk=blob.pk).update(preview_state=Blob.PreviewState.NONE)
+        return None
+
+    kind, extension, data = result
+    name = preview_path(blob.sha256, extension)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    name = default_storage.save(name, ContentFile(data))
+    Blob.objects.filter(pk=blob.pk).update(
+        preview_state=Blob.PreviewState.READY, preview_kind=kind, preview=name,
+    )
+    return name
+
+
+@background_job('previews.generate')
+def generate_blob_preview(blob_id):
+    '''Job queued for every new blob (see signals.queue_blob_preview).'''
+    from .models import Blob
+
+    # FAILED too, so the job queue's retries get another go at it
+    if claim_blob(blob_id, [Blob.PreviewState.PENDING, Blob.PreviewState.FAILED]):
+        generate_preview(Blob.objects.get(pk=blob_id))
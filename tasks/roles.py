@@ -0,0 +1,72 @@
+import time
+
+from django.core.cache import cache
+
+from .caching import cache_is_shared
+
+# Name of the auth group whose members work the matrix and ticket queues
+OPERATORS_GROUP = 'Operators'
+
+ROLES_CACHE_TIMEOUT = 60 * 60
+ROLES_VERSION_KEY = 'tasks:roles:version'
+
+
+def _roles_key(user_pk):
+    # the version is bumped whenever a group is renamed or deleted, which
+    # orphans every cached entry at once instead of hunting them down
+    version = cache.get_or_set(ROLES_VERSION_KEY, time.time_ns, timeout=None)
+    return f'tasks:roles:v{version}:{user_pk}'
+
+
+def get_roles(user):
+    '''
+    Returns the set of group names the user belongs to.
+
+    The result is memoised on the user object for the rest of the request
+    and, when CACHES points at a backend every worker shares, in the cache
+    across requests, so permission checks on the hot path don't touch the
+    database. The signal handlers in tasks/signals.py invalidate it when
+    group membership changes.
+    '''
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_cached_roles', None)
+    if roles is not None:
+        return roles
+
+    if not cache_is_shared():
+        roles = frozenset(user.groups.values_list('name', flat=True))
+    else:
+        key = _roles_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+
+    user._cached_roles = roles
+    return roles
+
+
+def is_operator(user):
+    '''Checks if the user is in the "Operators" group.'''
+    return OPERATORS_GROUP in get_roles(user)
+
+
+def invalidate_user_roles(*user_pks):
+    '''Drops the cached roles for the given users.'''
+    if not cache_is_shared():
+        return
+    cache.delete_many([_roles_key(pk) for pk in user_pks])
+
+
+def invalidate_all_roles():
+    '''Drops every cached role set, e.g. after a group rename.'''
+    if not cache_is_shared():
+        return
+    try:
+        cache.incr(ROLES_VERSION_KEY)
+    except ValueError:
+        # the version key was evicted; a fresh timestamp can't collide
+        # with any version still referenced by cached entries
+        cache.set(ROLES_VERSION_KEY, time.time_ns(), timeout=None)
@@ -0,0 +1,125 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# Fields that feed the search document. Saving a task without touching any
+# of these (e.g. a status change) doesn't re-index it.
+SEARCHABLE_TASK_FIELDS = {'title', 'description', 'ticket_number'}
+
+SEARCH_CONFIG = 'english'
+
+# SQLite FTS5 table mirroring the searchable text, rowid = task id
+FTS_TABLE = 'tasks_task_fts'
+
+# Postgres: rebuilds the given tasks' search_vector in place. Title and ticket
+# number weigh the most, then the description, then the comment thread.
+POSTGRES_INDEX_SQL = f"""
+    UPDATE tasks_task SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(ticket_number, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(
+            (SELECT string_agg(text, ' ') FROM tasks_comment WHERE task_id = tasks_task.id), ''
+        )), 'C')
+    WHERE id IN ({{ids}})
+"""
+
+SQLITE_INDEX_SQL = f"""
+    INSERT OR REPLACE INTO {FTS_TABLE} (rowid, title, ticket_number, description, comments)
+    SELECT id, coalesce(title, ''), coalesce(ticket_number, ''), coalesce(description, ''),
+        coalesce((SELECT group_concat(text, ' ') FROM tasks_comment WHERE task_id = tasks_task.id), '')
+    FROM tasks_task WHERE id IN ({{ids}})
+"""
+
+# bm25 column weights, in the FTS table's column order
+SQLITE_RANK_SQL = f'-bm25({FTS_TABLE}, 10.0, 10.0, 4.0, 1.0)'
+
+
+def index_task(task_id):
+    '''
+    Refreshes the search document of a single task. Called from the save
+    and delete signals on Task and Comment, so the index stays current one
+    row at a time instead of being rebuilt.
+    '''
+    index_tasks([task_id])
+
+
+def new_task_search_vector(task):
+    '''
+    The search_vector of a task about to be inserted, built from its own
+    text (it has no comments yet), so Postgres writes the row complete in
+    its INSERT instead of indexing it with a second UPDATE. None on other
+    backends, whose index lives in a separate table.
+    '''
+    if connection.vendor != 'postgresql':
+        return None
+    return (
+        SearchVector(Value(task.title or ''), config=SEARCH_CONFIG, weight='A')
+        + SearchVector(Value(task.ticket_number or ''), config='simple', weight='A')
+        + SearchVector(Value(task.description or ''), config=SEARCH_CONFIG, weight='B')
+    )
+
+
+def index_tasks(task_ids):
+    '''index_task for many tasks in one statement, e.g. after a bulk import.'''
+    if not task_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(task_ids))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_INDEX_SQL.format(ids=placeholders), list(task_ids))
+        elif connection.vendor == 'sqlite':
+            cursor.execute(SQLITE_INDEX_SQL.format(ids=placeholders), list(task_ids))
+
+
+def unindex_task(task_id):
+    # on Postgres the vector lives on the row itself and goes with it
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [task_id])
+
+
+def _fts5_query(terms):
+    # quote every word so user input can't be parsed as FTS5 syntax;
+    # the last word is matched as a prefix for search-as-you-type
+    words = terms.split()
+    quoted = ['"%s"' % word.replace('"', '""') for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_tasks(queryset, terms):
+    '''
+    Narrows a Task queryset to the tickets matching `terms` (title,
+    description, comment text and ticket number), annotated with
+    search_rank and ordered best match first.
+    '''
+    terms = (terms or '').strip()
+    if not terms:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(terms, config=SEARCH_CONFIG, search_type='websearch')
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F('search_vector'), query))
+            .order_by('-search_rank', '-pk')
+        )
+
+    if connection.vendor == 'sqlite':
+        match = _fts5_query(terms)
+        return (
+            queryset.annotate(search_rank=RawSQL(
+                f'SELECT {SQLITE_RANK_SQL} FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = tasks_task.id',
+                [match], output_field=FloatField(),
+            ))
+            .filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+            .order_by('-search_rank', '-pk')
+        )
+
+    # no full-text support on this backend, fall back to a plain scan
+    return queryset.filter(
+        Q(title__icontains=terms) | Q(description__icontains=terms) | Q(ticket_number__iexact=terms)
+    ).order_by('-pk')
@@ -0,0 +1,138 @@
+from allauth.socialaccount.models import SocialAccount
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .context_processors import invalidate_google_connection
+from .etags import record_task_deletion
+from .blobs import release_blob
+from .jobs import enqueue
+from .live import publish_task_change
+from .matrix import CARD_FIELDS
+from .models import Attachment, Blob, Comment, SLAPolicy, Tag, Task
+from .previews import generate_blob_preview
+from .search import SEARCHABLE_TASK_FIELDS, index_task, unindex_task
+from .roles import invalidate_all_roles, invalidate_user_roles
+from .sla import invalidate_sla_policies
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    Keeps the cached roles in sync with group membership, whichever side
+    of the relation was edited (user.groups.add / group.user_set.add).
+    '''
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        # instance is a User
+        invalidate_user_roles(instance.pk)
+    elif pk_set:
+        # instance is a Group, pk_set holds the affected users
+        invalidate_user_roles(*pk_set)
+    else:
+        # group.user_set.clear() doesn't tell us who was removed
+        invalidate_all_roles()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, created=False, **kwargs):
+    # a brand new group has no members yet, so nothing is stale
+    if not created:
+        invalidate_all_roles()
+
+
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def social_account_changed(sender, instance, **kwargs):
+    # model signals rather than allauth's, so accounts removed in the admin,
+    # by a cascade or a queryset delete are noticed too
+    invalidate_google_connection(instance.user_id)
+
+
+@receiver(post_save, sender=SLAPolicy)
+@receiver(post_delete, sender=SLAPolicy)
+def sla_policy_changed(sender, **kwargs):
+    invalidate_sla_policies()
+
+
+@receiver(post_save, sender=Task)
+def reindex_task(sender, instance, created, update_fields=None, **kwargs):
+    # on Postgres a new task's vector was written by its INSERT (Task.save);
+    # otherwise only re-index when the searchable text could have changed
+    if created and connection.vendor == 'postgresql':
+        return
+    if created or update_fields is None or SEARCHABLE_TASK_FIELDS & set(update_fields):
+        index_task(instance.pk)
+
+
+@receiver(post_delete, sender=Task)
+def unindex_deleted_task(sender, instance, **kwargs):
+    unindex_task(instance.pk)
+    # retires the listing pages' ETags
+    record_task_deletion()
+
+
+def bump_task_versions(tasks):
+    # retires the cached cards and page ETags of these tasks
+    tasks.update_tracked()
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def task_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        # instance is a Task
+        bump_task_versions(Task.objects.filter(pk=instance.pk))
+    elif reverse and action in ('post_add', 'post_remove') and pk_set:
+        # instance is a Tag, pk_set holds the affected tasks
+        bump_task_versions(Task.objects.filter(pk__in=pk_set))
+    elif reverse and action == 'pre_clear':
+        # tag.task_set.clear() doesn't say which tasks, so look before it runs
+        bump_task_versions(Task.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Tag)
+def tag_renamed(sender, instance, created, **kwargs):
+    if not created:
+        bump_task_versions(Task.objects.filter(tags=instance))
+
+
+# columns that decide whether and how a task shows up on the matrix
+MATRIX_FIELDS = (set(CARD_FIELDS) - {'version'}) | {'assignee_id', 'is_archived'}
+
+
+@receiver(post_save, sender=Task)
+def push_matrix_update(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not MATRIX_FIELDS & set(update_fields):
+        return
+    # post_save runs before Task.save re-snapshots, so this is the old assignee
+    loaded = getattr(instance, '_loaded_values', {})
+    previous = loaded.get('assignee_id', instance.assignee_id)
+    publish_task_change(instance.pk, [previous, instance.assignee_id])
+
+
+@receiver(post_delete, sender=Task)
+def push_matrix_removal(sender, instance, **kwargs):
+    publish_task_change(instance.pk, [instance.assignee_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reindex_commented_task(sender, instance, **kwargs):
+    index_task(instance.task_id)
+
+
+@receiver(post_delete, sender=Attachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+
+
+@receiver(post_save, sender=Blob)
+def queue_blob_preview(sender, instance, created, **kwargs):
+    # previews are rendered by the job worker, never in the request
+    if created:
+        enqueue(generate_blob_preview, blob_id=instance.pk, dedup_key=f'preview:{instance.pk}')
@@ -0,0 +1,262 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, DurationField, ExpressionWrapper, F, FloatField, Func, Q, Value, When
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from .caching import cache_is_shared
+
+SLA_VERSION_KEY = 'tasks:sla_policies:version'
+
+_lock = threading.Lock()
+_policies = None
+_loaded_version = None
+_loaded_at = None
+
+
+def _current_version():
+    # The version lives in the shared cache, so a bump from one worker
+    # (e.g. an admin edit) is seen by every other worker on its next lookup
+    return cache.get_or_set(SLA_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def _is_stale(version, now):
+    if _policies is None:
+        return True
+    if version is not None:
+        return version != _loaded_version
+    return now - _loaded_at >= settings.SLA_POLICY_CACHE_TTL
+
+
+def get_policies():
+    '''
+    Returns {quadrant: resolution_time} for every SLAPolicy, from a
+    process-local copy of the table.
+
+    With a cache shared by every worker, the copy is re-read as soon as the
+    version stamp there has moved. Without one there is nowhere to keep a
+    version the other workers would see, so the copy is re-read once it is
+    SLA_POLICY_CACHE_TTL seconds old instead: an admin edit applies at once
+    in the worker that saved it and within the TTL everywhere else.
+    '''
+    global _policies, _loaded_version, _loaded_at
+    version = _current_version() if cache_is_shared() else None
+    now = time.monotonic()
+    with _lock:
+        if _is_stale(version, now):
+            from .models import SLAPolicy
+
+            _policies = dict(SLAPolicy.objects.values_list('quadrant', 'resolution_time'))
+            _loaded_version = version
+            _loaded_at = now
+        return _policies
+
+
+def due_date_for(quadrant, now=None):
+    '''
+    Works out the SLA due date for a task in `quadrant`, or None if no
+    policy covers that quadrant.
+    '''
+    resolution_time = get_policies().get(quadrant)
+    if resolution_time is None:
+        return None
+    return (now or timezone.now()) + resolution_time
+
+
+def assign_due_dates(tasks):
+    '''
+    Fills in due_date on every unsaved task that doesn't have one, counted
+    from its created_at, with a single policy lookup for the lot. Meant for
+    bulk_create paths, alongside ticket_numbers.assign_ticket_numbers.
+    '''
+    policies = get_policies()
+    now = timezone.now()
+    for task in tasks:
+        resolution_time = policies.get(task.quadrant)
+        if task.due_date is None and resolution_time is not None:
+            task.due_date = (task.created_at or now) + resolution_time
+    return tasks
+
+
+def invalidate_sla_policies():
+    '''
+    Forces this process to re-read the policy table on its next lookup, and
+    every other one too when the cache is shared.
+    '''
+    global _policies
+    with _lock:
+        _policies = None
+    if cache_is_shared():
+        cache.set(SLA_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+class EpochSeconds(Func):
+    """Seconds since the Unix epoch for a datetime column, as a float."""
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template='EXTRACT(EPOCH FROM %(expressions)s)', **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)',
+            **extra_context,
+        )
+
+
+class DurationSeconds(Func):
+    """Length of a DurationField column in seconds, as a float."""
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template='EXTRACT(EPOCH FROM %(expressions)s)', **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite stores durations as integer microseconds
+        return super().as_sql(
+            compiler, connection, template='(%(expressions)s / 1000000.0)', **extra_context
+        )
+
+
+def sla_progress_expressions(now=None):
+    '''
+    SQL equivalent of Task.sla_progress_percent, as annotations:
+
+    * sla_elapsed: seconds of SLA time used. The clock runs from created_at
+      to completed_at (or now), minus total_paused_duration and, while the
+      task is pending, the pause that is still in progress.
+    * sla_percent: sla_elapsed as a share of due_date - created_at, capped
+      at 100. 0 when there is no due date, 100 for an empty window.
+    '''
+    now_seconds = Value((now or timezone.now()).timestamp(), output_field=FloatField())
+    created = EpochSeconds('created_at')
+
+    current_pause = Case(
+        When(Q(paused_at__isnull=False, completed_at__isnull=True),
+             then=now_seconds - EpochSeconds('paused_at')),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    elapsed = (
+        Coalesce(EpochSeconds('completed_at'), now_seconds)
+        - created
+        - DurationSeconds('total_paused_duration')
+        - current_pause
+    )
+    window = EpochSeconds('due_date') - created
+
+    return {
+        'sla_elapsed': elapsed,
+        'sla_percent': Case(
+            When(due_date__isnull=True, then=Value(0.0)),
+            When(Q(due_date__lte=F('created_at')), then=Value(100.0)),
+            default=Least(F('sla_elapsed') * 100.0 / window, Value(100.0)),
+            output_field=FloatField(),
+        ),
+    }
+
+
+def sla_window_expression():
+    '''due_date - created_at, the length of a ticket's SLA window.'''
+    return ExpressionWrapper(F('due_date') - F('created_at'), output_field=DurationField())
+
+
+def sla_at_risk_ranges(threshold, now=None):
+    '''
+    Index ranges that between them hold every open ticket at or over
+    `threshold` percent of its SLA window, as a list of Q objects, so the
+    sla_percent filter only has to be computed for the rows they return.
+
+    The SLA clock never runs faster than real time, so a ticket at t% has
+    due_date - now <= window * (1 - t/100). For every window up to the
+    longest SLA policy that puts due_date in a range of task_live_due_idx;
+    the rarer tickets with a longer, hand-set window are found through
+    task_live_sla_window_idx. At 100% the first range alone is exact.
+    Expects sla_window (sla_window_expression) as an alias.
+    '''
+    now = now or timezone.now()
+    if threshold >= 100:
+        return [Q(due_date__lte=now)]
+    longest = max(get_policies().values(), default=timedelta(0))
+    return [Q(due_date__lte=now + longest * (1 - threshold / 100)), Q(sla_window__gt=longest)]
+
+
+def next_sla_check(task, level, thresholds):
+    '''
+    When `task` will cross the first threshold above `level` if its clock
+    keeps running, or None once every threshold has been recorded.
+    '''
+    window = task.due_date - task.created_at
+    for threshold in thresholds:
+        if threshold > level:
+            return task.created_at + task.total_paused_duration + window * (threshold / 100)
+    return None
+
+
+def scan_sla_breaches(now=None, batch_size=500):
+    '''
+    Records an SLAEscalation for every threshold that open, running tickets
+    have crossed since the last scan, and schedules each ticket's next
+    check. Only rows whose sla_next_check_at has passed are read (through
+    task_sla_next_check_idx), so a run costs O(tickets crossing a threshold)
+    and an idle run is a single index probe. Returns the events recorded.
+    '''
+    from .models import CLOSED_STATUSES, SLAEscalation, Task
+
+    now = now or timezone.now()
+    thresholds = sorted(settings.SLA_ESCALATION_THRESHOLDS)
+    recorded = 0
+
+    due = (
+        Task.objects.live()
+        .filter(sla_next_check_at__isnull=False, sla_next_check_at__lte=now)
+        .only('created_at', 'due_date', 'status', 'paused_at', 'total_paused_duration',
+              'sla_next_check_at', 'sla_escalation_level')
+        .order_by('sla_next_check_at', 'id')
+    )
+    if connection.vendor == 'postgresql':
+        # concurrent scanners take different batches
+        due = due.select_for_update(skip_locked=True)
+
+    while True:
+        with transaction.atomic():
+            batch = list(due[:batch_size])
+            if not batch:
+                break
+
+            events = []
+            for task in batch:
+                if task.due_date is None or task.paused_at or task.status in CLOSED_STATUSES:
+                    # the clock isn't running; a status change re-arms it
+                    task.sla_next_check_at = None
+                    continue
+
+                window = (task.due_date - task.created_at).total_seconds()
+                elapsed = (now - task.created_at - task.total_paused_duration).total_seconds()
+                percent = elapsed * 100 / window if window > 0 else float('inf')
+
+                for threshold in thresholds:
+                    if task.sla_escalation_level < threshold <= percent:
+                        events.append(SLAEscalation(task=task, threshold=threshold, due_date=task.due_date))
+                        task.sla_escalation_level = threshold
+
+                task.sla_next_check_at = next_sla_check(task, task.sla_escalation_level, thresholds)
+                if task.sla_next_check_at is not None and task.sla_next_check_at <= now:
+                    # rounding; never hand the same row back to this loop
+                    task.sla_next_check_at = now + timedelta(seconds=1)
+
+            SLAEscalation.objects.bulk_create(events, ignore_conflicts=True)
+            Task.objects.bulk_update(batch, ['sla_next_check_at', 'sla_escalation_level'])
+            recorded += len(events)
+
+    return recorded
@@ -1,3 +1,1579 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.admin.views.main import SEARCH_VAR
+from allauth.socialaccount.models import SocialAccount
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.db import connection, transaction
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .admin import INLINE_LIMIT
+from .api import create_token
+from .blobs import release_blob, store_blob
+from .bulk import apply_bulk_action
+from .cards import card_cache_stats, render_cards
+from .context_processors import google_connection_processor, is_google_connected
+from .imports import TicketImporter, read_records
+from .jobs import background_job, claim_job, enqueue, requeue_stale_jobs, retry_delay, run_job
+from .live import MAX_QUEUED_EVENTS, RESYNC, _put, broker, matrix_event_stream
+from .matrix import MATRIX_BUCKETS, load_bucket_page, load_matrix
+from .etags import tasks_state
+from .exports import export_rows
+from .forms import TaskForm
+from .models import Attachment, Blob, Comment, Job, SLAPolicy, Tag, Task, TaskDeletionCounter, TicketCounter, UploadSession
+from .pagination import after_cursor, decode_cursor, estimated_count, keyset_paginate
+from .previews import TEXT_PREVIEW_BYTES, claim_blob, generate_blob_preview
+from .roles import OPERATORS_GROUP, is_operator
+from .sla import SLA_VERSION_KEY, get_policies, invalidate_sla_policies, scan_sla_breaches
+from .uploads import UploadError, attach_upload, expire_uploads, start_upload, write_chunk
+from .ticket_numbers import TICKET_COUNTER_NAME, TicketNumberAllocator, assign_ticket_numbers
+from .views import SLA_AT_RISK_THRESHOLD
+
+
+class OpenWorkIndexTests(TestCase):
+    """The list views' WHERE clauses should be answered from the partial indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+        Task.objects.create(title='open', assignee=cls.user, requester=cls.user)
+        Task.objects.bulk_create(
+            Task(title=f'archived {i}', assignee=cls.user, requester=cls.user,
+                 ticket_number=f'ARCHIVED{i}', is_archived=True)
+            for i in range(50)
+        )
+        # give the planner row statistics, as a production database would have
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            # the test tables are tiny, so force the planner off a seq scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        elif connection.vendor != 'sqlite':
+            self.skipTest(f'no plan assertions for {connection.vendor}')
+        self.assertIn(index_name, queryset.explain())
+
+    def test_matrix_uses_assignee_quadrant_index(self):
+        qs = Task.objects.open().filter(assignee=self.user, urgent=True, important=True)
+        self.assertUsesIndex(qs, 'task_open_assignee_quad_idx')
+
+    def test_unassigned_pool_uses_assignee_quadrant_index(self):
+        qs = Task.objects.open().filter(assignee=None)
+        self.assertUsesIndex(qs, 'task_open_assignee_quad_idx')
+
+    def test_my_tickets_uses_requester_index(self):
+        qs = Task.objects.live().filter(requester=self.user).order_by('-created_at')
+        self.assertUsesIndex(qs, 'task_requester_created_idx')
+
+    def test_ticket_list_uses_created_index(self):
+        qs = Task.objects.live().order_by('-created_at')
+        self.assertUsesIndex(qs, 'task_live_created_idx')
+
+    def test_ticket_list_status_filter_uses_status_index(self):
+        qs = Task.objects.live().filter(status=Task.Status.OPEN).order_by('-created_at')
+        self.assertUsesIndex(qs, 'task_live_status_created_idx')
+
+
+class BulkActionTests(TestCase):
+    """Bulk status changes keep the same SLA bookkeeping as Task.save."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+
+    def test_pending_pauses_the_clock(self):
+        task = Task.objects.create(title='t', requester=self.user)
+        self.assertEqual(apply_bulk_action([task.pk], 'status', {'status': Task.Status.PENDING}), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.PENDING)
+        self.assertIsNotNone(task.paused_at)
+        self.assertEqual(task.version, 2)
+
+    def test_resuming_adds_the_pause(self):
+        task = Task.objects.create(title='t', requester=self.user, status=Task.Status.PENDING)
+        Task.objects.filter(pk=task.pk).update(paused_at=timezone.now() - timedelta(hours=2))
+        apply_bulk_action([task.pk], 'status', {'status': Task.Status.OPEN})
+        task.refresh_from_db()
+        self.assertIsNone(task.paused_at)
+        self.assertGreaterEqual(task.total_paused_duration, timedelta(hours=2))
+
+    def test_resolving_and_reopening(self):
+        task = Task.objects.create(title='t', requester=self.user)
+        apply_bulk_action([task.pk], 'status', {'status': Task.Status.RESOLVED})
+        task.refresh_from_db()
+        self.assertIsNotNone(task.completed_at)
+        apply_bulk_action([task.pk], 'status', {'status': Task.Status.IN_PROGRESS})
+        task.refresh_from_db()
+        self.assertIsNone(task.completed_at)
+
+    def test_archived_tickets_are_left_alone(self):
+        task = Task.objects.create(title='t', requester=self.user, is_archived=True)
+        self.assertEqual(apply_bulk_action([task.pk], 'archive', {}), 0)
+        task.refresh_from_db()
+        self.assertEqual(task.version, 1)
+
+
+class TemporaryMediaMixin:
+    """Runs each test against an empty, throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+
+class BlobStoreTests(TemporaryMediaMixin, TestCase):
+    """Attachments share blobs by content, and files only go once nothing needs them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+        cls.task = Task.objects.create(title='t', requester=cls.user)
+
+    def legacy_attachment(self, name, content):
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return Attachment.objects.create(
+            task=self.task, file=name, uploaded_by=self.user, original_filename=name,
+        )
+
+    def test_dedupe_shares_one_blob(self):
+        first = self.legacy_attachment('legacy/a.txt', b'same')
+        second = self.legacy_attachment('legacy/b.txt', b'same')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_attachments', stdout=io.StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(first.blob.ref_count, 2)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(default_storage.exists(first.file.name))
+        self.assertEqual(len(os.listdir(default_storage.path('legacy'))), 1)
+
+    def test_failed_batch_keeps_every_file(self):
+        self.legacy_attachment('legacy/a.txt', b'same')
+        self.legacy_attachment('legacy/b.txt', b'same')
+        with mock.patch.object(Attachment, 'save', side_effect=[None, RuntimeError('crash')]):
+            with self.assertRaises(RuntimeError):
+                call_command('dedupe_attachments', stdout=io.StringIO())
+
+        self.assertFalse(Blob.objects.exists())
+        self.assertTrue(default_storage.exists('legacy/a.txt'))
+        self.assertTrue(default_storage.exists('legacy/b.txt'))
+
+    def test_release_blob_deletes_the_last_reference(self):
+        blob = store_blob(ContentFile(b'content', name='c.txt'))
+        store_blob(ContentFile(b'content', name='c.txt'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_blob(blob.pk)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(default_storage.exists(blob.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_blob(blob.pk)
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(default_storage.exists(blob.file.name))
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages cover every row once, in order, and seek on the index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        Task.objects.bulk_create(
+            # pairs of tickets share a created_at, so the id tie-break matters
+            Task(title=f't{i}', ticket_number=f'KEYSET{i}', created_at=now - timedelta(minutes=i // 2))
+            for i in range(25)
+        )
+
+    def test_pages_walk_every_row_once(self):
+        tasks = Task.objects.live()
+        expected = list(tasks.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+        seen, after = [], None
+        while True:
+            page = keyset_paginate(tasks, 4, after=after)
+            seen += [task.pk for task in page]
+            if not page.has_next:
+                break
+            after = page.next_cursor
+        self.assertEqual(seen, expected)
+
+        # and back again from the last page
+        back = keyset_paginate(tasks, 4, before=page.prev_cursor)
+        self.assertEqual([task.pk for task in back], expected[-5:-1])
+
+    def test_cursor_condition_is_an_index_range(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest(f'no plan assertions for {connection.vendor}')
+        cursor = (timezone.now(), 10)
+        plan = Task.objects.live().filter(status=Task.Status.OPEN).filter(
+            after_cursor(cursor, descending=True)
+        ).order_by('-created_at', '-id').explain()
+        self.assertIn('task_live_status_created_idx (status=? AND created_at<?)', plan)
+
+
+class TicketImportTests(TestCase):
+    """Re-running an import skips what a previous run already wrote."""
+
+    RECORDS = [
+        {'id': 'A-1', 'title': 'Printer jam', 'status': 'resolved', 'tags': ['printer']},
+        {'id': 'A-2', 'title': 'VPN down'},
+        {'id': 'A-3', 'title': ''},
+    ]
+
+    def import_lines(self, records):
+        importer = TicketImporter()
+        stream = io.StringIO(''.join(json.dumps(record) + '\n' for record in records))
+        return importer.run(read_records(stream, 'jsonl', importer.error), batch_size=2)
+
+    def test_rerun_resumes(self):
+        counts = self.import_lines(self.RECORDS[:1])
+        self.assertEqual(counts['tickets'], 1)
+
+        counts = self.import_lines(self.RECORDS)
+        self.assertEqual((counts['tickets'], counts['skipped'], counts['errors']), (1, 1, 1))
+
+        task = Task.objects.get(external_id='A-1')
+        self.assertEqual(task.status, Task.Status.RESOLVED)
+        self.assertIsNotNone(task.completed_at)
+        self.assertEqual([tag.name for tag in task.tags.all()], ['printer'])
+        self.assertEqual(Task.objects.filter(external_id__startswith='A-').count(), 2)
+
+    def test_old_timestamps_are_kept(self):
+        author = User.objects.create_user('agent')
+        self.import_lines([{
+            'id': 'B-1', 'title': 'Old', 'created_at': '2019-03-01T09:00:00Z',
+            'comments': [{'author': 'agent', 'text': 'seen', 'created_at': '2019-03-02T10:00:00Z'}],
+        }])
+        task = Task.objects.get(external_id='B-1')
+        self.assertEqual(task.created_at.year, 2019)
+        self.assertEqual(task.comments.get().created_at.date().isoformat(), '2019-03-02')
+
+        # new rows elsewhere still get stamped
+        self.assertTrue(Task._meta.get_field('created_at').auto_now_add)
+        fresh = Comment.objects.create(task=task, author=author, text='new', created_at=task.created_at)
+        self.assertEqual(fresh.created_at.date(), timezone.now().date())
+
+
+class ApiAuthTests(TestCase):
+    """API callers use a bearer token, or their session with a CSRF token for writes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+        cls.user.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+        cls.token = create_token(cls.user, 'tests')
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.url = reverse('tasks:api_tasks')
+
+    def post_task(self, **extra):
+        return self.client.post(self.url, json.dumps({'title': 'From the API'}),
+                                content_type='application/json', **extra)
+
+    def test_bearer_token(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 200)
+        # tokens can't be sent by another site, so writes need no CSRF token
+        self.assertEqual(self.post_task(HTTP_AUTHORIZATION=f'Bearer {self.token}').status_code, 201)
+
+    def test_bad_or_revoked_token(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_anonymous(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_session_writes_need_csrf(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.post_task().status_code, 403)
+
+        self.client.get(reverse('tasks:ticket_list'))  # sets the CSRF cookie
+        csrf_token = self.client.cookies[settings.CSRF_COOKIE_NAME].value
+        self.assertEqual(self.post_task(HTTP_X_CSRFTOKEN=csrf_token).status_code, 201)
+
+
+class MatrixBucketTests(TestCase):
+    """The matrix loads every quadrant in one query, capped per quadrant."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+        other = User.objects.create_user('other', password='pw')
+        now = timezone.now()
+
+        def task(title, minutes, **fields):
+            return Task(title=title, ticket_number=title, created_at=now + timedelta(minutes=minutes), **fields)
+
+        Task.objects.bulk_create([
+            *(task(f'DO{i}', i, assignee=cls.user, urgent=True, important=True) for i in range(4)),
+            task('SCHED', 0, assignee=cls.user, important=True),
+            task('DELEG', 0, assignee=cls.user, urgent=True),
+            task('POOL', 0),
+            # none of these belong on the matrix
+            task('OTHER', 0, assignee=other, urgent=True, important=True),
+            task('DONE', 0, assignee=cls.user, status=Task.Status.RESOLVED),
+            task('ARCHIVED', 0, assignee=cls.user, is_archived=True),
+        ])
+
+    def numbers(self, tasks):
+        return [task.ticket_number for task in tasks]
+
+    def test_one_query_fills_every_bucket(self):
+        with self.assertNumQueries(1):
+            matrix = load_matrix(self.user, cap=3)
+
+        self.assertEqual(set(matrix), set(MATRIX_BUCKETS))
+        tasks, cursor = matrix['do_first']
+        self.assertEqual(self.numbers(tasks), ['DO0', 'DO1', 'DO2'])
+        self.assertIsNotNone(cursor)
+        self.assertEqual(self.numbers(matrix['schedule'][0]), ['SCHED'])
+        self.assertEqual(self.numbers(matrix['delegate'][0]), ['DELEG'])
+        self.assertEqual(self.numbers(matrix['unassigned'][0]), ['POOL'])
+        self.assertEqual(matrix['delete'], ([], None))
+        self.assertIsNone(matrix['schedule'][1])
+
+    def test_show_more_continues_after_the_cursor(self):
+        tasks, cursor = load_matrix(self.user, cap=3)['do_first']
+        more, next_cursor = load_bucket_page(self.user, 'do_first', decode_cursor(cursor), cap=3)
+        self.assertEqual(self.numbers(more), ['DO3'])
+        self.assertIsNone(next_cursor)
+
+
+class RoleCacheTests(TestCase):
+    """Role checks query the groups once, and membership changes show up at once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+        cls.group = Group.objects.create(name=OPERATORS_GROUP)
+        cls.user.groups.add(cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_user(self):
+        # a new request loads a new User object
+        return User.objects.get(pk=self.user.pk)
+
+    def test_memoised_for_the_request(self):
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(is_operator(user))
+            self.assertTrue(is_operator(user))
+
+    def test_per_process_cache_rereads_each_request(self):
+        self.assertTrue(is_operator(self.fresh_user()))
+        self.group.user_set.remove(self.user)
+        self.assertFalse(is_operator(self.fresh_user()))
+
+    @mock.patch('tasks.roles.cache_is_shared', return_value=True)
+    def test_shared_cache_spans_requests(self, _):
+        self.assertTrue(is_operator(self.fresh_user()))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_operator(user))
+
+        # either side of the relation invalidates
+        self.group.user_set.remove(self.user)
+        self.assertFalse(is_operator(self.fresh_user()))
+        self.user.groups.add(self.group)
+        self.assertTrue(is_operator(self.fresh_user()))
+
+    @mock.patch('tasks.roles.cache_is_shared', return_value=True)
+    def test_group_rename_drops_every_entry(self, _):
+        self.assertTrue(is_operator(self.fresh_user()))
+        self.group.name = 'Former operators'
+        self.group.save()
+        self.assertFalse(is_operator(self.fresh_user()))
+
+
+class GoogleConnectionTests(TestCase):
+    """The "connect Google" flag is looked up lazily and never goes stale."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def connect(self):
+        return SocialAccount.objects.create(user=self.user, provider='google', uid='123')
+
+    def test_lookup_only_when_read(self):
+        request = RequestFactory().get('/')
+        request.user = self.fresh_user()
+        with self.assertNumQueries(0):
+            context = google_connection_processor(request)
+        with self.assertNumQueries(1):
+            self.assertFalse(context['is_google_connected'])
+            self.assertFalse(is_google_connected(request.user))
+
+    def test_per_process_cache_rereads_each_request(self):
+        self.assertFalse(is_google_connected(self.fresh_user()))
+        self.connect()
+        self.assertTrue(is_google_connected(self.fresh_user()))
+
+    @mock.patch('tasks.context_processors.cache_is_shared', return_value=True)
+    def test_shared_cache_follows_account_changes(self, _):
+        self.assertFalse(is_google_connected(self.fresh_user()))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertFalse(is_google_connected(user))
+
+        self.connect()
+        self.assertTrue(is_google_connected(self.fresh_user()))
+        # removed without going through allauth, as the admin would
+        SocialAccount.objects.filter(user=self.user).delete()
+        self.assertFalse(is_google_connected(self.fresh_user()))
+
+
+class DirtyFieldSaveTests(TestCase):
+    """Task.save writes only what changed, diffing against the loaded row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+
+    def create(self, **fields):
+        return Task.objects.get(pk=Task.objects.create(title='t', requester=self.user, **fields).pk)
+
+    def test_only_changed_columns_are_written(self):
+        task = self.create()
+        # someone else changes the status in the meantime
+        Task.objects.filter(pk=task.pk).update(status=Task.Status.IN_PROGRESS)
+        task.title = 'renamed'
+        task.save()
+
+        task = Task.objects.get(pk=task.pk)
+        self.assertEqual(task.title, 'renamed')
+        self.assertEqual(task.status, Task.Status.IN_PROGRESS)
+        self.assertEqual(task.version, 2)
+
+    def test_unchanged_save_writes_nothing(self):
+        task = self.create()
+        with self.assertNumQueries(0):
+            task.save()
+        self.assertEqual(Task.objects.get(pk=task.pk).version, 1)
+
+    def test_each_save_bumps_the_version(self):
+        task = self.create()
+        for title in ('one', 'two'):
+            task.title = title
+            task.save()
+        # the new version is read back from the database on access
+        self.assertEqual(task.version, 3)
+        task.title = 'three'
+        task.save()
+        self.assertEqual(Task.objects.get(pk=task.pk).version, 4)
+
+    def test_pausing_and_resuming(self):
+        task = self.create()
+        task.status = Task.Status.PENDING
+        task.save()
+        self.assertIsNotNone(Task.objects.get(pk=task.pk).paused_at)
+
+        Task.objects.filter(pk=task.pk).update(paused_at=timezone.now() - timedelta(hours=1))
+        task.refresh_from_db()
+        task.status = Task.Status.OPEN
+        task.save()
+
+        task = Task.objects.get(pk=task.pk)
+        self.assertEqual(task.status, Task.Status.OPEN)
+        self.assertIsNone(task.paused_at)
+        self.assertGreaterEqual(task.total_paused_duration, timedelta(hours=1))
+
+    def test_resolving_and_reopening(self):
+        task = self.create()
+        task.status = Task.Status.RESOLVED
+        task.save()
+        self.assertIsNotNone(Task.objects.get(pk=task.pk).completed_at)
+
+        task.status = Task.Status.OPEN
+        task.save()
+        self.assertIsNone(Task.objects.get(pk=task.pk).completed_at)
+
+    def test_refresh_takes_a_new_snapshot(self):
+        task = self.create()
+        # paused elsewhere, e.g. by a bulk action, while the task was loaded
+        Task.objects.filter(pk=task.pk).update_status(Task.Status.PENDING)
+        task.refresh_from_db()
+        task.status = Task.Status.OPEN
+        task.save()
+
+        task = Task.objects.get(pk=task.pk)
+        self.assertEqual(task.status, Task.Status.OPEN)
+        self.assertIsNone(task.paused_at)
+
+    def test_partial_refresh_keeps_other_edits(self):
+        task = self.create()
+        task.title = 'renamed'
+        task.refresh_from_db(fields=['status'])
+        task.save()
+        self.assertEqual(Task.objects.get(pk=task.pk).title, 'renamed')
+
+    def test_deferred_fields(self):
+        task = Task.objects.only('title').get(pk=self.create().pk)
+        self.assertEqual(task.status, Task.Status.OPEN)  # loads the deferred field
+        task.status = Task.Status.RESOLVED
+        task.save()
+        self.assertIsNotNone(Task.objects.get(pk=task.pk).completed_at)
+
+
+class TicketNumberTests(TestCase):
+    """Ticket numbers are reserved ahead of the INSERT, in blocks where that's safe."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+
+    def test_numbers_are_unique_and_formatted(self):
+        tasks = [Task.objects.create(title=f't{i}', requester=self.user) for i in range(3)]
+        numbers = [task.ticket_number for task in tasks]
+        self.assertEqual(len(set(numbers)), 3)
+        for number in numbers:
+            self.assertRegex(number, r'^OHM\d{13}$')
+
+    def test_new_task_is_a_single_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            Task.objects.create(title='t', requester=self.user)
+        task_writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT INTO "tasks_task"', 'UPDATE "tasks_task"'))]
+        self.assertEqual(len(task_writes), 1)
+        self.assertTrue(task_writes[0].startswith('INSERT'))
+
+    @override_settings(TICKET_NUMBER_BLOCK_SIZE=5)
+    def test_blocks_are_reserved_outside_transactions(self):
+        allocator = TicketNumberAllocator()
+        with mock.patch.object(allocator, '_can_cache', return_value=True):
+            first = allocator.allocate(1)
+            with self.assertNumQueries(0):
+                rest = allocator.allocate(4)
+        self.assertEqual(first + rest, list(range(first[0], first[0] + 5)))
+
+    def test_bulk_paths_reserve_in_one_go(self):
+        tasks = assign_ticket_numbers([Task(title=f't{i}') for i in range(4)] + [Task(title='x', ticket_number='KEPT')])
+        numbers = [task.ticket_number for task in tasks]
+        self.assertEqual(numbers[-1], 'KEPT')
+        self.assertEqual(len(set(numbers)), 5)
+
+    def test_deletions_are_counted_apart_from_ticket_numbers(self):
+        task = Task.objects.create(title='t', requester=self.user)
+        before = tasks_state()
+        task.delete()
+        self.assertNotEqual(tasks_state(), before)
+        self.assertEqual(TaskDeletionCounter.objects.get().count, 1)
+        self.assertFalse(TicketCounter.objects.exclude(name=TICKET_COUNTER_NAME).exists())
+
+
+class SLAPolicyCacheTests(TestCase):
+    """Due dates come from a process-local copy of the SLA policies."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+
+    def setUp(self):
+        cache.clear()
+        invalidate_sla_policies()
+        # the rows go with the test's transaction, so must the copy
+        self.addCleanup(invalidate_sla_policies)
+        self.policy = SLAPolicy.objects.create(name='Critical', quadrant='do_first', resolution_time=timedelta(hours=4))
+
+    def policy_reads(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return sum('tasks_slapolicy' in query['sql'] for query in queries)
+
+    def test_saving_tasks_reuses_the_copy(self):
+        def create():
+            return Task.objects.create(title='t', requester=self.user, urgent=True, important=True)
+
+        get_policies()
+        self.assertEqual(self.policy_reads(create), 0)
+        task = create()
+        self.assertAlmostEqual(task.due_date, task.created_at + timedelta(hours=4), delta=timedelta(seconds=5))
+
+    def test_edit_applies_at_once_in_this_process(self):
+        get_policies()
+        self.policy.resolution_time = timedelta(hours=1)
+        self.policy.save()
+        self.assertEqual(get_policies()['do_first'], timedelta(hours=1))
+
+    def test_per_process_copy_expires(self):
+        get_policies()
+        # an edit made by another worker doesn't reach this one's copy...
+        SLAPolicy.objects.filter(pk=self.policy.pk).update(resolution_time=timedelta(hours=1))
+        self.assertEqual(get_policies()['do_first'], timedelta(hours=4))
+        # ...until the TTL runs out
+        with override_settings(SLA_POLICY_CACHE_TTL=0):
+            self.assertEqual(get_policies()['do_first'], timedelta(hours=1))
+
+    @mock.patch('tasks.sla.cache_is_shared', return_value=True)
+    def test_shared_version_stamp(self, _):
+        get_policies()
+        self.assertEqual(self.policy_reads(get_policies), 0)
+        # another worker's edit moves the shared version stamp
+        SLAPolicy.objects.filter(pk=self.policy.pk).update(resolution_time=timedelta(hours=1))
+        cache.set(SLA_VERSION_KEY, 0, timeout=None)
+        self.assertEqual(get_policies()['do_first'], timedelta(hours=1))
+
+
+class AtRiskTests(TestCase):
+    """SLA progress is computed in SQL, only for rows an index range leaves."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw')
+        cls.user.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+
+    def setUp(self):
+        invalidate_sla_policies()
+        self.addCleanup(invalidate_sla_policies)
+        SLAPolicy.objects.create(name='Low', quadrant='backlog', resolution_time=timedelta(days=2))
+        self.now = timezone.now()
+
+    def task(self, title, used, window, **fields):
+        # a ticket that has used `used` of a `window` long SLA
+        task = Task.objects.create(title=title, requester=self.user, due_date=self.now - used + window, **fields)
+        Task.objects.filter(pk=task.pk).update(created_at=self.now - used)
+        return task
+
+    def titles(self, threshold):
+        return sorted(Task.objects.open().at_risk(threshold, self.now).values_list('title', flat=True))
+
+    def test_threshold(self):
+        self.task('fresh', timedelta(hours=2), timedelta(days=2))
+        self.task('at risk', timedelta(hours=40), timedelta(days=2))
+        self.task('breached', timedelta(days=3), timedelta(days=2))
+        self.task('resolved', timedelta(days=3), timedelta(days=2), status=Task.Status.RESOLVED)
+        self.assertEqual(self.titles(75), ['at risk', 'breached'])
+        self.assertEqual(self.titles(100), ['breached'])
+        self.assertEqual(self.titles(0), ['at risk', 'breached', 'fresh'])
+
+    def test_windows_longer_than_any_policy(self):
+        # a hand-set due date, far beyond the longest policy's reach
+        self.task('long', timedelta(days=80), timedelta(days=100))
+        self.task('long and fresh', timedelta(days=1), timedelta(days=100))
+        self.assertEqual(self.titles(75), ['long'])
+
+    def test_paused_time_doesnt_count(self):
+        task = self.task('paused', timedelta(hours=40), timedelta(days=2))
+        Task.objects.filter(pk=task.pk).update(total_paused_duration=timedelta(hours=30))
+        self.assertEqual(self.titles(75), [])
+
+    def test_sql_matches_the_python_progress(self):
+        task = self.task('t', timedelta(hours=12), timedelta(days=2))
+        annotated = Task.objects.with_sla_progress().get(pk=task.pk)
+        task.refresh_from_db()
+        self.assertAlmostEqual(annotated.sla_percent, task.sla_progress_percent, places=1)
+
+    def test_candidates_come_from_index_ranges(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest(f'no plan assertions for {connection.vendor}')
+        plan = Task.objects.open().at_risk(75, self.now).explain()
+        self.assertIn('USING INDEX task_live_due_idx (due_date>? AND due_date<?)', plan)
+        self.assertIn('USING INDEX task_live_sla_window_idx', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_view_pages_and_bad_thresholds(self):
+        self.client.force_login(self.user)
+        self.task('breached', timedelta(days=3), timedelta(days=2))
+        for threshold, used in [('nan', SLA_AT_RISK_THRESHOLD), ('inf', SLA_AT_RISK_THRESHOLD),
+                                ('abc', SLA_AT_RISK_THRESHOLD), ('-5', 0), ('250', 100)]:
+            response = self.client.get(reverse('tasks:at_risk'), {'threshold': threshold})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['threshold'], used)
+        self.assertEqual([task.title for task in response.context['page']], ['breached'])
+
+
+class UserLookupTests(TestCase):
+    """User pickers page through users on demand instead of rendering them all."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = User.objects.create_user('operator', password='pw')
+        cls.operator.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+        for name in ('alice', 'alan', 'albert', 'bob'):
+            User.objects.create_user(name, password='pw')
+        User.objects.create_user('alfred', password='pw', is_active=False)
+
+    def setUp(self):
+        self.client.force_login(self.operator)
+
+    def lookup(self, **params):
+        response = self.client.get(reverse('tasks:user_lookup'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_in_any_case(self):
+        data = self.lookup(q='AL')
+        self.assertEqual([user['username'] for user in data['results']], ['alan', 'albert', 'alice'])
+        self.assertIsNone(data['next'])
+
+    @mock.patch('tasks.views.USER_LOOKUP_PAGE_SIZE', 2)
+    def test_pages(self):
+        first = self.lookup(q='al')
+        self.assertEqual([user['username'] for user in first['results']], ['alan', 'albert'])
+        second = self.lookup(q='al', after=first['next'])
+        self.assertEqual([user['username'] for user in second['results']], ['alice'])
+        self.assertIsNone(second['next'])
+
+    def test_operators_only(self):
+        data = self.lookup(role='operators')
+        self.assertEqual([user['username'] for user in data['results']], ['operator'])
+
+        self.client.force_login(User.objects.get(username='bob'))
+        self.assertEqual(self.client.get(reverse('tasks:user_lookup')).status_code, 403)
+
+    def test_prefix_uses_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest(f'no plan assertions for {connection.vendor}')
+        plan = User.objects.filter(username__istartswith='al').explain()
+        self.assertIn('auth_user_username_nocase', plan)
+
+    def test_forms_only_render_the_selected_user(self):
+        task = Task.objects.create(title='t', requester=User.objects.get(username='bob'))
+        html = str(TaskForm(instance=task)['requester'])
+        self.assertIn('>bob<', html)
+        self.assertNotIn('alan', html)
+        self.assertIn(reverse('tasks:user_lookup'), html)
+
+        response = self.client.get(reverse('tasks:ticket_list'), {'requester': task.requester_id})
+        self.assertEqual(response.context['current_requester_name'], 'bob')
+        self.assertNotContains(response, 'albert')
+
+
+class TicketSearchTests(TestCase):
+    """Ranked full-text search over titles, descriptions, comments and numbers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='pw', is_staff=True, is_superuser=True)
+        cls.user.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+        cls.mention = Task.objects.create(title='Laptop', description='the printer next to it is loud', requester=cls.user)
+        cls.title = Task.objects.create(title='Printer jammed', description='printer tray', requester=cls.user)
+        cls.other = Task.objects.create(title='VPN down', requester=cls.user)
+
+    def search(self, terms):
+        return list(Task.objects.search(terms))
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('printer'), [self.title, self.mention])
+
+    def test_comments_and_ticket_numbers(self):
+        Comment.objects.create(task=self.other, author=self.user, text='rebooted the firewall')
+        self.assertEqual(self.search('firewall'), [self.other])
+        self.assertEqual(self.search(self.other.ticket_number), [self.other])
+
+    def test_edits_are_reindexed(self):
+        self.other.title = 'Printer toner'
+        self.other.save()
+        self.assertIn(self.other, self.search('toner'))
+        self.other.delete()
+        self.assertEqual(self.search('toner'), [])
+
+    def test_user_input_isnt_query_syntax(self):
+        self.assertEqual(self.search('"printer OR (NEAR'), [])
+        self.assertEqual(self.search('jam'), [self.title])  # the last word is a prefix
+
+    def test_ticket_list_pages_ranked_results(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('tasks:ticket_list'), {'q': 'printer'})
+        self.assertEqual(list(response.context['page']), [self.title, self.mention])
+
+    def admin_results(self, term):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:tasks_task_changelist'), {SEARCH_VAR: term})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['cl'].result_list)
+
+    def test_admin_search_is_ranked(self):
+        self.assertEqual(self.admin_results('printer'), [self.title, self.mention])
+
+    def test_admin_finds_ticket_ids_and_numbers_exactly(self):
+        self.assertEqual(self.admin_results(str(self.mention.ticket_id)), [self.mention])
+        self.assertEqual(self.admin_results(self.other.ticket_number.lower()), [self.other])
+
+
+class TaskAdminTests(TestCase):
+    """The Task changelist and change page cost the same at any table size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('admin', password='pw', is_staff=True, is_superuser=True)
+        cls.user.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+        User.objects.create_user('requester', password='pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_tasks(self, count):
+        Task.objects.bulk_create(Task(title=f't{i}', assignee=self.user) for i in range(count))
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:tasks_task_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_dont_grow_with_rows(self):
+        self.add_tasks(3)
+        few = self.changelist_queries()
+        self.add_tasks(30)
+        self.assertEqual(self.changelist_queries(), few)
+
+    def test_assignee_filter_only_lists_operators(self):
+        response = self.client.get(reverse('admin:tasks_task_changelist'))
+        assignee_filter = next(spec for spec in response.context['cl'].filter_specs if spec.title == 'assignee')
+        self.assertEqual(
+            [title for _, title in assignee_filter.lookup_choices],
+            ['Unassigned', 'admin'],
+        )
+
+    def test_change_page_only_shows_recent_comments(self):
+        task = Task.objects.create(title='t', requester=self.user)
+        Comment.objects.bulk_create(Comment(task=task, author=self.user, text=f'c{i}') for i in range(INLINE_LIMIT + 5))
+        response = self.client.get(reverse('admin:tasks_task_change', args=[task.pk]))
+        self.assertEqual(response.status_code, 200)
+        comments = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(comments.get_queryset()), INLINE_LIMIT)
+
+    def test_estimated_count_is_exact_for_small_tables(self):
+        self.add_tasks(5)
+        self.assertEqual(estimated_count(Task.objects.all()), 5)
+        self.assertEqual(estimated_count(Task.objects.filter(title='t1')), 1)
+
+
+class ChunkedUploadTests(TemporaryMediaMixin, TestCase):
+    """Uploads arrive in resumable chunks and become attachments without a copy."""
+
+    CONTENT = b'0123456789' * 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('requester', password='pw')
+        cls.task = Task.objects.create(title='t', requester=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def start(self, **params):
+        return self.client.post(reverse('tasks:upload_start'), {'filename': 'notes.txt', 'size': len(self.CONTENT), **params})
+
+    def patch(self, url, offset, data):
+        return self.client.patch(url, data, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_resumable_upload_becomes_an_attachment(self):
+        response = self.start(task=self.task.pk)
+        self.assertEqual(response.status_code, 201)
+        url = response.json()['url']
+
+        self.assertEqual(self.patch(url, 0, self.CONTENT[:12]).json()['offset'], 12)
+        # a retried chunk at a stale offset is refused, with the real offset
+        response = self.patch(url, 0, self.CONTENT[:12])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 12)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '12')
+
+        state = self.patch(url, 12, self.CONTENT[12:]).json()
+        self.assertTrue(state['complete'])
+        self.assertEqual(state['sha256'], hashlib.sha256(self.CONTENT).hexdigest())
+
+        attachment = self.task.attachments.get()
+        self.assertEqual(attachment.original_filename, 'notes.txt')
+        with attachment.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.CONTENT)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.start(task='abc').status_code, 400)
+        self.assertEqual(self.start(size='lots').status_code, 400)
+        other = Task.objects.create(title='not mine', requester=User.objects.create_user('other'))
+        self.assertEqual(self.start(task=other.pk).status_code, 404)
+
+        url = self.start().json()['url']
+        self.assertEqual(self.patch(url, 0, self.CONTENT + b'extra').status_code, 400)
+
+    def test_partial_chunk_is_kept(self):
+        session = start_upload(self.user, 'notes.txt', len(self.CONTENT))
+        stream = mock.Mock()
+        stream.read.side_effect = [self.CONTENT[:5], OSError('client went away')]
+        session = write_chunk(session, 0, stream, 10)
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).offset, 5)
+
+        session = write_chunk(session, 5, io.BytesIO(self.CONTENT[5:]), len(self.CONTENT) - 5)
+        self.assertEqual(session.sha256, hashlib.sha256(self.CONTENT).hexdigest())
+
+    def test_body_is_read_before_the_transaction(self):
+        session = start_upload(self.user, 'notes.txt', len(self.CONTENT))
+
+        def read(size):
+            # a slow client mustn't hold a transaction or the session row
+            self.assertFalse(atomic.called)
+            return self.CONTENT[:size]
+
+        with mock.patch('tasks.uploads.transaction.atomic', wraps=transaction.atomic) as atomic:
+            write_chunk(session, 0, mock.Mock(read=read), 10)
+        self.assertTrue(atomic.called)
+
+    def test_double_submit_attaches_once(self):
+        session = start_upload(self.user, 'notes.txt', len(self.CONTENT))
+        session = write_chunk(session, 0, io.BytesIO(self.CONTENT), len(self.CONTENT))
+        stale = UploadSession.objects.get(pk=session.pk)
+        attach_upload(session, self.task)
+        with self.assertRaises(UploadError):
+            attach_upload(stale, Task.objects.create(title='again', requester=self.user))
+        self.assertEqual(Attachment.objects.count(), 1)
+
+    def test_submitting_a_ticket_claims_the_upload(self):
+        session = start_upload(self.user, 'notes.txt', len(self.CONTENT))
+        write_chunk(session, 0, io.BytesIO(self.CONTENT), len(self.CONTENT))
+        form = {'title': 'Help', 'description': 'see file', 'category': 'general', 'upload_id': session.pk}
+        for _ in range(2):
+            self.client.post(reverse('tasks:submit_ticket'), form)
+        self.assertEqual(Attachment.objects.count(), 1)
+
+    def test_long_names_fit(self):
+        user = User.objects.create_user('u' * 150)
+        session = start_upload(user, 'archive.' + 'x' * 200, len(self.CONTENT))
+        write_chunk(session, 0, io.BytesIO(self.CONTENT), len(self.CONTENT))
+        attachment = attach_upload(UploadSession.objects.get(pk=session.pk), self.task)
+        self.assertLessEqual(len(attachment.file.name), Attachment._meta.get_field('file').max_length)
+
+    def test_stale_uploads_expire(self):
+        session = start_upload(self.user, 'notes.txt', len(self.CONTENT))
+        write_chunk(session, 0, io.BytesIO(self.CONTENT[:5]), 5)
+        self.assertEqual(expire_uploads(), 0)
+
+        later = timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_EXPIRY + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_uploads(later), 1)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(default_storage.exists(session.file_name))
+
+
+class AttachmentDownloadTests(TemporaryMediaMixin, TestCase):
+    """Downloads honour Range and If-None-Match and never render uploaded HTML."""
+
+    CONTENT = b'0123456789' * 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('requester', password='pw')
+        cls.task = Task.objects.create(title='t', requester=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def attachment(self, name='notes.txt', content=CONTENT):
+        blob = store_blob(ContentFile(content, name=name))
+        return Attachment.objects.create(
+            task=self.task, file=blob.file.name, blob=blob, uploaded_by=self.user, original_filename=name,
+        )
+
+    def get(self, attachment, **headers):
+        return self.client.get(reverse('tasks:attachment_download', args=[attachment.pk]), headers=headers)
+
+    def test_whole_file(self):
+        response = self.get(self.attachment())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+
+    def test_ranges(self):
+        attachment = self.attachment()
+        response = self.get(attachment, Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[10:20])
+
+        response = self.get(attachment, Range='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[-5:])
+
+        self.assertEqual(self.get(attachment, Range='bytes=500-').status_code, 416)
+        # a range against a different version of the file gets the whole file
+        self.assertEqual(self.get(attachment, Range='bytes=0-1', If_Range='"stale"').status_code, 200)
+
+    def test_not_modified(self):
+        attachment = self.attachment()
+        etag = self.get(attachment)['ETag']
+        self.assertEqual(self.get(attachment, If_None_Match=etag).status_code, 304)
+
+    def test_html_is_downloaded(self):
+        response = self.get(self.attachment('page.html', b'<script>alert(1)</script>'))
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+    def test_other_requesters_attachment_is_hidden(self):
+        attachment = self.attachment()
+        self.client.force_login(User.objects.create_user('other'))
+        self.assertEqual(self.get(attachment).status_code, 404)
+
+    def test_missing_file_is_a_404(self):
+        legacy = Attachment.objects.create(
+            task=self.task, file='legacy/gone.txt', uploaded_by=self.user, original_filename='gone.txt',
+        )
+        self.assertEqual(self.get(legacy).status_code, 404)
+
+        attachment = self.attachment()
+        default_storage.delete(attachment.file.name)
+        self.assertEqual(self.get(attachment).status_code, 404)
+
+
+class PreviewTests(TemporaryMediaMixin, TestCase):
+    """Each blob gets one preview, rendered off the request by the job worker."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('requester', password='pw')
+        cls.task = Task.objects.create(title='t', requester=cls.user)
+
+    def blob(self, name, content):
+        blob = store_blob(ContentFile(content, name=name))
+        Attachment.objects.create(
+            task=self.task, file=blob.file.name, blob=blob, uploaded_by=self.user, original_filename=name,
+        )
+        return blob
+
+    def png(self):
+        from PIL import Image
+
+        out = io.BytesIO()
+        Image.new('RGB', (800, 400), 'red').save(out, 'PNG')
+        return out.getvalue()
+
+    def test_new_blob_queues_one_job(self):
+        blob = self.blob('a.txt', b'hello')
+        self.blob('b.txt', b'hello')
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.kwargs), ('previews.generate', {'blob_id': blob.pk}))
+
+    def test_image_thumbnail(self):
+        from PIL import Image
+
+        blob = self.blob('photo.png', self.png())
+        generate_blob_preview(blob_id=blob.pk)
+        blob.refresh_from_db()
+        self.assertEqual(blob.preview_state, Blob.PreviewState.READY)
+        self.assertEqual(blob.preview_kind, Blob.PreviewKind.IMAGE)
+        with Image.open(default_storage.path(blob.preview.name)) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertLessEqual(max(image.size), settings.ATTACHMENT_THUMBNAIL_SIZE)
+
+    def test_text_and_binary(self):
+        text = self.blob('notes.bin', 'é'.encode() * TEXT_PREVIEW_BYTES)
+        binary = self.blob('data.bin', b'\0\1\2')
+        generate_blob_preview(blob_id=text.pk)
+        generate_blob_preview(blob_id=binary.pk)
+
+        text.refresh_from_db()
+        self.assertEqual(text.preview_kind, Blob.PreviewKind.TEXT)
+        # a character cut in half by the sniff limit is dropped, not an error
+        with text.preview.open('rb') as fh:
+            self.assertEqual(fh.read().decode(), 'é' * (TEXT_PREVIEW_BYTES // 2))
+        binary.refresh_from_db()
+        self.assertEqual(binary.preview_state, Blob.PreviewState.NONE)
+
+    def test_claimed_blob_is_rendered_once(self):
+        blob = self.blob('a.txt', b'hello')
+        self.assertTrue(claim_blob(blob.pk, [Blob.PreviewState.PENDING]))
+        with mock.patch('tasks.previews.generate_preview') as generate:
+            generate_blob_preview(blob_id=blob.pk)
+        generate.assert_not_called()
+
+    def test_failure_is_recorded(self):
+        blob = self.blob('a.txt', b'hello')
+        with mock.patch('tasks.previews.render_preview', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                generate_blob_preview(blob_id=blob.pk)
+        blob.refresh_from_db()
+        self.assertEqual(blob.preview_state, Blob.PreviewState.FAILED)
+        # the job's retry gets another go
+        generate_blob_preview(blob_id=blob.pk)
+        blob.refresh_from_db()
+        self.assertEqual(blob.preview_state, Blob.PreviewState.READY)
+
+    def test_backfill_command_and_view(self):
+        blob = self.blob('a.txt', b'hello')
+        attachment = blob.attachments.get()
+        url = reverse('tasks:attachment_preview', args=[attachment.pk])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        call_command('process_previews', '--once', stdout=io.StringIO())
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'hello')
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+
+RECORDED_JOB_CALLS = []
+
+
+@background_job('tests.record')
+def record_job(calls, fail=False):
+    RECORDED_JOB_CALLS.append(calls)
+    if fail:
+        raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    """Jobs run once after commit, are retried with backoff and kept when they fail for good."""
+
+    def setUp(self):
+        RECORDED_JOB_CALLS.clear()
+
+    def test_dedup_key(self):
+        self.assertIsNotNone(enqueue(record_job, calls=1, dedup_key='k'))
+        self.assertIsNone(enqueue(record_job, calls=2, dedup_key='k'))
+        self.assertEqual(Job.objects.count(), 1)
+        with self.assertRaises(ValueError):
+            enqueue('tests.unknown')
+
+    def test_rolled_back_work_queues_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue(record_job, calls=1)
+            raise RuntimeError('rolled back')
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim_and_run(self):
+        enqueue(record_job, calls=1, delay=timedelta(minutes=5))
+        self.assertIsNone(claim_job())
+
+        enqueue(record_job, calls=2)
+        job = claim_job()
+        self.assertEqual((job.state, job.attempts), (Job.State.RUNNING, 1))
+        self.assertIsNone(claim_job())
+        self.assertTrue(run_job(job))
+        self.assertEqual(RECORDED_JOB_CALLS, [2])
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+
+    def test_retries_then_fails(self):
+        enqueue(record_job, calls=1, fail=True, max_attempts=2)
+        job = claim_job()
+        self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.State.QUEUED)
+        self.assertIn('boom', job.last_error)
+        self.assertGreaterEqual(job.run_at, timezone.now() + retry_delay(1) - timedelta(seconds=5))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertFalse(run_job(claim_job()))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), (Job.State.FAILED, 2))
+
+    def test_retry_defers_to_a_newer_duplicate(self):
+        enqueue(record_job, calls=1, fail=True, dedup_key='k')
+        job = claim_job()
+        enqueue(record_job, calls=2, dedup_key='k')
+        run_job(job)
+        self.assertEqual(list(Job.objects.values_list('kwargs', flat=True)), [{'calls': 2}])
+
+    def test_stale_jobs_are_requeued(self):
+        enqueue(record_job, calls=1)
+        job = claim_job()
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT + 1))
+        requeue_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), (Job.State.QUEUED, 1))
+
+
+
+@override_settings(SLA_ESCALATION_THRESHOLDS=[75, 100])
+class SLAScanTests(TestCase):
+    """The scanner records each threshold once and only reads tickets that are due a check."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('requester', password='pw')
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def task(self, used, window, **fields):
+        task = Task.objects.create(title='t', requester=self.user, due_date=self.now - used + window, **fields)
+        # as if the ticket had been opened `used` ago
+        Task.objects.filter(pk=task.pk).update(
+            created_at=self.now - used, sla_next_check_at=task.sla_next_check_at and self.now - used,
+        )
+        return Task.objects.get(pk=task.pk)
+
+    def escalations(self, task):
+        return list(task.sla_escalations.order_by('threshold').values_list('threshold', flat=True))
+
+    def test_each_threshold_is_recorded_once(self):
+        task = self.task(timedelta(hours=40), timedelta(hours=48))
+        self.assertEqual(scan_sla_breaches(self.now), 1)
+        task.refresh_from_db()
+        self.assertEqual(self.escalations(task), [75])
+        self.assertEqual(task.sla_escalation_level, 75)
+        self.assertEqual(task.sla_next_check_at, task.due_date)
+
+        # nothing is due until the ticket reaches its next threshold
+        self.assertEqual(scan_sla_breaches(self.now + timedelta(hours=7)), 0)
+        self.assertEqual(scan_sla_breaches(self.now + timedelta(hours=9)), 1)
+        task.refresh_from_db()
+        self.assertEqual(self.escalations(task), [75, 100])
+        self.assertIsNone(task.sla_next_check_at)
+
+    def test_idle_scan_is_one_query(self):
+        self.task(timedelta(hours=1), timedelta(hours=48))
+        scan_sla_breaches(self.now)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(scan_sla_breaches(self.now), 0)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 1)
+
+    def test_paused_and_closed_tickets_are_skipped(self):
+        pending = self.task(timedelta(hours=40), timedelta(hours=48), status=Task.Status.PENDING)
+        resolved = self.task(timedelta(hours=40), timedelta(hours=48))
+        resolved.status = Task.Status.RESOLVED
+        resolved.save()
+        self.assertEqual(scan_sla_breaches(self.now), 0)
+        self.assertEqual(self.escalations(pending) + self.escalations(resolved), [])
+
+        # reopening re-arms the scanner
+        resolved.status = Task.Status.OPEN
+        resolved.save()
+        self.assertEqual(scan_sla_breaches(timezone.now()), 1)
+
+    def test_new_due_date_starts_over(self):
+        task = self.task(timedelta(hours=40), timedelta(hours=48))
+        scan_sla_breaches(self.now)
+        task.refresh_from_db()
+        task.due_date = task.created_at + timedelta(hours=50)
+        task.save()
+        self.assertEqual(task.sla_escalation_level, 0)
+        self.assertEqual(scan_sla_breaches(timezone.now()), 1)
+        self.assertEqual(task.sla_escalations.count(), 2)
+
+    def test_command(self):
+        self.task(timedelta(hours=60), timedelta(hours=48))
+        out = io.StringIO()
+        call_command('scan_sla', '--once', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Recorded 2 SLA escalations.')
+
+
+class LiveMatrixTests(TestCase):
+    """Committed task changes reach the SSE streams of the matrices they touch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = User.objects.create_user('operator', password='pw')
+        cls.operator.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+        cls.other = User.objects.create_user('other', password='pw')
+        cls.other.groups.add(Group.objects.get(name=OPERATORS_GROUP))
+
+    def deliveries(self, change):
+        with mock.patch.object(broker, 'deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+        return [call.args[0] for call in deliver.call_args_list]
+
+    def test_reassignment_reaches_both_matrices(self):
+        task = Task.objects.create(title='t', requester=self.operator, assignee=self.operator)
+
+        def reassign():
+            task.assignee = self.other
+            task.save()
+
+        [event] = self.deliveries(reassign)
+        self.assertEqual(event['task'], task.pk)
+        self.assertEqual(set(event['assignees']), {self.operator.pk, self.other.pk})
+
+    def test_only_matrix_changes_are_published(self):
+        task = Task.objects.create(title='t', requester=self.operator)
+
+        def describe():
+            task.description = 'more detail'
+            task.save(update_fields=['description'])
+
+        self.assertEqual(self.deliveries(describe), [])
+
+    def test_rolled_back_changes_are_not_published(self):
+        def rolled_back():
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Task.objects.create(title='t', requester=self.operator)
+                raise RuntimeError('rolled back')
+
+        self.assertEqual(self.deliveries(rolled_back), [])
+
+    def test_a_full_queue_asks_for_a_resync(self):
+        queue = asyncio.Queue(MAX_QUEUED_EVENTS)
+        for pk in range(MAX_QUEUED_EVENTS + 1):
+            _put(queue, {'type': 'task', 'task': pk, 'assignees': [None]})
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get_nowait(), RESYNC)
+
+    def test_stream_sends_cards_for_this_matrix_only(self):
+        mine = Task.objects.create(
+            title='mine', requester=self.operator, assignee=self.operator, urgent=True, important=True,
+        )
+        theirs = Task.objects.create(title='theirs', requester=self.operator, assignee=self.other)
+
+        async def read():
+            stream = matrix_event_stream(self.operator)
+            self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+            broker.deliver({'type': 'task', 'task': theirs.pk, 'assignees': [self.other.pk]})
+            broker.deliver({'type': 'task', 'task': mine.pk, 'assignees': [self.operator.pk]})
+            message = await anext(stream)
+            await stream.aclose()
+            return message
+
+        event, data = async_to_sync(read)().split('\n', 1)
+        self.assertEqual(event, 'event: card')
+        card = json.loads(data.removeprefix('data: '))
+        self.assertEqual((card['id'], card['bucket']), (mine.pk, 'do_first'))
+        self.assertIn('mine', card['html'])
+        self.assertEqual(broker._subscribers, set())
+
+    def test_view(self):
+        url = reverse('tasks:matrix_events')
+        self.client.force_login(self.operator)
+        # under WSGI the page is told to poll instead
+        self.assertEqual(self.client.get(url).status_code, 204)
+        self.client.force_login(User.objects.create_user('requester'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    async def test_view_streams_over_asgi(self):
+        await self.async_client.aforce_login(self.operator)
+        response = await self.async_client.get(reverse('tasks:matrix_events'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+
+
+class CardCacheTests(TestCase):
+    """Cards are cached per task version, so a change never needs an invalidation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = User.objects.create_user('operator', password='pw')
+        cls.operator.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, *tasks):
+        return [str(task.card_html) for task in render_cards([Task.objects.get(pk=task.pk) for task in tasks])]
+
+    def test_unchanged_cards_come_from_the_cache(self):
+        first = Task.objects.create(title='first', requester=self.operator)
+        second = Task.objects.create(title='second', requester=self.operator)
+        html = self.render(first, second)
+        self.assertIn('first', html[0])
+
+        with mock.patch('tasks.cards.render_to_string') as render:
+            self.assertEqual(self.render(first, second), html)
+        render.assert_not_called()
+        self.assertEqual(card_cache_stats(), {'hits': 2, 'misses': 2, 'hit_rate': 0.5})
+
+    def test_saves_and_tags_move_the_key(self):
+        task = Task.objects.create(title='before', requester=self.operator)
+        self.render(task)
+
+        Task.objects.filter(pk=task.pk).update(title='sneaky')
+        self.assertIn('before', self.render(task)[0])
+
+        task.refresh_from_db()
+        task.title = 'after'
+        task.save()
+        self.assertIn('after', self.render(task)[0])
+
+        # tags aren't on the card today, but a tag change still moves the key
+        task.tags.add(Tag.objects.create(name='vip'))
+        self.render(task)
+        self.assertEqual(card_cache_stats()['misses'], 3)
+
+    def test_metrics_view(self):
+        task = Task.objects.create(title='t', requester=self.operator)
+        self.render(task)
+        self.render(task)
+        self.client.force_login(self.operator)
+        response = self.client.get(reverse('tasks:metrics'))
+        self.assertContains(response, 'eisenhower_task_card_cache_hits_total 1\n')
+        self.assertContains(response, 'eisenhower_task_card_cache_hit_ratio 0.5000\n')
+
+        self.client.force_login(User.objects.create_user('requester'))
+        self.assertEqual(self.client.get(reverse('tasks:metrics')).status_code, 403)
+
+
+class ConditionalPageTests(TestCase):
+    """Unchanged pages are answered with a 304; any ticket change, deletions included, moves the ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = User.objects.create_user('operator', password='pw')
+        cls.operator.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+        cls.requester = User.objects.create_user('requester', password='pw')
+
+    def setUp(self):
+        cache.clear()
+        self.task = Task.objects.create(title='t', requester=self.requester)
+        self.other = Task.objects.create(title='other', requester=self.requester)
+        self.client.force_login(self.operator)
+
+    def revalidate(self, url):
+        '''The ETag of a fresh GET, and the status a revalidation with it gets.'''
+        # the first visit to a page with forms sets the CSRF cookie, which
+        # is part of the ETag
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        return etag, self.client.get(url, headers={'If-None-Match': etag}).status_code
+
+    def assertMoves(self, url, change):
+        etag, status = self.revalidate(url)
+        self.assertEqual(status, 304)
+        change()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_listing_pages(self):
+        for url in (reverse('tasks:matrix'), reverse('tasks:ticket_list')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Cache-Control'], 'private, no-cache')
+                self.assertMoves(url, lambda: Task.objects.filter(pk=self.other.pk).update_status(Task.Status.PENDING))
+                self.assertMoves(url, lambda: Task.objects.create(title='new', requester=self.requester).delete())
+
+    def test_my_tickets(self):
+        self.client.force_login(self.requester)
+        url = reverse('tasks:my_tickets')
+        self.assertMoves(url, lambda: Task.objects.filter(pk=self.task.pk).update_tracked(title='renamed'))
+
+    def test_pages_differ_per_viewer(self):
+        url = reverse('tasks:ticket_list')
+        etag = self.client.get(url)['ETag']
+        other = User.objects.create_user('other operator')
+        other.groups.add(Group.objects.get(name=OPERATORS_GROUP))
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    @mock.patch('tasks.views.time')
+    def test_detail(self, time):
+        time.time.return_value = 1_800_000_000
+        url = reverse('tasks:task_detail', args=[self.task.pk])
+        # another ticket changing doesn't matter here
+        etag, status = self.revalidate(url)
+        self.assertEqual(status, 304)
+        self.other.title = 'elsewhere'
+        self.other.save()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        self.assertMoves(url, lambda: Comment.objects.create(task=self.task, author=self.operator, text='hi'))
+        self.assertMoves(url, lambda: Comment.objects.filter(task=self.task).delete())
+        # the SLA bar and comment ages move with the clock
+        etag, status = self.revalidate(url)
+        time.time.return_value += 60
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_pending_messages_get_a_real_page(self):
+        url = reverse('tasks:ticket_list')
+        etag = self.client.get(url)['ETag']
+        # an invalid bulk action changes nothing, but leaves an error to show
+        self.client.post(reverse('tasks:ticket_bulk'), {'action': 'bogus'})
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+
+class TicketExportTests(TestCase):
+    """Exports stream the ticket list's rows, with its filters, in a format import_tickets reads."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = User.objects.create_user('operator', password='pw')
+        cls.operator.groups.add(Group.objects.create(name=OPERATORS_GROUP))
+        cls.requester = User.objects.create_user('requester', password='pw')
+        cls.imported = Task.objects.create(
+            title='Old printer', requester=cls.requester, external_id='A-1', urgent=True,
+        )
+        cls.imported.tags.add(Tag.objects.create(name='printer'), Tag.objects.create(name='hardware'))
+        cls.mine = Task.objects.create(title='VPN down', requester=cls.operator, assignee=cls.operator)
+
+    def setUp(self):
+        self.client.force_login(self.operator)
+
+    def export(self, **params):
+        response = self.client.get(reverse('tasks:ticket_export'), params)
+        if response.status_code != 200:
+            return response, None
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, body = self.export()
+        self.assertTrue(response['Content-Disposition'].startswith('attachment; filename="tickets-'))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        # newest first; id falls back to the ticket number
+        self.assertEqual([row['id'] for row in rows], [self.mine.ticket_number, 'A-1'])
+        self.assertEqual(rows[1]['tags'], 'hardware, printer')
+        self.assertEqual((rows[1]['urgent'], rows[1]['requester'], rows[1]['assignee']), ('true', 'requester', ''))
+
+    def test_jsonl_with_filters(self):
+        response, body = self.export(format='jsonl', assignee=self.operator.pk)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        [row] = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual((row['title'], row['assignee'], row['tags']), ('VPN down', 'operator', []))
+
+    def test_exports_import_elsewhere(self):
+        body = self.export(format='jsonl', requester=self.requester.pk)[1]
+        Task.objects.all().delete()
+        counts = TicketImporter().run(read_records(io.StringIO(body), 'jsonl', None))
+        self.assertEqual(counts['tickets'], 1)
+        task = Task.objects.get(external_id='A-1')
+        self.assertEqual(sorted(task.tags.values_list('name', flat=True)), ['hardware', 'printer'])
+
+    def test_rows_come_in_chunks(self):
+        # one cursor over the tickets, one tags query per chunk
+        with self.assertNumQueries(3):
+            chunks = list(export_rows(Task.objects.order_by('pk'), chunk_size=1))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.export(format='xlsx')[0].status_code, 400)
+        self.client.force_login(self.requester)
+        self.assertEqual(self.export()[0].status_code, 403)
+
+    def test_non_numeric_user_filters(self):
+        for param in ('requester', 'assignee'):
+            with self.subTest(param=param):
+                self.assertEqual(self.export(**{param: 'abc'})[0].status_code, 400)
+                response = self.client.get(reverse('tasks:ticket_list'), {param: 'abc'})
+                self.assertEqual(response.status_code, 400)
+                response = self.client.get(reverse('tasks:api_tasks'), {param: '1; drop'})
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,95 @@
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+# Postgres sequence backing the ticket numbers (created in migration 0010)
+TICKET_NUMBER_SEQUENCE = 'tasks_ticket_number_seq'
+TICKET_COUNTER_NAME = 'ticket_number'
+
+
+def format_ticket_number(value):
+    return f"OHM{value:013d}"
+
+
+def _block_size():
+    return getattr(settings, 'TICKET_NUMBER_BLOCK_SIZE', 20)
+
+
+def _reserve(count):
+    '''
+    Reserves `count` fresh ticket numbers from the database and returns them
+    as a list. Postgres draws them from a real sequence; other backends bump
+    a row in TicketCounter.
+    '''
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(%s) FROM generate_series(1, %s)',
+                [TICKET_NUMBER_SEQUENCE, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    from .models import TicketCounter
+
+    with transaction.atomic():
+        counter = TicketCounter.objects.filter(name=TICKET_COUNTER_NAME)
+        if not counter.update(last_value=F('last_value') + count):
+            TicketCounter.objects.create(name=TICKET_COUNTER_NAME, last_value=count)
+        # the UPDATE above holds the row lock, so this read sees our increment
+        last_value = counter.values_list('last_value', flat=True).get()
+    return list(range(last_value - count + 1, last_value + 1))
+
+
+class TicketNumberAllocator:
+    '''
+    Hands out ticket numbers from a process-local block so that creating a
+    ticket usually costs no query at all, only the INSERT itself.
+
+    Sequence values are never handed back, so the only cost of a crashed
+    worker or rolled back transaction is a gap in the numbering. The one
+    exception is the counter-table fallback inside an open transaction: a
+    rollback there would also undo the reservation, so in that case we take
+    exactly what was asked for and keep nothing back.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._block = []
+
+    def _can_cache(self):
+        return connection.vendor == 'postgresql' or not connection.in_atomic_block
+
+    def allocate(self, count=1):
+        with self._lock:
+            if count > len(self._block):
+                if self._can_cache():
+                    self._block += _reserve(max(count - len(self._block), _block_size()))
+                else:
+                    return _reserve(count)
+            numbers, self._block = self._block[:count], self._block[count:]
+            return numbers
+
+    def reset(self):
+        with self._lock:
+            self._block = []
+
+
+allocator = TicketNumberAllocator()
+
+
+def next_ticket_number():
+    '''Returns one formatted ticket number, e.g. OHM0000000000042.'''
+    return format_ticket_number(allocator.allocate(1)[0])
+
+
+def assign_ticket_numbers(tasks):
+    '''
+    Fills in ticket_number on every unsaved task that doesn't have one,
+    reserving all of the numbers in one go. Meant for bulk_create paths.
+    '''
+    missing = [task for task in tasks if not task.ticket_number]
+    for task, value in zip(missing, allocator.allocate(len(missing))):
+        task.ticket_number = format_ticket_number(value)
+    return tasks
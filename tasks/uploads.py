@@ -0,0 +1,231 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .blobs import adopt_stored_file
+from .models import Attachment, Blob, UploadSession, pending_upload_path, user_directory_path
+
+# Bytes read from the request and written to disk per iteration
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """A chunk that can't be applied to its upload session."""
+    status = 400
+
+
+class UploadOffsetMismatch(UploadError):
+    """The client's offset doesn't match what the server has stored."""
+    status = 409
+
+
+# Running SHA-256 per upload, so each chunk only hashes its own bytes. If a
+# chunk lands on another worker (or after a restart) the digest is rebuilt
+# once from the bytes already on disk.
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+MAX_CACHED_HASHERS = 256
+
+
+def _hasher_for(session):
+    with _hashers_lock:
+        cached = _hashers.pop(session.pk, None)
+    if cached and cached[0] == session.offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = session.offset
+    with default_storage.open(session.file_name, 'rb') as fh:
+        while remaining:
+            block = fh.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def _remember_hasher(session, hasher):
+    with _hashers_lock:
+        _hashers[session.pk] = (session.offset, hasher)
+        while len(_hashers) > MAX_CACHED_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def start_upload(user, filename, size, task=None):
+    '''
+    Opens an upload session and creates the (empty) destination file, so
+    every chunk can be written in place.
+    '''
+    max_size = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', None)
+    if size < 0 or (max_size and size > max_size):
+        raise UploadError('File is too large.')
+
+    session = UploadSession(task=task, uploaded_by=user, original_filename=filename, size=size)
+    if task is not None:
+        # same layout as a regular upload: users/<username>/task_<id>/<uuid>.<ext>
+        session.file_name = user_directory_path(Attachment(task=task, uploaded_by=user), filename)
+    else:
+        session.file_name = pending_upload_path(user.username, filename)
+
+    path = default_storage.path(session.file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'xb').close()
+
+    session.save()
+    if size == 0:
+        finish_upload(session, hashlib.sha256())
+    return session
+
+
+def _check_chunk(session, offset, length):
+    if session.is_complete:
+        raise UploadError('Upload is already complete.')
+    if offset != session.offset:
+        raise UploadOffsetMismatch('Offset does not match the stored upload.')
+    if length <= 0 or offset + length > session.size:
+        raise UploadError('Chunk does not fit in the declared file size.')
+
+
+def _spool(stream, spool, length, hasher):
+    '''
+    Copies up to `length` bytes of the request body into `spool`, hashing
+    them on the way. Returns how many bytes arrived; a client that drops
+    mid-chunk just makes that number smaller.
+    '''
+    written = 0
+    while written < length:
+        try:
+            block = stream.read(min(READ_BLOCK_SIZE, length - written))
+        except OSError:
+            # the client went away (UnreadablePostError); keep what arrived
+            break
+        if not block:
+            break
+        spool.write(block)
+        hasher.update(block)
+        written += len(block)
+    return written
+
+
+def write_chunk(session, offset, stream, length):
+    '''
+    Appends `length` bytes from `stream` to the upload at `offset`.
+
+    The body is first spooled to a temporary file beside the upload, in
+    READ_BLOCK_SIZE pieces, with no transaction open, so a slow client
+    holds neither a database transaction nor the session row. Only then
+    is the row locked to check and move the offset on, and the spooled
+    bytes copied into place. If the client drops mid-chunk, whatever
+    arrived is kept and the next request resumes from the new offset.
+    '''
+    _check_chunk(session, offset, length)
+    hasher = _hasher_for(session)
+    path = default_storage.path(session.file_name)
+
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as spool:
+        written = _spool(stream, spool, length, hasher)
+        if not written:
+            return session
+        spool.seek(0)
+
+        with transaction.atomic():
+            session.refresh_from_db(from_queryset=UploadSession.objects.select_for_update())
+            _check_chunk(session, offset, length)
+            # conditional for SQLite, which has no row locks; its UPDATE
+            # takes the database's write lock instead, so either way no
+            # other request can copy over these bytes before we commit
+            claimed = UploadSession.objects.filter(pk=session.pk, offset=offset).update(
+                offset=offset + written, updated_at=timezone.now(),
+            )
+            if not claimed:
+                session.refresh_from_db()
+                raise UploadOffsetMismatch('Upload was modified concurrently.')
+
+            with open(path, 'r+b') as fh:
+                fh.seek(offset)
+                # drop anything past the offset left by an earlier, failed chunk
+                fh.truncate()
+                shutil.copyfileobj(spool, fh, READ_BLOCK_SIZE)
+
+    session.offset = offset + written
+    if session.is_complete:
+        finish_upload(session, hasher)
+    else:
+        _remember_hasher(session, hasher)
+    return session
+
+
+def finish_upload(session, hasher):
+    '''
+    Records the digest and, if the upload already belongs to a ticket,
+    turns it into an Attachment without copying the file.
+    '''
+    session.sha256 = hasher.hexdigest()
+    if session.task_id:
+        attach_upload(session, session.task)
+    else:
+        session.save(update_fields=['sha256', 'updated_at'])
+
+
+def attach_upload(session, task):
+    '''
+    Creates the Attachment for a finished upload session. Raises
+    UploadError if the session was already attached (e.g. by a double
+    submit of the same ticket form) or was claimed by another ticket.
+    '''
+    with transaction.atomic():
+        # claims the session: the conditional UPDATE locks its row (SQLite:
+        # the database) until commit, and a concurrent attempt then finds
+        # the attachment set and updates nothing
+        claimed = UploadSession.objects.filter(
+            Q(task=None) | Q(task=task), pk=session.pk, attachment=None,
+        ).update(task=task, updated_at=timezone.now())
+        if not claimed:
+            raise UploadError('Upload was already attached.')
+
+        # the digest is already known, so the file becomes a blob (or is
+        # deduplicated against one) without hashing it again
+        blob = adopt_stored_file(session.file_name, session.sha256, session.size)
+        session.task = task
+        session.file_name = blob.file.name
+        session.attachment = Attachment.objects.create(
+            task=task,
+            file=blob.file.name,
+            blob=blob,
+            original_filename=session.original_filename,
+            uploaded_by=session.uploaded_by,
+        )
+        session.save(update_fields=['task', 'file_name', 'attachment', 'sha256', 'updated_at'])
+    return session.attachment
+
+
+def expire_uploads(now=None):
+    '''
+    Deletes the upload sessions nobody has touched for UPLOAD_SESSION_EXPIRY
+    seconds that never became an attachment (abandoned transfers, and
+    finished uploads whose ticket was never submitted), with their partial
+    files. Returns the number of sessions deleted.
+    '''
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.UPLOAD_SESSION_EXPIRY)
+    stale = UploadSession.objects.filter(attachment=None, updated_at__lt=cutoff)
+    expired = 0
+    for session in stale.only('file_name').iterator():
+        with transaction.atomic():
+            # re-checked under the delete, in case a chunk just arrived
+            deleted, _ = stale.filter(pk=session.pk).delete()
+            # a session whose attachment was deleted points at a shared blob
+            if deleted and not Blob.objects.filter(file=session.file_name).exists():
+                transaction.on_commit(lambda name=session.file_name: default_storage.delete(name))
+        expired += deleted
+    return expired
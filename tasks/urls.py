@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 # This namespace helps avoid URL name collisions with other apps
 app_name = 'tasks'
@@ -8,6 +8,12 @@ urlpatterns = [
     # When a request comes to the app's root (''), call the matrix_view function
     path('', views.matrix_view, name='matrix'),
 
+    #URL that loads the next page of cards for one matrix quadrant
+    path('matrix/more/<str:bucket>/', views.matrix_more_view, name='matrix_more'),
+
+    #URL for the matrix's live updates (server-sent events, served over ASGI)
+    path('matrix/events/', views.matrix_events_view, name='matrix_events'),
+
     # Route for the new task creation page
     path('create/', views.create_task, name='create'),
 
@@ -26,9 +32,32 @@ urlpatterns = [
     #URL to the view a task and all its details, as well as add to it
     path('task/<int:pk>/', views.task_detail_view, name='task_detail'),
 
+    #URL to download an attachment (checks ticket access)
+    path('attachments/<int:pk>/', views.attachment_download_view, name='attachment_download'),
+    path('attachments/<int:pk>/preview/', views.attachment_preview_view, name='attachment_preview'),
+
+    #URLs for chunked, resumable attachment uploads
+    path('uploads/', views.upload_start_view, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk_view, name='upload_chunk'),
+
     #URL to the ticket list
     path('tickets/', views.ticket_list_view, name='ticket_list'), 
 
+    #URL to export the (filtered) ticket list as CSV or JSON Lines
+    path('tickets/export/', views.ticket_export_view, name='ticket_export'),
+
+    #URL for the ticket list's bulk actions
+    path('tickets/bulk/', views.ticket_bulk_view, name='ticket_bulk'),
+
+    #URL for tickets close to (or past) their SLA
+    path('tickets/at-risk/', views.at_risk_view, name='at_risk'),
+
+    #URL for the user picker lookups (JSON)
+    path('users/lookup/', views.user_lookup_view, name='user_lookup'),
+
+    #URL for cache metrics (Prometheus text format)
+    path('metrics/', views.metrics_view, name='metrics'),
+
     #URL for submitting a ticket
     path('submit/', views.submit_ticket_view, name='submit_ticket'),
 
@@ -41,6 +70,13 @@ urlpatterns = [
     #URL path for random people if they are trying to sign up with Google
     path('signup-closed/', views.signup_closed_view, name='signup_closed'),
 
+    #JSON API for integrations (see tasks/api.py)
+    path('api/tasks/', api.task_collection, name='api_tasks'),
+    path('api/tasks/batch/', api.task_batch, name='api_task_batch'),
+    path('api/tasks/<int:pk>/', api.task_detail, name='api_task'),
+    path('api/tasks/<int:pk>/comments/', api.task_comments, name='api_task_comments'),
+    path('api/tags/', api.tag_list, name='api_tags'),
+
     #URL that overrides allauth URL
     path('connections/', views.connections_view, name='socialaccount_connections'),
 
@@ -1,20 +1,48 @@
+import math
+import os
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
-from .models import Task, Comment, Attachment, Tag, SLAPolicy
-from django.http import HttpResponseRedirect
-from django.db.models import Q
+from django.views.decorators.http import require_POST, require_http_methods
+from django.urls import reverse
+from django.contrib import messages
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+from .models import Task, Comment, Attachment, Blob, Tag, SLAPolicy, UploadSession, user_id_filter
+from django.http import HttpResponse, HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
+from django.db.models import Count, Q
 from django.contrib.auth.models import User, Group
 from django.core.exceptions import PermissionDenied
-from .forms import TaskForm, CommentForm, AttachmentForm, StatusUpdateForm, UserTicketForm
-
-
-#helper function to check is user if operator
-def is_operator(user):
-    #checks if the user is in the "Operators" group
-    return user.groups.filter(name='Operators').exists()
-
+from django.core.handlers.asgi import ASGIRequest
+from .downloads import serve_attachment, serve_preview
+from .cards import card_cache_stats
+from .live import matrix_event_stream
+from .etags import finish, not_modified, page_etag, set_state, tasks_state
+from .exports import EXPORT_FORMATS, export_queryset, export_tickets, stream_in_thread
+from .context_processors import is_google_connected
+from .bulk import MAX_BULK_TICKETS, apply_bulk_action
+from .forms import TaskForm, CommentForm, AttachmentForm, StatusUpdateForm, UserTicketForm, BulkActionForm
+from .matrix import MATRIX_BUCKETS, load_matrix, load_bucket_page
+from .pagination import decode_cursor, keyset_paginate, ranked_paginate
+from .roles import OPERATORS_GROUP, is_operator
+from .uploads import UploadError, attach_upload, start_upload, write_chunk
+
+# Default SLA consumption (in percent) at which a ticket counts as at risk
+SLA_AT_RISK_THRESHOLD = 75
+
+# Users returned per call to the user lookup endpoint
+USER_LOOKUP_PAGE_SIZE = 20
+
+
+def served_over_asgi(request):
+    """
+    Whether the request came in through the ASGI server. Only then can a
+    response stream for long without holding a worker for all of it.
+    """
+    return isinstance(request, ASGIRequest)
 
 #Decorator to protect the matrix view
 @login_required
@@ -26,31 +54,86 @@ def matrix_view(request):
     if not is_operator(request.user):
         return redirect('tasks:submit_ticket')
     
-    # grabs all tasks assigned to the user
-    tasks = Task.objects.filter(
-        assignee=request.user, 
-        is_archived=False
-    ).exclude(
-        Q(status=Task.Status.RESOLVED) | Q(status=Task.Status.CLOSED)
-    )
+    # answer a refresh with a 304 while no ticket has changed. The page
+    # always shows or hides the "connect Google" banner, so the flag is read
+    # here once and memoised for the template (see is_google_connected)
+    etag = page_etag(request, *tasks_state(), is_google_connected(request.user))
+    response = not_modified(request, etag)
+    if response:
+        return response
+
+    # one query for the user's quadrants plus the unassigned pool,
+    # capped per quadrant (see tasks/matrix.py)
+    matrix = load_matrix(request.user)
+
+    context = {}
+    for bucket, (tasks, next_cursor) in matrix.items():
+        context[f'{bucket}_tasks'] = tasks
+        context[f'{bucket}_cursor'] = next_cursor
+    return finish(render(request, 'tasks/matrix.html', context), etag)
 
-    #grabs all unassigned tasks
-    unassigned_tasks = Task.objects.filter(
-        assignee=None,
-        is_archived=False,
-    ).exclude(
-        Q(status=Task.Status.RESOLVED) | Q(status=Task.Status.CLOSED)
-    )
-    
-    context = {
-        'unassigned_tasks': unassigned_tasks,
-        'do_first_tasks': tasks.filter(urgent=True, important=True),
-        'schedule_tasks': tasks.filter(urgent=False, important=True),
-        'delegate_tasks': tasks.filter(urgent=True, important=False),
-        'delete_tasks': tasks.filter(urgent=False, important=False),
+@login_required
+def matrix_more_view(request, bucket):
+    """
+    Returns the next page of cards for one matrix quadrant, as an HTML
+    fragment the "Show more" button appends to the quadrant.
+    """
+    if not is_operator(request.user):
+        raise PermissionDenied
+
+    if bucket not in MATRIX_BUCKETS:
+        raise Http404
 
+    cursor = decode_cursor(request.GET.get('cursor'))
+    tasks, next_cursor = load_bucket_page(request.user, bucket, cursor)
+
+    context = {
+        'tasks': tasks,
+        'bucket': bucket,
+        'next_cursor': next_cursor,
     }
-    return render(request, 'tasks/matrix.html', context)
+    return render(request, 'tasks/quadrant_cards.html', context)
+
+@login_required
+async def matrix_events_view(request):
+    """
+    Server-sent event stream that keeps an open matrix page current (see
+    tasks/live.py). Needs the ASGI server: under WSGI each open page would
+    hold a worker for as long as it's open, so there the answer is a 204,
+    which stops EventSource from reconnecting and makes app.js poll instead.
+    """
+    user = await request.auser()
+    if not await sync_to_async(is_operator)(user):
+        raise PermissionDenied
+    if not served_over_asgi(request):
+        return HttpResponse(status=204)
+
+    return StreamingHttpResponse(
+        matrix_event_stream(user),
+        content_type='text/event-stream',
+        # no caching, and no buffering by nginx in front of us
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@login_required
+def metrics_view(request):
+    """Cache metrics in the Prometheus text format, for operators."""
+    if not is_operator(request.user):
+        raise PermissionDenied
+
+    stats = card_cache_stats()
+    lines = [
+        '# HELP eisenhower_task_card_cache_hits_total Task cards served from the cache.',
+        '# TYPE eisenhower_task_card_cache_hits_total counter',
+        f"eisenhower_task_card_cache_hits_total {stats['hits']}",
+        '# HELP eisenhower_task_card_cache_misses_total Task cards rendered because they were not cached.',
+        '# TYPE eisenhower_task_card_cache_misses_total counter',
+        f"eisenhower_task_card_cache_misses_total {stats['misses']}",
+        '# HELP eisenhower_task_card_cache_hit_ratio Share of task cards served from the cache.',
+        '# TYPE eisenhower_task_card_cache_hit_ratio gauge',
+        f"eisenhower_task_card_cache_hit_ratio {stats['hit_rate']:.4f}",
+    ]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4')
 
 def login_view(request):
     """
@@ -149,19 +232,44 @@ def delete_task(request, pk):
     return render(request, 'tasks/task_confirm_delete.html', {'task': task})
 
 
+def get_visible_task(user, pk):
+    """Fetches a task the user is allowed to see, or raises a 404."""
+    #if user is an operator
+    if is_operator(user):
+        return get_object_or_404(Task, pk=pk)
+
+    #regular users can only view tasks they have requested
+    return get_object_or_404(Task, pk=pk, requester=user)
+
+def get_visible_attachment(user, pk):
+    """Fetches an attachment on a ticket the user can see, or raises a 404."""
+    attachments = Attachment.objects.select_related('blob')
+    if not is_operator(user):
+        attachments = attachments.filter(task__requester=user)
+    return get_object_or_404(attachments, pk=pk)
+
 @login_required
 def task_detail_view(request, pk):
 
-    #if user is an operator
-    if is_operator(request.user):
-        task = get_object_or_404(Task, pk=pk)
-
-    else: 
-        #regular users can only view tasks they have requested
-        task = get_object_or_404(Task, pk=pk, requester=request.user)
+    task = get_visible_task(request.user, pk)
 
     comments = task.comments.all().order_by('-created_at')
-    attachments = task.attachments.all().order_by('-uploaded_at')
+    attachments = task.attachments.select_related('blob', 'uploaded_by').order_by('-uploaded_at')
+
+    etag = None
+    if request.method != 'POST':
+        previews = attachments.aggregate(
+            ready=Count('pk', filter=Q(blob__preview_state=Blob.PreviewState.READY)),
+        )['ready']
+        # comment ages and the SLA bar move with the clock, so a cached copy
+        # is only reused within the same minute
+        etag = page_etag(
+            request, task.updated_at, *set_state(comments), *set_state(attachments),
+            previews, int(time.time() // 60),
+        )
+        response = not_modified(request, etag)
+        if response:
+            return response
 
     if request.method == 'POST':
         # Check if the comment form was submitted
@@ -209,39 +317,277 @@ def task_detail_view(request, pk):
         'status_form': status_form,
         'is_user_operator': is_operator(request.user), 
     }
-    return render(request, 'tasks/task_detail.html', context)
+    response = render(request, 'tasks/task_detail.html', context)
+    return finish(response, etag) if etag else response
 
 
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+def attachment_download_view(request, pk):
+    """
+    Serves an attachment to anyone who can see its ticket. Access is checked
+    in the same query that loads the attachment.
+    """
+    attachment = get_visible_attachment(request.user, pk)
+    return serve_attachment(request, attachment)
+
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+def attachment_preview_view(request, pk):
+    """Serves the thumbnail or text preview made by the preview worker."""
+    attachment = get_visible_attachment(request.user, pk)
+    if attachment.blob is None or attachment.blob.preview_state != Blob.PreviewState.READY:
+        raise Http404('No preview available.')
+    return serve_preview(request, attachment)
+
 @login_required
 def ticket_list_view(request):
-    # Start with all non-archived tasks, ordered by most recently created
-    tasks = Task.objects.filter(is_archived=False).order_by('-created_at')
+    # Start with all non-archived tasks, with their users fetched in the same query
+    tasks = Task.objects.live().select_related('requester', 'assignee')
 
     #Get the filter values from the URL (e.g., ?status=OPEN)
+    search_query = request.GET.get('q', '').strip()
     status_filter = request.GET.get('status')
-    requester_filter = request.GET.get('requester')
-    assignee_filter = request.GET.get('assignee')
+    try:
+        current_requester = user_id_filter(request.GET.get('requester'))
+        current_assignee = user_id_filter(request.GET.get('assignee'))
+    except ValueError:
+        return HttpResponse('requester and assignee must be user ids.', status=400)
 
     #Apply filters to the queryset if they exist
-    if status_filter: 
-        tasks = tasks.filter(status=status_filter)
+    tasks = tasks.filter_ticket_list(status=status_filter, requester=current_requester, assignee=current_assignee)
 
-    if requester_filter:
-        tasks = tasks.filter(requester__id=requester_filter)
+    # the filters and cursors are in the URL, which is part of the ETag
+    etag = page_etag(request, *tasks_state())
+    response = not_modified(request, etag)
+    if response:
+        return response
 
-    if assignee_filter: 
-        tasks = tasks.filter(assignee__id=assignee_filter)
+    if search_query:
+        # Ranked full-text results, best match first
+        page = ranked_paginate(tasks.search(search_query), settings.TICKETS_PER_PAGE, request.GET.get('page'))
+    else:
+        # One page at a time, most recently created first
+        page = keyset_paginate(
+            tasks, settings.TICKETS_PER_PAGE,
+            after=request.GET.get('after'), before=request.GET.get('before'),
+        )
+
+    # Only the currently selected users are rendered into the filter dropdowns,
+    # the rest are looked up on demand through user_lookup_view
+    selected_users = dict(
+        User.objects.filter(pk__in=[pk for pk in (current_requester, current_assignee) if pk])
+        .values_list('pk', 'username')
+    )
 
     context = {
-        'tasks': tasks, 
+        'tasks': page,
+        'page': page,
         'status_choices': Task.Status.choices, #pass choices for the dropdown
-        'all_users': User.objects.all(), 
+        'search_query': search_query,
         'current_status': status_filter,
-        'current_requester': int(requester_filter) if requester_filter else None,
-        'current_assignee': int(assignee_filter) if assignee_filter else None,
+        'current_requester': current_requester,
+        'current_requester_name': selected_users.get(current_requester),
+        'current_assignee': current_assignee,
+        'current_assignee_name': selected_users.get(current_assignee),
+        'is_user_operator': is_operator(request.user),
+        'bulk_form': BulkActionForm(),
+        # the same filters, for the export links
+        'export_query': urlencode({
+            key: value for key, value in request.GET.items()
+            if key in ('q', 'status', 'requester', 'assignee') and value
+        }),
     }
 
-    return render(request, 'tasks/ticket_list.html', context)
+    return finish(render(request, 'tasks/ticket_list.html', context), etag)
+
+@login_required
+async def ticket_export_view(request):
+    """
+    Streams the ticket list, with the same filters, as CSV or JSON Lines
+    (?format=csv|jsonl) for operators. It's sent chunk by chunk as it's
+    read, so the size of the export doesn't matter: under ASGI through
+    stream_in_thread, under WSGI as a plain iterator the server drains.
+    """
+    user = await request.auser()
+    if not await sync_to_async(is_operator)(user):
+        raise PermissionDenied
+
+    format = request.GET.get('format', 'csv')
+    if format not in EXPORT_FORMATS:
+        return HttpResponse('Unknown export format.', status=400)
+    content_type, extension = EXPORT_FORMATS[format]
+    filename = f'tickets-{timezone.localdate():%Y%m%d}.{extension}'
+
+    try:
+        tasks = export_queryset(request.GET)
+    except ValueError:
+        return HttpResponse('requester and assignee must be user ids.', status=400)
+    chunks = export_tickets(tasks, format)
+    # WSGI would buffer an async iterator whole, but reads a plain one
+    # lazily in its own thread
+    if served_over_asgi(request):
+        chunks = stream_in_thread(chunks)
+    return StreamingHttpResponse(
+        chunks,
+        content_type=content_type,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+@login_required
+@require_POST
+def ticket_bulk_view(request):
+    """
+    Applies one bulk action (assign, status, priority, tag or archive) to
+    the tickets checked on the ticket list, in a single transaction.
+    """
+    if not is_operator(request.user):
+        raise PermissionDenied
+
+    form = BulkActionForm(request.POST, max_tickets=MAX_BULK_TICKETS)
+    if form.is_valid():
+        count = apply_bulk_action(form.cleaned_data['ids'], form.cleaned_data['action'], form.cleaned_data)
+        messages.success(request, f'Updated {count} ticket{"s" if count != 1 else ""}.')
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+
+    # back to the same filtered page
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse('tasks:ticket_list')
+    return redirect(next_url)
+
+@login_required
+def at_risk_view(request):
+    """
+    Lists open tickets that have used up most of their SLA window, worst first.
+    The SLA consumption is computed in the database (see TaskQuerySet.at_risk).
+    """
+    if not is_operator(request.user):
+        raise PermissionDenied
+
+    try:
+        threshold = float(request.GET.get('threshold', SLA_AT_RISK_THRESHOLD))
+    except ValueError:
+        threshold = SLA_AT_RISK_THRESHOLD
+    if not math.isfinite(threshold):
+        threshold = SLA_AT_RISK_THRESHOLD
+    # sla_percent is capped at 100, so "breached" is as high as it goes
+    threshold = min(max(threshold, 0), 100)
+
+    tasks = (
+        Task.objects.open()
+        .select_related('assignee')
+        .at_risk(threshold)
+        .order_by('-sla_percent', 'due_date', 'pk')
+    )
+    page = ranked_paginate(tasks, settings.TICKETS_PER_PAGE, request.GET.get('page'))
+
+    context = {
+        'tasks': page,
+        'page': page,
+        'threshold': threshold,
+    }
+    return render(request, 'tasks/at_risk.html', context)
+
+@login_required
+def user_lookup_view(request):
+    """
+    JSON endpoint behind the user pickers: usernames starting with ?q=
+    (in any case), in username order, one page at a time (?after=<last username>).
+    ?role=operators limits the results to the Operators group.
+    """
+    if not is_operator(request.user):
+        raise PermissionDenied
+
+    prefix = request.GET.get('q', '')
+    after = request.GET.get('after')
+
+    users = User.objects.filter(is_active=True)
+    if prefix:
+        # served by the prefix index added in migration 0024, whatever the collation
+        users = users.filter(username__istartswith=prefix)
+    if after:
+        users = users.filter(username__gt=after)
+    if request.GET.get('role') == 'operators':
+        users = users.filter(groups__name=OPERATORS_GROUP)
+
+    results = list(users.order_by('username').values('id', 'username')[:USER_LOOKUP_PAGE_SIZE + 1])
+    has_more = len(results) > USER_LOOKUP_PAGE_SIZE
+    results = results[:USER_LOOKUP_PAGE_SIZE]
+
+    return JsonResponse({
+        'results': results,
+        'next': results[-1]['username'] if has_more else None,
+    })
+
+@login_required
+@require_POST
+def upload_start_view(request):
+    """
+    Opens a chunked upload. Takes filename, size and optionally the task it
+    belongs to; without a task the upload waits to be claimed by a ticket
+    submission (see submit_ticket_view).
+    """
+    task = None
+    task_id = request.POST.get('task', '').strip()
+    if task_id:
+        if not task_id.isdigit():
+            return JsonResponse({'error': 'task must be a ticket id.'}, status=400)
+        task = get_visible_task(request.user, task_id)
+
+    try:
+        session = start_upload(
+            request.user,
+            os.path.basename(request.POST.get('filename', '')) or 'upload',
+            int(request.POST.get('size', '')),
+            task=task,
+        )
+    except ValueError:
+        return JsonResponse({'error': 'A numeric size is required.'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+
+    return JsonResponse(upload_state(session), status=201)
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PATCH'])
+def upload_chunk_view(request, upload_id):
+    """
+    GET/HEAD report how much of the upload the server has, so an
+    interrupted transfer can resume from there. PATCH appends the request
+    body at the offset given in the Upload-Offset header.
+    """
+    session = get_object_or_404(UploadSession, pk=upload_id, uploaded_by=request.user)
+
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length', ''))
+            session = write_chunk(session, offset, request, length)
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset and Content-Length are required.'}, status=400)
+        except UploadError as e:
+            return JsonResponse({'error': str(e), **upload_state(session)}, status=e.status)
+
+    response = JsonResponse(upload_state(session))
+    response['Upload-Offset'] = session.offset
+    return response
+
+def upload_state(session):
+    return {
+        'id': str(session.pk),
+        'url': reverse('tasks:upload_chunk', args=[session.pk]),
+        'offset': session.offset,
+        'size': session.size,
+        'complete': session.is_complete,
+        'sha256': session.sha256,
+    }
 
 @login_required
 def submit_ticket_view(request):
@@ -260,6 +606,19 @@ def submit_ticket_view(request):
             task.important = False
             task.save()
 
+            # a file already sent through the chunked upload endpoint
+            upload_id = form.cleaned_data.get('upload_id')
+            if upload_id:
+                session = UploadSession.objects.filter(
+                    pk=upload_id, uploaded_by=request.user, task=None,
+                ).first()
+                if session and session.is_complete:
+                    try:
+                        attach_upload(session, task)
+                    except UploadError:
+                        # a double submit: the other ticket already has it
+                        pass
+
             uploaded_file = form.cleaned_data.get('attachment_file')
             if uploaded_file:
                 Attachment.objects.create(
@@ -288,11 +647,22 @@ def my_tickets_view(request):
         # Operators should use the full ticket viewer
         return redirect('tasks:ticket_list')
 
-    tasks = Task.objects.filter(requester=request.user, is_archived=False).order_by('-created_at')
+    tasks = Task.objects.live().filter(requester=request.user).select_related('assignee')
+
+    etag = page_etag(request, *tasks_state())
+    response = not_modified(request, etag)
+    if response:
+        return response
+
+    page = keyset_paginate(
+        tasks, settings.TICKETS_PER_PAGE,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
     context = {
-        'tasks': tasks,
+        'tasks': page,
+        'page': page,
     }
-    return render(request, 'tasks/my_tickets.html', context)
+    return finish(render(request, 'tasks/my_tickets.html', context), etag)
 
 def signup_closed_view(request):
     return render(request, 'tasks/signup_closed.html')